@@ -0,0 +1,89 @@
+"""
+Connect and disconnect N sockets on one channel against the original
+list-based bookkeeping and the current dict-keyed ConnectionManager.
+
+    python bench/bench_connection_manager.py [N]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from routers.ws_chat import ConnectionManager  # noqa: E402
+
+
+class StubWebSocket:
+    async def accept(self):
+        pass
+
+
+class ListConnectionManager:
+    """The original bookkeeping: one list of sockets per channel"""
+
+    def __init__(self):
+        self.active_connections = {}
+        self.user_channels = {}
+        self.channel_users = {}
+        self.websocket_users = {}
+
+    async def connect(self, channel_id, user_id, websocket):
+        await websocket.accept()
+        if channel_id not in self.active_connections:
+            self.active_connections[channel_id] = []
+        self.active_connections[channel_id].append(websocket)
+        self.websocket_users[websocket] = user_id
+        if user_id not in self.user_channels:
+            self.user_channels[user_id] = set()
+        self.user_channels[user_id].add(channel_id)
+        if channel_id not in self.channel_users:
+            self.channel_users[channel_id] = set()
+        self.channel_users[channel_id].add(user_id)
+
+    def disconnect(self, channel_id, user_id, websocket):
+        if channel_id in self.active_connections:
+            if websocket in self.active_connections[channel_id]:
+                self.active_connections[channel_id].remove(websocket)
+            if not self.active_connections[channel_id]:
+                del self.active_connections[channel_id]
+        if websocket in self.websocket_users:
+            del self.websocket_users[websocket]
+        if user_id in self.user_channels:
+            self.user_channels[user_id].discard(channel_id)
+            if not self.user_channels[user_id]:
+                del self.user_channels[user_id]
+        if channel_id in self.channel_users:
+            self.channel_users[channel_id].discard(user_id)
+            if not self.channel_users[channel_id]:
+                del self.channel_users[channel_id]
+
+
+async def run(manager, sockets):
+    started = time.perf_counter()
+    for user_id, ws in enumerate(sockets):
+        await manager.connect(1, user_id, ws)
+    connected = time.perf_counter()
+    order = list(enumerate(sockets))
+    random.Random(0).shuffle(order)
+    for user_id, ws in order:
+        if isinstance(manager, ConnectionManager):
+            manager.disconnect(ws)
+        else:
+            manager.disconnect(1, user_id, ws)
+    return connected - started, time.perf_counter() - connected
+
+
+async def main(n: int):
+    sockets = [StubWebSocket() for _ in range(n)]
+    for name, manager in (
+        ("list (original)", ListConnectionManager()),
+        ("dict (current)", ConnectionManager(queue_size=0)),
+    ):
+        connect_s, disconnect_s = await run(manager, sockets)
+        print(f"{name:16} connect {connect_s * 1000:8.1f} ms   disconnect {disconnect_s * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000))
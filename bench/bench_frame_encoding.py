@@ -0,0 +1,74 @@
+"""
+Size and CPU cost of a 50-message history frame and a single message frame
+in each frame encoding, raw and after permessage-deflate (raw DEFLATE with
+a sync flush, as the WebSocket extension sends it; no context takeover, so
+a conservative figure for a long-lived connection).
+
+    python bench/bench_frame_encoding.py [history_messages] [repeats]
+"""
+import os
+import random
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from core.frames import FRAME_ENCODINGS, encode_frame_as, msgpack  # noqa: E402
+
+WORDS = "the deploy is done please check staging dashboards again after lunch we rolled back build".split()
+
+
+def chat_message(rng: random.Random, message_id: int, sent_at: datetime) -> dict:
+    author_id = rng.randint(1, 8)
+    return {
+        "id": message_id,
+        "author": f"User number {author_id}",
+        "author_id": author_id,
+        "content": " ".join(rng.choices(WORDS, k=rng.randint(3, 20))),
+        "sent_at": sent_at.isoformat(),
+    }
+
+
+def deflate(payload) -> bytes:
+    if isinstance(payload, str):
+        payload = payload.encode()
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)[:-4]
+
+
+def per_call_us(fn, repeats: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - started) / repeats * 1e6
+
+
+def main(history_messages: int, repeats: int):
+    rng = random.Random(7)
+    start = datetime(2026, 10, 18, 9, 0)
+    messages = [chat_message(rng, 1000 + i, start + timedelta(seconds=i * 7)) for i in range(history_messages)]
+    frames = {
+        f"history ({history_messages})": {"type": "history", "channel_id": 1, "data": messages, "has_more": True},
+        "message": {"type": "message", "data": messages[-1], "channel_id": 1},
+    }
+    encodings = [e for e in FRAME_ENCODINGS if e != "msgpack" or msgpack is not None]
+    if msgpack is None:
+        print("msgpack is not installed; skipping that encoding")
+    for label, frame in frames.items():
+        print(label)
+        for encoding in encodings:
+            payload = encode_frame_as(frame, encoding)
+            compressed = deflate(payload)
+            encode_us = per_call_us(lambda: encode_frame_as(frame, encoding), repeats)
+            deflate_us = per_call_us(lambda: deflate(payload), repeats)
+            print(
+                f"  {encoding:9} {len(payload) if isinstance(payload, bytes) else len(payload.encode()):7} B"
+                f"   deflated {len(compressed):6} B   encode {encode_us:7.1f} us   deflate {deflate_us:7.1f} us"
+            )
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*(args + [50, 2000][len(args):]))
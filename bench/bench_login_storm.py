@@ -0,0 +1,69 @@
+"""
+Broadcast latency on a busy channel while a burst of logins verifies
+passwords, with bcrypt run inline (old behaviour) vs on the hashing pool.
+
+    python bench/bench_login_storm.py [logins] [sockets]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from core.metrics import LatencyStats  # noqa: E402
+from core.security import hash_password, verify_password, verify_password_async  # noqa: E402
+from routers.ws_chat import ConnectionManager  # noqa: E402
+
+
+class StubWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        pass
+
+
+async def login_inline(hashed):
+    verify_password("correct horse", hashed)
+
+
+async def login_pooled(hashed):
+    await verify_password_async("correct horse", hashed)
+
+
+async def storm(login, logins: int, sockets: int) -> LatencyStats:
+    manager = ConnectionManager(queue_size=0)
+    for user_id in range(sockets):
+        await manager.connect(1, user_id, StubWebSocket())
+    hashed = hash_password("correct horse")
+    latency = LatencyStats()
+
+    async def chatter():
+        # A message every 10 ms; any extra gap between two deliveries is time
+        # the loop spent blocked.
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(0.01)
+            await manager.broadcast(1, {"type": "message", "data": {"content": "ping"}})
+            now = time.perf_counter()
+            latency.observe(now - last - 0.01)
+            last = now
+
+    ticker = asyncio.create_task(chatter())
+    await asyncio.sleep(0.1)
+    await asyncio.gather(*(login(hashed) for _ in range(logins)))
+    await asyncio.sleep(0.05)
+    ticker.cancel()
+    return latency
+
+
+async def main(logins: int, sockets: int):
+    for name, login in (("inline bcrypt", login_inline), ("hashing pool", login_pooled)):
+        stats = (await storm(login, logins, sockets)).snapshot()
+        print(f"{name:14} broadcast lag p50 {stats['p50_ms']:8.2f} ms   p99 {stats['p99_ms']:8.2f} ms   ({stats['count']} broadcasts)")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    asyncio.run(main(*(args + [20, 200][len(args):])))
@@ -0,0 +1,58 @@
+"""
+Messages/sec for chat messages saved one INSERT at a time (current path) vs
+write-behind batches, with many senders at once, on a SQLite file database.
+
+    python bench/bench_message_persistence.py [messages] [senders]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from tortoise import Tortoise  # noqa: E402
+
+from core.database import TORTOISE_ORM  # noqa: E402
+from core.message_writer import MessageWriter  # noqa: E402
+from models.channel import Channel  # noqa: E402
+from models.message import Message  # noqa: E402
+from models.user import User  # noqa: E402
+
+MODELS = TORTOISE_ORM["apps"]["models"]["models"]
+
+
+async def run(writer: MessageWriter, messages: int, senders: int) -> float:
+    author = await User.create(full_name="Ann", email=f"ann{time.perf_counter_ns()}@example.com", hashed_password="x")
+    channel = await Channel.create(name=f"bench{time.perf_counter_ns()}")
+    await writer.start()
+
+    async def sender(count: int):
+        for i in range(count):
+            await writer.create(channel.id, author.id, f"message {i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(sender(messages // senders) for _ in range(senders)))
+    await writer.stop()  # everything is in the database once this returns
+    elapsed = time.perf_counter() - started
+    assert await Message.filter(channel_id=channel.id).count() == messages // senders * senders
+    return messages / elapsed
+
+
+async def main(messages: int, senders: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        await Tortoise.init(db_url=f"sqlite://{tmp}/bench.sqlite3", modules={"models": MODELS})
+        await Tortoise.generate_schemas()
+        for name, writer in (
+            ("per-row INSERT", MessageWriter(write_behind=False)),
+            ("write-behind", MessageWriter(write_behind=True, batch_size=200, flush_interval=0.05)),
+        ):
+            rate = await run(writer, messages, senders)
+            print(f"{name:15} {rate:10.0f} messages/s")
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    asyncio.run(main(*(args + [5000, 50][len(args):])))
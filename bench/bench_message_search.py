@@ -0,0 +1,86 @@
+"""
+Full-text search (FTS5 inverted index via core.search) vs a LIKE '%term%'
+scan, on a SQLite file database with many messages.
+
+    python bench/bench_message_search.py [messages]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from tortoise import Tortoise, connections  # noqa: E402
+
+from core.database import TORTOISE_ORM  # noqa: E402
+from core.metrics import LatencyStats  # noqa: E402
+from core.search import ensure_search_index, search_messages  # noqa: E402
+
+MODELS = TORTOISE_ORM["apps"]["models"]["models"]
+CHANNELS = 50
+COMMON = [f"word{i}" for i in range(2000)]
+# term -> how often it is mixed into a message
+PROBES = {"deploy": 1 / 50, "incident": 1 / 5000, "zebra": 1 / 200_000}
+
+
+def message_text(rng: random.Random) -> str:
+    words = rng.choices(COMMON, k=12)
+    for term, rate in PROBES.items():
+        if rng.random() < rate:
+            words[rng.randrange(len(words))] = term
+    return " ".join(words)
+
+
+async def populate(conn, messages: int):
+    await conn.execute_query("INSERT INTO users (full_name, email, hashed_password, is_active) VALUES ('Ann', 'ann@example.com', 'x', 1)")
+    await conn.execute_many("INSERT INTO channels (name, is_private, is_bot_dm) VALUES (?, 0, 0)", [[f"c{i}"] for i in range(CHANNELS)])
+    rng = random.Random(42)
+    batch = 50_000
+    for start in range(0, messages, batch):
+        rows = [[message_text(rng), 1, 1 + rng.randrange(CHANNELS)] for _ in range(min(batch, messages - start))]
+        await conn.execute_many("INSERT INTO messages (content, author_id, channel_id, sent_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)", rows)
+
+
+async def like_scan(conn, term: str, channel_ids):
+    in_list = ", ".join(["?"] * len(channel_ids))
+    return await conn.execute_query_dict(
+        f"SELECT id, channel_id, author_id, content, sent_at FROM messages "
+        f"WHERE channel_id IN ({in_list}) AND content LIKE ? ORDER BY id DESC LIMIT 20",
+        [*channel_ids, f"%{term}%"],
+    )
+
+
+async def timed(fn, repeats: int = 5) -> LatencyStats:
+    stats = LatencyStats()
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await fn()
+        stats.observe(time.perf_counter() - started)
+    return stats
+
+
+async def main(messages: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        await Tortoise.init(db_url=f"sqlite://{tmp}/bench.sqlite3", modules={"models": MODELS})
+        await Tortoise.generate_schemas()
+        conn = connections.get("default")
+        started = time.perf_counter()
+        await populate(conn, messages)
+        await ensure_search_index(conn)
+        print(f"{messages} messages inserted and indexed in {time.perf_counter() - started:.1f} s")
+
+        # A user who can read half the channels
+        channel_ids = list(range(1, CHANNELS // 2 + 1))
+        for term in PROBES:
+            fts = (await timed(lambda: search_messages(term, channel_ids))).snapshot()
+            scan = (await timed(lambda: like_scan(conn, term, channel_ids))).snapshot()
+            print(f"{term:9} full-text p50 {fts['p50_ms']:9.2f} ms   LIKE scan p50 {scan['p50_ms']:9.2f} ms")
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    asyncio.run(main(*(args + [1_000_000][len(args):])))
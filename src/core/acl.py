@@ -0,0 +1,118 @@
+from typing import Dict, FrozenSet, Iterable, Optional
+
+from fastapi import HTTPException, status
+from tortoise.expressions import Q, Subquery
+
+from core.cache import TTLCache
+from core.config import settings
+from core.metrics import metrics
+from models.channel import Channel
+from models.channelmember import ChannelMember
+from models.user import User
+
+# user id -> ids of every channel the user can see (public channels open to
+# their role, plus private channels they belong to). Membership, role and
+# channel changes invalidate explicitly; the TTL bounds how long a change
+# made on another worker can go unnoticed.
+visible_channels_cache = TTLCache(maxsize=settings.CHANNEL_ACL_CACHE_SIZE, ttl=settings.CHANNEL_ACL_CACHE_TTL)
+metrics.register_collector("visible_channels_cache", visible_channels_cache.stats)
+
+
+class ChannelACL:
+    """What access decisions need to know about a channel"""
+
+    __slots__ = ("id", "is_private", "role_id", "is_bot_dm", "members")
+
+    def __init__(self, id: int, is_private: bool, role_id: Optional[int], is_bot_dm: bool, members: FrozenSet[int]):
+        self.id = id
+        self.is_private = is_private
+        self.role_id = role_id
+        self.is_bot_dm = is_bot_dm
+        # Only loaded for private channels
+        self.members = members
+
+
+# channel id -> (version it was loaded at, ChannelACL). Bumping a channel's
+# version on every change means a load that raced with the change is never
+# stored over it.
+channel_acl_cache = TTLCache(maxsize=settings.CHANNEL_ACL_CACHE_SIZE, ttl=settings.CHANNEL_ACL_CACHE_TTL)
+metrics.register_collector("channel_acl_cache", channel_acl_cache.stats)
+_acl_versions: Dict[int, int] = {}
+
+
+def visible_to(user: User) -> Q:
+    """Public channels open to the user's role, plus private channels they belong to"""
+    return Q(is_private=False, role_id__isnull=True) | Q(is_private=False, role_id=user.role_id) | Q(
+        is_private=True, id__in=Subquery(ChannelMember.filter(user_id=user.id).values("channel_id"))
+    )
+
+
+def cached_visible_channels(user_id: int) -> FrozenSet[int] | None:
+    return visible_channels_cache.get(user_id)
+
+
+async def visible_channel_ids(user: User) -> FrozenSet[int]:
+    channel_ids = cached_visible_channels(user.id)
+    if channel_ids is None:
+        channel_ids = frozenset(await Channel.filter(visible_to(user)).values_list("id", flat=True))
+        visible_channels_cache.set(user.id, channel_ids)
+    return channel_ids
+
+
+def remember_visible_channels(user_id: int, channel_ids: Iterable[int]):
+    visible_channels_cache.set(user_id, frozenset(channel_ids))
+
+
+def invalidate_user_channels(*user_ids: int):
+    for user_id in user_ids:
+        visible_channels_cache.pop(user_id)
+
+
+def invalidate_channel(channel_id: int):
+    """Call after changing a channel or its members"""
+    _acl_versions[channel_id] = _acl_versions.get(channel_id, 0) + 1
+    channel_acl_cache.pop(channel_id)
+
+
+def invalidate_all_channels():
+    """For changes that affect many users at once (a new public channel, a deleted role)"""
+    visible_channels_cache.clear()
+    for channel_id in list(_acl_versions):
+        _acl_versions[channel_id] += 1
+    channel_acl_cache.clear()
+
+
+async def get_channel_acl(channel_id: int) -> Optional[ChannelACL]:
+    """Channel metadata and member ids, from memory when possible; None if there's no such channel"""
+    version = _acl_versions.get(channel_id, 0)
+    entry = channel_acl_cache.get(channel_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    row = await Channel.filter(id=channel_id).first().values("id", "is_private", "role_id", "is_bot_dm")
+    if row is None:
+        return None
+    members: FrozenSet[int] = frozenset()
+    if row["is_private"]:
+        members = frozenset(await ChannelMember.filter(channel_id=channel_id).values_list("user_id", flat=True))
+    acl = ChannelACL(row["id"], bool(row["is_private"]), row["role_id"], bool(row["is_bot_dm"]), members)
+    if _acl_versions.get(channel_id, 0) == version:
+        channel_acl_cache.set(channel_id, (version, acl))
+    return acl
+
+
+def can_access(user: User, acl: ChannelACL) -> bool:
+    """The one rule for reading or posting in a channel, used by WebSocket and REST alike"""
+    if acl.is_private:
+        return user.id in acl.members
+    return acl.role_id is None or acl.role_id == user.role_id
+
+
+async def require_channel_access(user: User, channel_id: int) -> ChannelACL:
+    """REST flavour of the check: 404 for unknown channels, 403 when not allowed"""
+    acl = await get_channel_acl(channel_id)
+    if acl is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Channel not found")
+    if not can_access(user, acl):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return acl
@@ -0,0 +1,156 @@
+import time
+from typing import Optional
+
+import httpx
+
+from core.config import settings
+from core.metrics import metrics
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class AIServiceUnavailable(Exception):
+    """The AI service could not be reached, or the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds. After that a single probe call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._state = self.CLOSED
+
+    def release(self):
+        """The call ended without saying anything about the service (e.g. it was cancelled)"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class AIClient:
+    """
+    App-lifetime client for the AI service: one keep-alive connection pool
+    shared by every request, a short connect timeout and a circuit breaker so
+    callers fall back immediately while the service is down.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        connect_timeout: float = 2.0,
+        breaker: Optional[CircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+        self.connect_timeout = connect_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                http2=HTTP2_AVAILABLE,
+                transport=self._transport,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def post(self, path: str, payload: dict, timeout: float) -> httpx.Response:
+        """
+        POST JSON to the AI service. Raises AIServiceUnavailable when the
+        circuit is open or the service can't be reached; any HTTP response is
+        returned, with 5xx counted as a failure.
+        """
+        if not self.breaker.allow():
+            metrics.incr("ai_short_circuited", key=path)
+            raise AIServiceUnavailable("AI service circuit is open")
+
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(
+                path, json=payload, timeout=httpx.Timeout(timeout, connect=self.connect_timeout)
+            )
+        except httpx.RequestError as e:
+            self.breaker.record_failure()
+            metrics.incr("ai_errors", key=path)
+            raise AIServiceUnavailable(str(e) or type(e).__name__) from e
+        except BaseException:
+            # Cancelled (e.g. the socket that asked went away) or failed in
+            # our own code: hand back the probe slot so a later call can probe
+            self.breaker.release()
+            raise
+        finally:
+            metrics.observe("ai_request", time.perf_counter() - started, key=path)
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            metrics.incr("ai_errors", key=path)
+        else:
+            self.breaker.record_success()
+        return response
+
+    def stats(self) -> dict:
+        return {"http2": HTTP2_AVAILABLE, **self.breaker.stats()}
+
+
+ai_client = AIClient(
+    settings.AI_SERVICE_URL,
+    max_connections=settings.AI_MAX_CONNECTIONS,
+    max_keepalive=settings.AI_MAX_KEEPALIVE_CONNECTIONS,
+    connect_timeout=settings.AI_CONNECT_TIMEOUT,
+    breaker=CircuitBreaker(settings.AI_BREAKER_FAILURE_THRESHOLD, settings.AI_BREAKER_RESET_TIMEOUT),
+)
+metrics.register_collector("ai_service", ai_client.stats)
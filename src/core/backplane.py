@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+
+class BackplaneError(Exception):
+    pass
+
+
+class Backplane(ABC):
+    """
+    Pub/sub transport that carries broadcasts and presence changes between
+    every process serving WebSockets. Events are JSON-serializable dicts.
+    """
+
+    @property
+    def distributed(self) -> bool:
+        """False when nobody else is listening, so publishing can be skipped"""
+        return True
+
+    @abstractmethod
+    async def start(self, on_event: EventHandler):
+        ...
+
+    @abstractmethod
+    async def publish(self, event: dict):
+        ...
+
+    async def stop(self):
+        pass
+
+
+class InMemoryBackplane(Backplane):
+    """In-process backplane; every subscriber, including the publisher, gets each event"""
+
+    def __init__(self):
+        self._handlers: List[EventHandler] = []
+
+    @property
+    def distributed(self) -> bool:
+        return len(self._handlers) > 1
+
+    async def start(self, on_event: EventHandler):
+        self._handlers.append(on_event)
+
+    async def publish(self, event: dict):
+        for handler in list(self._handlers):
+            await handler(event)
+
+    async def stop(self):
+        self._handlers.clear()
+
+
+def _encode_command(*args: str) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg.encode("utf-8")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("backplane connection closed")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest.decode()
+    if prefix == b"-":
+        raise BackplaneError(rest.decode())
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        length = int(rest)
+        if length == -1:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        length = int(rest)
+        if length == -1:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise BackplaneError(f"Unexpected reply: {line!r}")
+
+
+class RedisBackplane(Backplane):
+    """
+    Backplane over the Redis pub/sub protocol. Works against Redis itself or
+    the stand-in hub in this module (`python -m core.backplane`), over TCP
+    (redis://host:port) or a Unix socket (unix:///path/to/socket).
+    """
+
+    def __init__(self, url: str, topic: str = "chat-backplane", reconnect_delay: float = 1.0):
+        parsed = urlparse(url)
+        self.unix_path = parsed.path if parsed.scheme == "unix" else None
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.topic = topic
+        self.reconnect_delay = reconnect_delay
+        self._on_event: Optional[EventHandler] = None
+        self._pub_writer: Optional[asyncio.StreamWriter] = None
+        self._pub_lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self, on_event: EventHandler):
+        self._on_event = on_event
+        await self._connect_publisher()
+        subscribed = asyncio.get_running_loop().create_future()
+        self._spawn(self._listen(subscribed))
+        await subscribed
+
+    async def publish(self, event: dict):
+        payload = json.dumps(event, separators=(",", ":"))
+        async with self._pub_lock:
+            for attempt in (1, 2):
+                try:
+                    if self._pub_writer is None:
+                        await self._connect_publisher()
+                    self._pub_writer.write(_encode_command("PUBLISH", self.topic, payload))
+                    await self._pub_writer.drain()
+                    return
+                except (ConnectionError, OSError):
+                    self._pub_writer = None
+                    if attempt == 2:
+                        raise
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._pub_writer is not None:
+            self._pub_writer.close()
+            self._pub_writer = None
+
+    async def _open(self):
+        if self.unix_path:
+            reader, writer = await asyncio.open_unix_connection(self.unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(_encode_command("AUTH", self.password))
+            await writer.drain()
+            await _read_reply(reader)
+        return reader, writer
+
+    async def _connect_publisher(self):
+        reader, self._pub_writer = await self._open()
+        # PUBLISH replies are subscriber counts; read and discard them so
+        # publishing never waits on a round trip.
+        self._spawn(self._discard_replies(reader))
+
+    async def _discard_replies(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                await _read_reply(reader)
+        except (ConnectionError, asyncio.IncompleteReadError, BackplaneError) as e:
+            print(f"Backplane publisher error: {e}")
+
+    async def _listen(self, subscribed: asyncio.Future):
+        while True:
+            try:
+                reader, writer = await self._open()
+                writer.write(_encode_command("SUBSCRIBE", self.topic))
+                await writer.drain()
+                await _read_reply(reader)  # subscribe confirmation
+                if not subscribed.done():
+                    subscribed.set_result(True)
+                while True:
+                    reply = await _read_reply(reader)
+                    if isinstance(reply, list) and reply and reply[0] == b"message":
+                        await self._on_event(json.loads(reply[2]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not subscribed.done():
+                    subscribed.set_exception(e)
+                    return
+                print(f"Backplane subscriber error, reconnecting: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+def create_backplane(url: str) -> Backplane:
+    """Build a backplane from a URL: memory://, redis://host:port or unix:///path"""
+    scheme = urlparse(url).scheme
+    if scheme in ("", "memory"):
+        return InMemoryBackplane()
+    if scheme in ("redis", "unix"):
+        return RedisBackplane(url)
+    raise ValueError(f"Unsupported backplane URL: {url}")
+
+
+class PubSubHub:
+    """
+    Minimal stand-in for Redis pub/sub (SUBSCRIBE, PUBLISH, PING, AUTH) so
+    several workers on one host can share a backplane without running Redis.
+    """
+
+    def __init__(self):
+        self.subscribers: Dict[str, Set[asyncio.StreamWriter]] = {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        topics: Set[str] = set()
+        try:
+            while True:
+                command = await _read_reply(reader)
+                name = command[0].decode().upper()
+                if name == "SUBSCRIBE":
+                    for i, topic in enumerate(command[1:], start=1):
+                        topic = topic.decode()
+                        topics.add(topic)
+                        self.subscribers.setdefault(topic, set()).add(writer)
+                        writer.write(b"*3\r\n$9\r\nsubscribe\r\n" + _bulk(topic.encode()) + b":%d\r\n" % i)
+                elif name == "PUBLISH":
+                    topic, payload = command[1].decode(), command[2]
+                    receivers = self.subscribers.get(topic, set())
+                    frame = b"*3\r\n$7\r\nmessage\r\n" + _bulk(topic.encode()) + _bulk(payload)
+                    for subscriber in receivers:
+                        subscriber.write(frame)
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name == "PING":
+                    writer.write(b"+PONG\r\n")
+                elif name == "AUTH":
+                    writer.write(b"+OK\r\n")
+                else:
+                    writer.write(f"-ERR unknown command '{name}'\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for topic in topics:
+                self.subscribers.get(topic, set()).discard(writer)
+            writer.close()
+
+
+def _bulk(data: bytes) -> bytes:
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+async def serve_hub(host: str = "127.0.0.1", port: int = 6379, unix_path: Optional[str] = None):
+    hub = PubSubHub()
+    if unix_path:
+        return await asyncio.start_unix_server(hub.handle, path=unix_path)
+    return await asyncio.start_server(hub.handle, host, port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local pub/sub hub for the WebSocket backplane")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--unix", help="listen on a Unix socket instead of TCP")
+    args = parser.parse_args()
+
+    async def main():
+        server = await serve_hub(args.host, args.port, args.unix)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
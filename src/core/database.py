@@ -1,10 +1,42 @@
+from urllib.parse import parse_qsl, unquote, urlparse
+
 from tortoise import Tortoise
 from tortoise.contrib.fastapi import register_tortoise
 from core.config import settings
+from core.db_pool import pool_stats
+from core.metrics import metrics
+
+
+def connection_config(url: str):
+    """
+    MySQL URLs become an explicit config for the instrumented pool, sized
+    from Settings (query-string parameters in the URL still win). Other
+    URLs, e.g. sqlite:// in tests, are passed through unchanged.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme != "mysql":
+        return url
+    return {
+        "engine": "core.db_pool",
+        "credentials": {
+            "host": parsed.hostname or "localhost",
+            "port": parsed.port or 3306,
+            "user": unquote(parsed.username or ""),
+            "password": unquote(parsed.password or ""),
+            "database": parsed.path.lstrip("/"),
+            "minsize": settings.DB_POOL_MIN_SIZE,
+            "maxsize": settings.DB_POOL_MAX_SIZE,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "connect_timeout": settings.DB_CONNECT_TIMEOUT,
+            "acquire_timeout": settings.DB_POOL_ACQUIRE_TIMEOUT,
+            **{key: int(value) if value.isdigit() else value for key, value in parse_qsl(parsed.query)},
+        },
+    }
+
 
 TORTOISE_ORM = {
     "connections": {
-        "default": settings.DATABASE_URL
+        "default": connection_config(settings.DATABASE_URL)
     },
     "apps": {
         "models": {
@@ -13,6 +45,9 @@ TORTOISE_ORM = {
                 "models.channel",
                 "models.channelmember",
                 "models.message",
+                "models.channelsummary",
+                "models.messagesequence",
+                "models.channelread",
                 "models.role",
                 "aerich.models"               
             ],
@@ -32,3 +67,4 @@ def init_db(app):
         generate_schemas=True,
         add_exception_handlers=True,
     )
+    metrics.register_collector("db_pool", pool_stats)
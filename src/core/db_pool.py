@@ -0,0 +1,75 @@
+"""
+Tortoise engine for MySQL that bounds and measures pool usage. Selected in
+core/database.py with {"engine": "core.db_pool", ...}; everything else is
+the stock tortoise.backends.mysql client.
+"""
+import asyncio
+import time
+from typing import Any
+
+from tortoise import connections
+from tortoise.backends.base.client import PoolConnectionWrapper
+from tortoise.backends.mysql.client import MySQLClient
+from tortoise.exceptions import DBConnectionError
+
+from core.metrics import metrics
+
+
+class TimedPoolConnectionWrapper(PoolConnectionWrapper):
+    """Acquires with a deadline and records wait and hold times"""
+
+    async def __aenter__(self):
+        await self.ensure_connection()
+        client = self.client
+        client.waiting += 1
+        started = time.perf_counter()
+        try:
+            self.connection = await asyncio.wait_for(client._pool.acquire(), client.acquire_timeout)
+        except asyncio.TimeoutError:
+            metrics.incr("db_pool_timeouts")
+            raise DBConnectionError(f"No database connection free after {client.acquire_timeout}s")
+        finally:
+            client.waiting -= 1
+        self.acquired_at = time.perf_counter()
+        metrics.observe("db_pool_wait", self.acquired_at - started)
+        return self.connection
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        # Outside transactions a connection is held for exactly one query
+        metrics.observe("db_query", time.perf_counter() - self.acquired_at)
+        await super().__aexit__(exc_type, exc_val, exc_tb)
+
+
+class InstrumentedMySQLClient(MySQLClient):
+    def __init__(self, *, acquire_timeout: float = 10.0, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.acquire_timeout = float(acquire_timeout)
+        self.waiting = 0
+
+    def acquire_connection(self) -> TimedPoolConnectionWrapper:
+        return TimedPoolConnectionWrapper(self, self._pool_init_lock)
+
+    def pool_stats(self) -> dict:
+        pool = self._pool
+        size = pool.size if pool else 0
+        free = pool.freesize if pool else 0
+        return {
+            "max_size": self.pool_maxsize,
+            "size": size,
+            "in_use": size - free,
+            "free": free,
+            "waiting": self.waiting,
+            "utilization": round((size - free) / self.pool_maxsize, 3) if self.pool_maxsize else 0.0,
+        }
+
+
+client_class = InstrumentedMySQLClient
+
+
+def pool_stats() -> dict:
+    """Utilization of every open instrumented connection pool, by connection name"""
+    return {
+        client.connection_name: client.pool_stats()
+        for client in connections._get_storage().values()
+        if isinstance(client, InstrumentedMySQLClient)
+    }
@@ -1,9 +1,68 @@
+from typing import Any, Callable, List
+
 from fastapi import Depends, Cookie, HTTPException, status
-from tortoise.exceptions import DoesNotExist
 
+from core.cache import TTLCache
+from core.config import settings
+from core.metrics import metrics
 from core.security import decode_access_token
 from models.user import User
 
+# email -> User (with role prefetched). Entries are only trusted when the
+# token's jti still matches the cached current_jti, and every place that
+# changes a user, their role or their jti invalidates explicitly.
+session_cache = TTLCache(maxsize=settings.SESSION_CACHE_SIZE, ttl=settings.SESSION_CACHE_TTL)
+metrics.register_collector("session_cache", session_cache.stats)
+
+
+async def _load_session(email: str, jti: str | None) -> User | None:
+    """Return the user behind (email, jti), or None if the session is not valid"""
+    user = session_cache.get(email)
+    if user is None:
+        user = await User.get_or_none(email=email).prefetch_related("role")
+        if not user:
+            return None
+        session_cache.set(email, user)
+    if user.current_jti != jti:
+        return None
+    return user
+
+
+# Called with (scope, key) after every invalidation so other workers can drop
+# their copies too (routers.ws_chat relays it over the backplane); scope is
+# "email", "user" (key = user id) or "all"
+session_invalidation_listeners: List[Callable[[str, Any], None]] = []
+
+
+def drop_local_sessions(scope: str, key: Any = None):
+    """Invalidate this worker's cache only; what a relayed invalidation runs"""
+    if scope == "email":
+        session_cache.pop(key)
+    elif scope == "user":
+        session_cache.discard_where(lambda _, user: user.id == key)
+    else:
+        session_cache.clear()
+
+
+def _invalidate(scope: str, key: Any = None):
+    drop_local_sessions(scope, key)
+    for listener in session_invalidation_listeners:
+        listener(scope, key)
+
+
+def invalidate_session(email: str):
+    _invalidate("email", email)
+
+
+def invalidate_user_sessions(user_id: int):
+    _invalidate("user", user_id)
+
+
+def invalidate_all_sessions():
+    """For changes that touch many users at once (e.g. a role rename)"""
+    _invalidate("all")
+
+
 async def get_current_user_ws(token: str) -> User:
     """Get current user from WebSocket token"""
     if not token:
@@ -17,15 +76,8 @@ async def get_current_user_ws(token: str) -> User:
     if not email:
         return None
         
-    user = await User.get_or_none(email=email).prefetch_related("role")
-    if not user:
-        return None
-        
-    # Verify JTI matches
-    if user.current_jti != payload.get("jti"):
-        return None
-        
-    return user
+    # Verify JTI matches (served from the session cache when possible)
+    return await _load_session(email, payload.get("jti"))
 
 
 async def get_current_user(access_token: str = Cookie(None)) -> User:
@@ -33,15 +85,11 @@ async def get_current_user(access_token: str = Cookie(None)) -> User:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
     payload = decode_access_token(access_token)
-    if not payload:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-
-    try:
-        user = await User.get(email=payload["sub"]).prefetch_related("role")
-    except DoesNotExist:
+    if not payload or not payload.get("sub"):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
-    if payload.get("jti") != user.current_jti:
+    user = await _load_session(payload["sub"], payload.get("jti"))
+    if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
     return user
@@ -49,4 +97,18 @@ async def get_current_user(access_token: str = Cookie(None)) -> User:
 def require_admin(user = Depends(get_current_user)):
     if (user.role is None or user.role.name != "admin") and False:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
-    return user
\ No newline at end of file
+    return user
+
+
+def is_admin(user: User) -> bool:
+    return user.role is not None and user.role.name == "admin"
+
+
+def require_admin_role(user = Depends(get_current_user)):
+    """
+    Like require_admin, but always enforced: for endpoints that expose
+    internal state (user and channel ids, pool and cache stats)
+    """
+    if not is_admin(user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    return user
@@ -0,0 +1,80 @@
+import json
+from typing import Dict, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # optional, plain json is used when it isn't installed
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional, the msgpack encoding is offered only when installed
+    msgpack = None
+
+# Per-connection frame encodings. "columnar" is JSON with the message lists
+# of COLUMNAR_FRAMES sent as {"columns": [...], "rows": [[...], ...]}, so
+# keys aren't repeated per message; "msgpack" frames are binary.
+FRAME_ENCODINGS = ("json", "columnar", "msgpack")
+COLUMNAR_FRAMES = {"history", "messages"}
+
+
+def encode_frame(message: dict) -> str:
+    """
+    Encode an outgoing WebSocket frame to JSON text once, so the same string
+    can be sent to every recipient instead of re-encoding per socket.
+    """
+    if orjson is not None:
+        return orjson.dumps(message).decode("utf-8")
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def negotiate_encoding(requested: Optional[str]) -> str:
+    """The encoding to use for a client that asked for `requested`; json if it can't be had"""
+    if requested == "msgpack" and msgpack is None:
+        return "json"
+    return requested if requested in FRAME_ENCODINGS else "json"
+
+
+def to_columnar(message: dict) -> dict:
+    data = message.get("data")
+    if message.get("type") not in COLUMNAR_FRAMES or not isinstance(data, list) or not data:
+        return message
+    columns = list(dict.fromkeys(key for item in data for key in item))
+    return {**message, "data": {"columns": columns, "rows": [[item.get(c) for c in columns] for item in data]}}
+
+
+def encode_frame_as(message: dict, encoding: str) -> Union[str, bytes]:
+    if encoding == "columnar":
+        return encode_frame(to_columnar(message))
+    if encoding == "msgpack":
+        return msgpack.packb(message, use_bin_type=True)
+    return encode_frame(message)
+
+
+class Frame:
+    """
+    An outgoing frame, encoded the first time a recipient needs each
+    encoding: a broadcast costs one encode per encoding in use, not one per
+    socket. Built from the message, its JSON text, or both.
+    """
+    __slots__ = ("_message", "_encoded")
+
+    def __init__(self, message: Optional[dict] = None, text: Optional[str] = None):
+        self._message = message
+        self._encoded: Dict[str, Union[str, bytes]] = {} if text is None else {"json": text}
+
+    @property
+    def message(self) -> dict:
+        if self._message is None:
+            self._message = json.loads(self._encoded["json"])
+        return self._message
+
+    @property
+    def text(self) -> str:
+        return self.encoded("json")
+
+    def encoded(self, encoding: str) -> Union[str, bytes]:
+        payload = self._encoded.get(encoding)
+        if payload is None:
+            payload = self._encoded[encoding] = encode_frame_as(self.message, encoding)
+        return payload
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from typing import Coroutine, Dict, Hashable, Optional, Set
+
+from core.config import settings
+from core.metrics import metrics
+
+
+class JobLimitExceeded(Exception):
+    """The user, or the process as a whole, already has too many jobs outstanding"""
+
+
+class JobRunner:
+    """
+    Runs slow work (AI calls) as background tasks so WebSocket receive loops
+    never wait on it. At most `max_concurrent` jobs run at once and the rest
+    wait their turn; a user may have `max_per_user` jobs outstanding and the
+    process `max_pending`, beyond which submit() refuses new work. Jobs are
+    grouped by owner (the socket that asked) so they can be cancelled when
+    it goes away.
+    """
+
+    def __init__(self, max_concurrent: int = 8, max_per_user: int = 2, max_pending: int = 100):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_pending = max_pending
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._by_owner: Dict[Hashable, Set[asyncio.Task]] = {}
+        self._per_user: Dict[int, int] = {}
+        self._pending = 0
+        self._running = 0
+
+    def submit(self, owner: Hashable, user_id: int, coro: Coroutine, name: str = "job") -> asyncio.Task:
+        if self._per_user.get(user_id, 0) >= self.max_per_user or self._pending >= self.max_pending:
+            coro.close()
+            metrics.incr("jobs_rejected", key=name)
+            raise JobLimitExceeded(name)
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._pending += 1
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        task = asyncio.create_task(self._run(coro, name))
+        self._by_owner.setdefault(owner, set()).add(task)
+        task.add_done_callback(lambda t: self._finished(t, owner, user_id, name, coro))
+        return task
+
+    def cancel_owner(self, owner: Hashable) -> int:
+        """Cancel every job submitted on behalf of `owner`"""
+        tasks = self._by_owner.pop(owner, set())
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    async def stop(self):
+        tasks = [task for owned in self._by_owner.values() for task in owned]
+        self._by_owner.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @property
+    def saturated(self) -> bool:
+        """Every slot is taken, so new jobs would have to queue"""
+        return self._pending >= self.max_concurrent
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "queued": self._pending - self._running,
+            "users": len(self._per_user),
+        }
+
+    async def _run(self, coro: Coroutine, name: str):
+        queued_at = time.perf_counter()
+        try:
+            async with self._slots:
+                metrics.observe("job_wait", time.perf_counter() - queued_at, key=name)
+                self._running += 1
+                try:
+                    return await coro
+                finally:
+                    self._running -= 1
+        finally:
+            # Never started (cancelled while queued); close it to avoid the warning
+            coro.close()
+
+    def _finished(self, task: asyncio.Task, owner: Hashable, user_id: int, name: str, coro: Coroutine):
+        # A task cancelled before its first step never entered _run; close
+        # the coroutine it was given (a no-op if it already ran)
+        coro.close()
+        self._pending -= 1
+        remaining = self._per_user.get(user_id, 1) - 1
+        if remaining:
+            self._per_user[user_id] = remaining
+        else:
+            self._per_user.pop(user_id, None)
+        owned = self._by_owner.get(owner)
+        if owned is not None:
+            owned.discard(task)
+            if not owned:
+                del self._by_owner[owner]
+
+        if task.cancelled():
+            metrics.incr("jobs_cancelled", key=name)
+        elif task.exception() is not None:
+            metrics.incr("jobs_failed", key=name)
+            print(f"Background job '{name}' failed: {task.exception()!r}")
+
+
+ai_jobs = JobRunner(
+    max_concurrent=settings.AI_JOBS_MAX_CONCURRENT,
+    max_per_user=settings.AI_JOBS_MAX_PER_USER,
+    max_pending=settings.AI_JOBS_MAX_PENDING,
+)
+metrics.register_collector("ai_jobs", ai_jobs.stats)
+
+# Speculative work (smart replies nobody has asked for yet), kept apart so
+# it never uses up a user's own allowance in ai_jobs
+precompute_jobs = JobRunner(
+    max_concurrent=settings.SMART_REPLY_PRECOMPUTE_MAX_CONCURRENT,
+    max_per_user=1,
+    max_pending=settings.SMART_REPLY_PRECOMPUTE_MAX_PENDING,
+)
+metrics.register_collector("precompute_jobs", precompute_jobs.stats)
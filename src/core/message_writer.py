@@ -0,0 +1,205 @@
+import asyncio
+import time
+from typing import List, Optional
+
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.functions import Max
+from tortoise.transactions import in_transaction
+
+from core.config import settings
+from core.metrics import metrics
+from models.message import Message
+from models.messagesequence import MessageSequence
+
+
+class MessageIdAllocator:
+    """
+    Hands out message ids before the row is written, reserving them from the
+    message_sequence table in blocks so most messages need no round trip.
+    Every message the app writes takes its id from here, so bulk INSERTs
+    know their ids; a block never starts below MAX(messages.id) + 1, so ids
+    stay clear of rows inserted with AUTO_INCREMENT before.
+    """
+
+    def __init__(self, block_size: int = 1000):
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self, count: int = 1) -> List[int]:
+        ids: List[int] = []
+        async with self._lock:
+            while len(ids) < count:
+                if self._next >= self._end:
+                    await self._reserve(max(self.block_size, count - len(ids)))
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+        return ids
+
+    def reset(self):
+        """Drop the reserved block, e.g. after switching to another database"""
+        self._next = self._end = 0
+
+    async def _reserve(self, size: int):
+        async with in_transaction() as conn:
+            seq = await MessageSequence.filter(id=1).using_db(conn).select_for_update().first()
+            highest = (await Message.all().using_db(conn).annotate(highest=Max("id")).values("highest"))[0]["highest"]
+            start = max(seq.next_id if seq else 1, (highest or 0) + 1)
+            if seq is None:
+                await MessageSequence.create(id=1, next_id=start + size, using_db=conn)
+            else:
+                await MessageSequence.filter(id=1).using_db(conn).update(next_id=start + size)
+        self._next, self._end = start, start + size
+        metrics.incr("message_id_blocks")
+
+
+class MessageWriter:
+    """
+    Creates chat messages, with ids from a MessageIdAllocator. By default
+    every message is INSERTed before it is returned. In write-behind mode the message gets its id and timestamp up
+    front, is returned (and can be broadcast) at once, and is written later
+    in a bulk INSERT, every `flush_interval` seconds or as soon as
+    `batch_size` rows are waiting.
+
+    Durability bounds: at most `flush_interval` seconds of messages (and
+    never more than `max_pending` rows) exist only in memory; once that many
+    are waiting, creating a message waits for the next flush. Pending rows
+    are flushed on stop().
+    """
+
+    def __init__(
+        self,
+        write_behind: bool = False,
+        batch_size: int = 200,
+        flush_interval: float = 0.05,
+        max_pending: int = 5000,
+        id_block_size: int = 1000,
+    ):
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.ids = MessageIdAllocator(id_block_size)
+        self._pending: List[Message] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._flushed: Optional[asyncio.Condition] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+
+    async def start(self):
+        if self.write_behind and self._flusher is None:
+            self._stopping = False
+            self._wake = asyncio.Event()
+            self._flushed = asyncio.Condition()
+            self._flush_lock = asyncio.Lock()
+            self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write out everything still pending"""
+        if self._flusher is None:
+            return
+        # Let a flush that is under way finish rather than cancelling it
+        self._stopping = True
+        self._wake.set()
+        await self._flusher
+        self._flusher = None
+        while self._pending:
+            if not await self.flush():
+                break
+
+    async def create(self, channel_id: int, author_id: int, content: str, durable: bool = False) -> Message:
+        """
+        Create a message. `durable` callers (e.g. the REST API, which answers
+        201) always get a row that is already written.
+        """
+        if not self.write_behind or durable or self._flusher is None:
+            (message_id,) = await self.ids.allocate()
+            return await Message.create(id=message_id, content=content, channel_id=channel_id, author_id=author_id)
+
+        while len(self._pending) >= self.max_pending:
+            metrics.incr("message_write_backpressure")
+            self._wake.set()
+            async with self._flushed:
+                await self._flushed.wait()
+
+        (message_id,) = await self.ids.allocate()
+        message = Message(id=message_id, channel_id=channel_id, author_id=author_id, content=content, sent_at=timezone.now())
+        self._pending.append(message)
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+        return message
+
+    async def insert_many(self, messages: List[Message], batch_size: Optional[int] = None, using_db=None):
+        """
+        INSERT messages built by the caller with bulk INSERTs, `batch_size`
+        rows per statement, giving them ids from the allocator (a multi-row
+        INSERT doesn't report AUTO_INCREMENT ids back)
+        """
+        for message, message_id in zip(messages, await self.ids.allocate(len(messages))):
+            message.id = message_id
+        await Message.bulk_create(messages, batch_size=batch_size, using_db=using_db)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        return {"write_behind": self.write_behind, "pending": len(self._pending)}
+
+    async def flush(self) -> bool:
+        """Write out every pending message; False if the database refused them"""
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return True
+            started = time.perf_counter()
+            try:
+                await Message.bulk_create(batch)
+            except IntegrityError:
+                # e.g. a channel deleted while its messages were queued; save
+                # the rows that can be saved rather than losing the batch
+                await self._insert_individually(batch)
+            except Exception as e:
+                print(f"Message flush failed, will retry: {e}")
+                metrics.incr("message_flush_errors")
+                self._pending[:0] = batch
+                return False
+            finally:
+                metrics.observe("message_flush", time.perf_counter() - started)
+            metrics.incr("messages_flushed", len(batch))
+        async with self._flushed:
+            self._flushed.notify_all()
+        return True
+
+    async def _insert_individually(self, batch: List[Message]):
+        for message in batch:
+            try:
+                await Message.bulk_create([message])
+            except IntegrityError as e:
+                print(f"Dropping message {message.id}: {e}")
+                metrics.incr("messages_dropped")
+
+    async def _run(self):
+        backoff = self.flush_interval
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            ok = await self.flush()
+            backoff = self.flush_interval if ok else min(backoff * 2, 5.0)
+
+
+message_writer = MessageWriter(
+    write_behind=settings.MESSAGE_WRITE_BEHIND,
+    batch_size=settings.MESSAGE_FLUSH_BATCH_SIZE,
+    flush_interval=settings.MESSAGE_FLUSH_INTERVAL_MS / 1000,
+    max_pending=settings.MESSAGE_WRITE_BEHIND_MAX_PENDING,
+    id_block_size=settings.MESSAGE_ID_BLOCK_SIZE,
+)
+metrics.register_collector("message_writer", message_writer.stats)
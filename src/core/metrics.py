@@ -0,0 +1,97 @@
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Hashable
+
+from core.config import settings
+
+
+class LatencyStats:
+    """Rolling window of latency samples (in seconds) with percentile summaries"""
+
+    def __init__(self, window: int = 1024):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(0.50) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+        }
+
+
+class MetricsRegistry:
+    """
+    In-process metrics: latency windows, counters and gauges, optionally keyed
+    (e.g. per channel). Collectors are called on snapshot for values that are
+    cheaper to compute on demand than to keep up to date.
+
+    A keyed latency or counter series keeps at most `max_keys` keys, the most
+    recently updated ones. Evicted latency windows are dropped; evicted
+    counts are folded into the "other" key so totals stay right.
+    """
+
+    OTHER = "other"
+
+    def __init__(self, max_keys: int = 256):
+        self.max_keys = max_keys
+        self.latencies: Dict[str, "OrderedDict[Hashable, LatencyStats]"] = {}
+        self.counters: Dict[str, "OrderedDict[Hashable, int]"] = {}
+        self.gauges: Dict[str, Dict[Hashable, float]] = {}
+        self.collectors: Dict[str, Callable[[], Any]] = {}
+
+    def observe(self, name: str, seconds: float, key: Hashable = None) -> None:
+        series = self.latencies.setdefault(name, OrderedDict())
+        stats = series.get(key)
+        if stats is None:
+            stats = series[key] = LatencyStats()
+            while len(series) > self.max_keys:
+                series.popitem(last=False)
+        else:
+            series.move_to_end(key)
+        stats.observe(seconds)
+
+    def incr(self, name: str, amount: int = 1, key: Hashable = None) -> None:
+        series = self.counters.setdefault(name, OrderedDict())
+        series[key] = series.pop(key, 0) + amount
+        while len(series) > self.max_keys:
+            evicted, count = series.popitem(last=False)
+            if evicted == self.OTHER:
+                series[self.OTHER] = count
+                continue
+            series[self.OTHER] = series.pop(self.OTHER, 0) + count
+
+    def set_gauge(self, name: str, value: float, key: Hashable = None) -> None:
+        self.gauges.setdefault(name, {})[key] = value
+
+    def register_collector(self, name: str, collector: Callable[[], Any]) -> None:
+        self.collectors[name] = collector
+
+    def snapshot(self) -> dict:
+        def flatten(series: Dict[Hashable, Any]) -> Any:
+            if list(series) == [None]:
+                return series[None]
+            return {str(key): value for key, value in series.items()}
+
+        return {
+            "latency": {
+                name: flatten({key: stats.snapshot() for key, stats in series.items()})
+                for name, series in self.latencies.items()
+            },
+            "counters": {name: flatten(series) for name, series in self.counters.items()},
+            "gauges": {name: flatten(series) for name, series in self.gauges.items()},
+            **{name: collector() for name, collector in self.collectors.items()},
+        }
+
+
+metrics = MetricsRegistry(max_keys=settings.METRICS_MAX_KEYS)
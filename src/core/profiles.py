@@ -0,0 +1,43 @@
+from typing import Dict, Iterable
+
+from core.cache import TTLCache
+from core.config import settings
+from core.metrics import metrics
+from models.user import User
+
+# user id -> public profile shown next to their messages. Only display data
+# lives here (users have no avatar column yet, so it is just the name);
+# routers/users.py invalidates on every user change.
+author_profiles = TTLCache(maxsize=settings.AUTHOR_PROFILE_CACHE_SIZE, ttl=settings.AUTHOR_PROFILE_CACHE_TTL)
+metrics.register_collector("author_profiles", author_profiles.stats)
+
+
+async def get_profiles(user_ids: Iterable[int]) -> Dict[int, dict]:
+    """Profiles for the given users: cached ones from memory, the rest in one query"""
+    profiles: Dict[int, dict] = {}
+    missing = []
+    for user_id in set(user_ids):
+        profile = author_profiles.get(user_id)
+        if profile is None:
+            missing.append(user_id)
+        else:
+            profiles[user_id] = profile
+    if missing:
+        for user_id, full_name in await User.filter(id__in=missing).values_list("id", "full_name"):
+            profiles[user_id] = remember_profile(user_id, full_name)
+    return profiles
+
+
+def remember_profile(user_id: int, full_name: str) -> dict:
+    profile = {"id": user_id, "name": full_name}
+    author_profiles.set(user_id, profile)
+    return profile
+
+
+def display_name(profiles: Dict[int, dict], user_id: int) -> str:
+    profile = profiles.get(user_id)
+    return profile["name"] if profile else "Deleted user"
+
+
+def invalidate_profile(user_id: int):
+    author_profiles.pop(user_id)
@@ -0,0 +1,126 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from core.config import settings
+from core.metrics import metrics
+
+
+class _ChannelTail:
+    __slots__ = ("messages", "complete")
+
+    def __init__(self, messages: Iterable[dict], size: int, complete: bool):
+        self.messages: Deque[dict] = deque(messages, maxlen=size)
+        # True when the buffer holds the channel's entire history
+        self.complete = complete
+
+
+class RecentMessages:
+    """
+    Ring buffer of the newest serialized messages per channel, so history,
+    /summarize, smart replies and the chatbot don't re-query the channel tail.
+
+    A channel is only served from memory once it has been seeded from the DB,
+    so the buffer always holds a true tail. The number of buffered messages
+    across all channels is capped; the least recently used channels go first.
+    """
+
+    def __init__(self, per_channel: int = 50, max_messages: int = 100_000):
+        self.per_channel = per_channel
+        self.max_messages = max_messages
+        self._channels: "OrderedDict[int, _ChannelTail]" = OrderedDict()
+        # Messages sent while a channel's tail is being loaded from the DB,
+        # and how many loads of it are in flight
+        self._loading: Dict[int, List[dict]] = {}
+        self._loaders: Dict[int, int] = {}
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, channel_id: int, limit: int) -> Optional[Tuple[List[dict], bool]]:
+        """The newest `limit` messages (oldest first) and has_more, or None on a miss"""
+        tail = self._channels.get(channel_id)
+        if tail is None or (len(tail.messages) < limit and not tail.complete):
+            self.misses += 1
+            return None
+        self._channels.move_to_end(channel_id)
+        self.hits += 1
+        messages = list(tail.messages)[-limit:] if limit else []
+        return messages, len(tail.messages) > limit or not tail.complete
+
+    def tracks(self, channel_id: int) -> bool:
+        return channel_id in self._channels or channel_id in self._loading
+
+    def begin_load(self, channel_id: int):
+        """
+        Call before querying a channel's tail so messages sent meanwhile
+        aren't lost; follow with seed(), or abort_load() if the query failed
+        """
+        self._loading.setdefault(channel_id, [])
+        self._loaders[channel_id] = self._loaders.get(channel_id, 0) + 1
+
+    def abort_load(self, channel_id: int):
+        self._end_load(channel_id)
+
+    def _end_load(self, channel_id: int) -> List[dict]:
+        late = self._loading.get(channel_id, [])
+        remaining = self._loaders.get(channel_id, 1) - 1
+        if remaining > 0:
+            self._loaders[channel_id] = remaining
+        else:
+            self._loaders.pop(channel_id, None)
+            self._loading.pop(channel_id, None)
+        return late
+
+    def seed(self, channel_id: int, messages: List[dict], has_more: bool):
+        """Store a freshly loaded tail (oldest first)"""
+        late = self._end_load(channel_id)
+        if channel_id in self._channels:
+            # Another load won the race and has been collecting appends since
+            return
+        loaded = {m["id"] for m in messages}
+        messages = messages + [m for m in late if m["id"] not in loaded]
+        tail = _ChannelTail(messages, self.per_channel, complete=not has_more and len(messages) <= self.per_channel)
+        self._channels[channel_id] = tail
+        self._total += len(tail.messages)
+        self._shrink()
+
+    def append(self, channel_id: int, message: dict):
+        """Record a newly sent message; channels that aren't buffered are left alone"""
+        tail = self._channels.get(channel_id)
+        if tail is None:
+            if channel_id in self._loading:
+                self._loading[channel_id].append(message)
+            return
+        if len(tail.messages) == tail.messages.maxlen:
+            tail.complete = False
+        else:
+            self._total += 1
+        tail.messages.append(message)
+        self._channels.move_to_end(channel_id)
+        self._shrink()
+
+    def evict(self, channel_id: int):
+        tail = self._channels.pop(channel_id, None)
+        if tail is not None:
+            self._total -= len(tail.messages)
+
+    def clear(self):
+        self._channels.clear()
+        self._loading.clear()
+        self._loaders.clear()
+        self._total = 0
+
+    def stats(self) -> dict:
+        return {"channels": len(self._channels), "messages": self._total, "hits": self.hits, "misses": self.misses}
+
+    def _shrink(self):
+        while self._total > self.max_messages and self._channels:
+            _, tail = self._channels.popitem(last=False)
+            self._total -= len(tail.messages)
+
+
+message_buffer = RecentMessages(
+    per_channel=settings.RECENT_MESSAGES_PER_CHANNEL,
+    max_messages=settings.RECENT_MESSAGES_MAX_TOTAL,
+)
+metrics.register_collector("recent_messages", message_buffer.stats)
@@ -0,0 +1,111 @@
+"""
+Full-text search over message content, using the database's own inverted
+index: a FULLTEXT index on MySQL (see the migration) and an FTS5 table kept
+in sync by triggers on SQLite. Results are ranked by relevance and paged
+with an opaque (score, id) cursor.
+"""
+import asyncio
+import base64
+import json
+from typing import Iterable, List, Optional, Tuple
+
+from tortoise import connections
+
+SQLITE_FTS_SETUP = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content='messages', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+)
+
+_setup_lock = asyncio.Lock()
+
+
+def encode_cursor(score: float, message_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, message_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Raises ValueError for anything that isn't a cursor we handed out"""
+    try:
+        score, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(message_id)
+    except Exception as e:
+        raise ValueError("Invalid search cursor") from e
+
+
+async def ensure_search_index(conn=None):
+    """Create the SQLite FTS table and triggers (indexing existing rows) on first use"""
+    conn = conn or connections.get("default")
+    if conn.capabilities.dialect != "sqlite":
+        return
+    async with _setup_lock:
+        existed = await conn.execute_query_dict(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        )
+        if existed:
+            return
+        for statement in SQLITE_FTS_SETUP:
+            await conn.execute_script(statement)
+        await conn.execute_script("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
+
+def _fts5_query(text: str) -> str:
+    # Every word as a quoted term, so user input can't use FTS5 operators
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+async def search_messages(
+    text: str,
+    channel_ids: Iterable[int],
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Messages in `channel_ids` matching `text`, best match first (ties by
+    newest), and the cursor for the next page or None.
+    """
+    channel_ids = sorted(set(channel_ids))
+    if not channel_ids or not text.split():
+        return [], None
+    after = decode_cursor(cursor) if cursor else None
+
+    conn = connections.get("default")
+    await ensure_search_index(conn)
+    if conn.capabilities.dialect == "mysql":
+        in_list = ", ".join(["%s"] * len(channel_ids))
+        sql = (
+            "SELECT id, channel_id, author_id, content, sent_at, "
+            "MATCH(content) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score FROM messages "
+            f"WHERE MATCH(content) AGAINST (%s IN NATURAL LANGUAGE MODE) AND channel_id IN ({in_list})"
+        )
+        values: list = [text, text, *channel_ids]
+        if after is not None:
+            sql += " HAVING score < %s OR (score = %s AND id < %s)"
+            values += [after[0], after[0], after[1]]
+        sql += " ORDER BY score DESC, id DESC LIMIT %s"
+    else:
+        in_list = ", ".join(["?"] * len(channel_ids))
+        # bm25() is lower-is-better; negate it so both backends rank descending
+        sql = (
+            "SELECT * FROM (SELECT m.id, m.channel_id, m.author_id, m.content, m.sent_at, "
+            "-bm25(messages_fts) AS score FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+            f"WHERE messages_fts MATCH ? AND m.channel_id IN ({in_list}))"
+        )
+        values = [_fts5_query(text), *channel_ids]
+        if after is not None:
+            sql += " WHERE score < ? OR (score = ? AND id < ?)"
+            values += [after[0], after[0], after[1]]
+        sql += " ORDER BY score DESC, id DESC LIMIT ?"
+    values.append(limit + 1)
+
+    rows = await conn.execute_query_dict(sql, values)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["score"], rows[-1]["id"])
+    return rows, next_cursor
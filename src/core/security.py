@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from uuid import uuid4
 
@@ -23,6 +25,38 @@ def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# bcrypt takes ~100-300 ms per call and releases the GIL, so the async
+# variants run it on a small thread pool instead of blocking the event loop.
+# At most PASSWORD_HASH_WORKERS hashes run at once; callers beyond
+# PASSWORD_HASH_MAX_PENDING waiting ones are turned away with a 503.
+_hash_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS)
+_hash_pending = 0
+
+
+async def _run_hashing(fn, *args):
+    global _hash_pending
+    if _hash_pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password checks in progress, try again shortly"
+        )
+    _hash_pending += 1
+    try:
+        async with _hash_slots:
+            return await asyncio.get_running_loop().run_in_executor(_hash_pool, fn, *args)
+    finally:
+        _hash_pending -= 1
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await _run_hashing(verify_password, plain, hashed)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hashing(hash_password, password)
+
+
 def create_access_token(subject: str, role: str | None, jti: str | None = None):
     to_encode = {
         "sub": subject,
@@ -62,7 +96,7 @@ async def authenticate_user(email: str, password: str) -> User | None:
     except DoesNotExist:
         return None
 
-    if not verify_password(password, user.hashed_pw):
+    if not await verify_password_async(password, user.hashed_pw):
         return None
 
     user.last_login = datetime.utcnow()
@@ -2,9 +2,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from tortoise.exceptions import DoesNotExist
 
-from routers import auth, channels, messages, ws_chat, roles, users, dm
+from routers import auth, channels, messages, ws_chat, roles, users, dm, metrics
 from core.database import init_db
-from core.security import hash_password # <--- Add this import
+from core.ai_client import ai_client
+from core.jobs import ai_jobs, precompute_jobs
+from core.message_writer import message_writer
+from core.security import hash_password_async # <--- Add this import
 from models.user import User # <--- Add this import
 from models.role import Role # <--- Add this import
 
@@ -29,7 +32,7 @@ async def startup_event():
         email="chatbot@internal.local",
         defaults={
             "full_name": "Chatbot",
-            "hashed_password": hash_password("you-cannot-login-as-the-bot"),
+            "hashed_password": await hash_password_async("you-cannot-login-as-the-bot"),
             "role": member_role,
         }
     )
@@ -39,9 +42,23 @@ async def startup_event():
     # Store the chatbot's ID in the app's state for easy access
     app.state.chatbot_user_id = chatbot_user.id
     print(f"Chatbot user ID ({app.state.chatbot_user_id}) is available in app.state")
+
+    # Join the cross-process backplane so broadcasts reach every worker
+    await ws_chat.manager.start()
+    await message_writer.start()
 # --- END STARTUP EVENT ---
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ws_chat.manager.stop()
+    await ai_jobs.stop()
+    await precompute_jobs.stop()
+    # After the jobs, which may still be posting chatbot replies
+    await message_writer.stop()
+    await ai_client.close()
+
+
 origins = ["http://localhost:3000", "http://localhost:5173"]
 app.add_middleware(
     CORSMiddleware,
@@ -59,5 +76,6 @@ app.include_router(ws_chat.router)
 app.include_router(roles.router)
 app.include_router(users.router)
 app.include_router(dm.router)
+app.include_router(metrics.router)
 
 init_db(app)
\ No newline at end of file
@@ -0,0 +1,4 @@
+##### upgrade #####
+ALTER TABLE `messages` ADD INDEX `idx_messages_channel_c4a15d` (`channel_id`, `sent_at`, `id`);
+##### downgrade #####
+ALTER TABLE `messages` DROP INDEX `idx_messages_channel_c4a15d`;
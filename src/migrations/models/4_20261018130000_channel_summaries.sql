@@ -0,0 +1,11 @@
+##### upgrade #####
+CREATE TABLE IF NOT EXISTS `channel_summaries` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `content` LONGTEXT NOT NULL,
+    `last_message_id` INT NOT NULL,
+    `updated_at` DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    `channel_id` INT NOT NULL UNIQUE,
+    CONSTRAINT `fk_channel__channels_f37bd2f2` FOREIGN KEY (`channel_id`) REFERENCES `channels` (`id`) ON DELETE CASCADE
+) CHARACTER SET utf8mb4;
+##### downgrade #####
+DROP TABLE IF EXISTS `channel_summaries`;
@@ -0,0 +1,7 @@
+##### upgrade #####
+CREATE TABLE IF NOT EXISTS `message_sequence` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `next_id` BIGINT NOT NULL
+) CHARACTER SET utf8mb4;
+##### downgrade #####
+DROP TABLE IF EXISTS `message_sequence`;
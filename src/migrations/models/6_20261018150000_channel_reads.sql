@@ -0,0 +1,12 @@
+##### upgrade #####
+CREATE TABLE IF NOT EXISTS `channel_reads` (
+    `id` INT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `last_read_message_id` INT NOT NULL DEFAULT 0,
+    `channel_id` INT NOT NULL,
+    `user_id` INT NOT NULL,
+    UNIQUE KEY `uid_channel_rea_user_id_8c9951` (`user_id`, `channel_id`),
+    CONSTRAINT `fk_channel__channels_3fd598d9` FOREIGN KEY (`channel_id`) REFERENCES `channels` (`id`) ON DELETE CASCADE,
+    CONSTRAINT `fk_channel__users_14ce008a` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE CASCADE
+) CHARACTER SET utf8mb4 COMMENT='How far a user has read in a channel (public or private)';
+##### downgrade #####
+DROP TABLE IF EXISTS `channel_reads`;
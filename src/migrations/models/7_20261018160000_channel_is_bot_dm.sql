@@ -0,0 +1,11 @@
+##### upgrade #####
+ALTER TABLE `channels` ADD `is_bot_dm` BOOL NOT NULL DEFAULT 0;
+UPDATE `channels` c SET c.`is_bot_dm` = 1
+WHERE c.`is_private` = 1
+  AND (SELECT COUNT(*) FROM `channel_members` m WHERE m.`channel_id` = c.`id`) = 2
+  AND EXISTS (
+      SELECT 1 FROM `channel_members` m JOIN `users` u ON u.`id` = m.`user_id`
+      WHERE m.`channel_id` = c.`id` AND u.`email` = 'chatbot@internal.local'
+  );
+##### downgrade #####
+ALTER TABLE `channels` DROP COLUMN `is_bot_dm`;
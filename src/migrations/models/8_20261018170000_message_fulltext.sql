@@ -0,0 +1,4 @@
+##### upgrade #####
+ALTER TABLE `messages` ADD FULLTEXT INDEX `ftx_messages_content` (`content`);
+##### downgrade #####
+ALTER TABLE `messages` DROP INDEX `ftx_messages_content`;
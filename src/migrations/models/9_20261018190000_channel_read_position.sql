@@ -0,0 +1,6 @@
+##### upgrade #####
+ALTER TABLE `channel_reads` ADD `last_read_at` DATETIME(6);
+UPDATE `channel_reads` r JOIN `messages` m ON m.`id` = r.`last_read_message_id`
+SET r.`last_read_at` = m.`sent_at`;
+##### downgrade #####
+ALTER TABLE `channel_reads` DROP COLUMN `last_read_at`;
@@ -5,6 +5,8 @@ class Channel(models.Model):
     id: int = fields.IntField(pk=True)
     name: str = fields.CharField(max_length=60)
     is_private: bool = fields.BooleanField(default=False)
+    # Private DM between one user and the chatbot (answers come from the AI service)
+    is_bot_dm: bool = fields.BooleanField(default=False)
 
     role: fields.ForeignKeyNullableRelation[Role] = fields.ForeignKeyField(
         "models.Role", related_name="channels", null=True
@@ -1,4 +1,7 @@
+from typing import Iterable, Optional
+
 from tortoise import models, fields
+from tortoise.backends.base.client import BaseDBAsyncClient
 
 class ChannelMember(models.Model):
     id        = fields.IntField(pk=True)  
@@ -9,3 +12,22 @@ class ChannelMember(models.Model):
     class Meta:
         table = "channel_members"
         unique_together = (("user", "channel"),)
+
+    @classmethod
+    async def add_many(
+        cls, channel_id: int, user_ids: Iterable[int], using_db: Optional[BaseDBAsyncClient] = None
+    ) -> None:
+        """Add users to a channel in bulk INSERTs; existing members are left as they are"""
+        rows = [cls(channel_id=channel_id, user_id=user_id) for user_id in set(user_ids)]
+        if rows:
+            await cls.bulk_create(rows, batch_size=500, ignore_conflicts=True, using_db=using_db)
+
+    @classmethod
+    async def remove_many(
+        cls, channel_id: int, user_ids: Iterable[int], using_db: Optional[BaseDBAsyncClient] = None
+    ) -> int:
+        """Remove users from a channel in one DELETE; returns how many were members"""
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return 0
+        return await cls.filter(channel_id=channel_id, user_id__in=user_ids).using_db(using_db).delete()
@@ -0,0 +1,15 @@
+from tortoise import models, fields
+
+class ChannelRead(models.Model):
+    """How far a user has read in a channel (public or private)"""
+    id                   = fields.IntField(pk=True)
+    user                 = fields.ForeignKeyField("models.User", related_name="channel_reads")
+    channel              = fields.ForeignKeyField("models.Channel", related_name="reads")
+    last_read_message_id = fields.IntField(default=0)
+    # sent_at of that message: history is ordered by (sent_at, id), and ids
+    # from write-behind workers don't grow with time across workers
+    last_read_at         = fields.DatetimeField(null=True)
+
+    class Meta:
+        table = "channel_reads"
+        unique_together = (("user", "channel"),)
@@ -0,0 +1,12 @@
+from tortoise import models, fields
+
+class ChannelSummary(models.Model):
+    id              = fields.IntField(pk=True)
+    channel         = fields.OneToOneField("models.Channel", related_name="summary")
+    content         = fields.TextField()
+    # Newest message folded into `content`; later messages are the delta
+    last_message_id = fields.IntField()
+    updated_at      = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "channel_summaries"
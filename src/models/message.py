@@ -1,4 +1,18 @@
+from typing import AsyncIterator, List, Optional, Tuple
+
 from tortoise import models, fields
+from tortoise.contrib.mysql.indexes import FullTextIndex
+from tortoise.expressions import Q
+
+
+class MySQLFullTextIndex(FullTextIndex):
+    """A FULLTEXT index on MySQL; other databases get none (SQLite search uses FTS5, see core.search)"""
+
+    def get_sql(self, schema_generator, model, safe: bool) -> str:
+        if schema_generator.client.capabilities.dialect != "mysql":
+            return ""
+        return super().get_sql(schema_generator, model, safe)
+
 
 class Message(models.Model):
     id       = fields.IntField(pk=True)  
@@ -10,3 +24,72 @@ class Message(models.Model):
     class Meta:
         table = "messages"
         ordering = ["-sent_at"]
+        # Keyset pagination seeks on (channel, sent_at, id) instead of scanning
+        # Search matches content through the FULLTEXT index (migration 8)
+        indexes = (
+            ("channel_id", "sent_at", "id"),
+            MySQLFullTextIndex(fields=("content",), name="ftx_messages_content"),
+        )
+
+    @classmethod
+    async def page(
+        cls,
+        channel_id: int,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: int = 50,
+        prefetch: Tuple[str, ...] = (),
+    ) -> Tuple[List["Message"], bool]:
+        """
+        One page of a channel's history in chronological order, plus whether
+        more rows lie beyond it. `before_id` pages back from a message,
+        `after_id` forward; neither gives the newest page. Rows are ordered by
+        (sent_at, id), so each page is an index seek from the cursor row.
+        """
+        query = cls.filter(channel_id=channel_id)
+        cursor_id = before_id if before_id is not None else after_id
+        if cursor_id is not None:
+            anchor = await cls.filter(id=cursor_id, channel_id=channel_id).first().values("sent_at", "id")
+            if not anchor:
+                return [], False
+            if before_id is not None:
+                query = query.filter(
+                    Q(sent_at__lt=anchor["sent_at"]) | Q(sent_at=anchor["sent_at"], id__lt=anchor["id"])
+                )
+            else:
+                query = query.filter(
+                    Q(sent_at__gt=anchor["sent_at"]) | Q(sent_at=anchor["sent_at"], id__gt=anchor["id"])
+                )
+        newest_first = after_id is None
+        order = ("-sent_at", "-id") if newest_first else ("sent_at", "id")
+        rows = await query.order_by(*order).limit(limit + 1).prefetch_related(*prefetch)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if newest_first:
+            rows.reverse()
+        return rows, has_more
+
+    @classmethod
+    async def iterate(
+        cls, channel_id: int, batch_size: int = 1000, fields: Tuple[str, ...] = ("id", "author_id", "content", "sent_at")
+    ) -> AsyncIterator[List[dict]]:
+        """
+        A channel's whole history, oldest first, as batches of value dicts.
+        Each batch is an index seek from the last row of the previous one, so
+        cost per batch stays flat however deep into the channel it is.
+        """
+        fields = tuple(dict.fromkeys(fields + ("id", "sent_at")))
+        last = None
+        while True:
+            query = cls.filter(channel_id=channel_id)
+            if last is not None:
+                query = query.filter(
+                    Q(sent_at__gt=last["sent_at"]) | Q(sent_at=last["sent_at"], id__gt=last["id"])
+                )
+            rows = await query.order_by("sent_at", "id").limit(batch_size).values(*fields)
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            last = rows[-1]
@@ -0,0 +1,12 @@
+from tortoise import models, fields
+
+class MessageSequence(models.Model):
+    """
+    Single-row counter for message ids handed out ahead of the INSERT
+    (write-behind persistence). Workers reserve ids in blocks.
+    """
+    id      = fields.IntField(pk=True)
+    next_id = fields.BigIntField()
+
+    class Meta:
+        table = "message_sequence"
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Response, HTTPException, status, Request, Depends
 from uuid import uuid4
 
-from core.security import verify_password, create_access_token
+from core.security import verify_password_async, create_access_token
 from models.user import User
 from schemas.token import LoginRequest, TokenResponse
-from core.dependencies import get_current_user
+from core.dependencies import get_current_user, invalidate_session
 
 router = APIRouter()
 
@@ -12,13 +12,14 @@ router = APIRouter()
 @router.post("/login", response_model=TokenResponse)
 async def login(payload: LoginRequest, resp: Response):
     user = await User.get_or_none(email=payload.email)
-    if not user or not verify_password(payload.password, user.hashed_password):
+    if not user or not await verify_password_async(payload.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
     await user.fetch_related("role") 
     jti = str(uuid4())
     user.current_jti = jti
     await user.save()
+    invalidate_session(user.email)
 
     token = create_access_token(user.email, user.role.name if user.role else None, jti)
     resp.set_cookie(
@@ -46,8 +47,10 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 async def logout(response: Response, current_user: User = Depends(get_current_user)):
     """Logout current user"""
     # Invalidate the current JWT
+    # current_user may be the shared cached copy; write back only the jti
     current_user.current_jti = None
-    await current_user.save()
+    await current_user.save(update_fields=["current_jti"])
+    invalidate_session(current_user.email)
     
     # Clear the cookie
     response.delete_cookie(
@@ -3,11 +3,26 @@ from typing import List
 
 from models.channel import Channel
 from models.channelmember import ChannelMember
+from models.channelread import ChannelRead
+from models.message import Message
 from models.user import User
-from core.dependencies import get_current_user
+from core.acl import (
+    cached_visible_channels,
+    can_access,
+    get_channel_acl,
+    invalidate_all_channels,
+    invalidate_channel,
+    invalidate_user_channels,
+    remember_visible_channels,
+    require_channel_access,
+    visible_to,
+)
+from core.dependencies import get_current_user, is_admin
+from routers.ws_chat import manager
 from pydantic import BaseModel
 
-from tortoise.expressions import Q
+from tortoise.expressions import Q, RawSQL
+from tortoise.transactions import in_transaction
 
 router = APIRouter(prefix="/channels", tags=["channels"])
 
@@ -19,45 +34,144 @@ class ChannelCreate(BaseModel):
     members: List[int] | None = None  # only when private
 
 
-@router.get("/", dependencies=[Depends(get_current_user)])
+class MarkRead(BaseModel):
+    message_id: int | None = None
+
+
+class MembersUpdate(BaseModel):
+    add: List[int] = []
+    remove: List[int] = []
+
+
+async def validate_user_ids(user_ids: List[int]) -> List[int]:
+    """Distinct ids, checked against the users table in one query"""
+    wanted = set(user_ids)
+    if not wanted:
+        return []
+    found = set(await User.filter(id__in=wanted).values_list("id", flat=True))
+    missing = sorted(wanted - found)
+    if missing:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown user ids: {missing}")
+    return sorted(found)
+
+
+# Unread counts stop at this many, so a channel the user never opened
+# doesn't cost a count of its whole history
+UNREAD_COUNT_CAP = 99
+
+
+@router.get("/")
 async def list_my_channels(user: User = Depends(get_current_user)):
-    # Get public channels and private channels the user is a member of
-    public_channels = await Channel.filter(
-        is_private=False,
-        role_id__in=[None, user.role_id] if user.role_id else [None]
-    ).all()
-    
-    # Get private channels through membership
-    private_channel_ids = await ChannelMember.filter(
-        user_id=user.id
-    ).values_list("channel_id", flat=True)
-    
-    private_channels = await Channel.filter(
-        id__in=private_channel_ids,
-        is_private=True
-    ).all()
-    
-    # Combine and format
-    all_channels = public_channels + private_channels
-    
+    """
+    Every channel the user can see, with its newest message id and how many
+    messages from others they haven't read, in one query. Counts are capped
+    at UNREAD_COUNT_CAP ("unread_capped" is set beyond that). The set of
+    visible channel ids is cached per user, so most calls skip the
+    membership check.
+
+    Messages are ordered by (sent_at, id), like history. The capped count
+    is a derived table that refers to the outer channel row; MySQL supports
+    that from 8.0.14.
+    """
+    cached_ids = cached_visible_channels(user.id)
+    query = Channel.filter(id__in=list(cached_ids)) if cached_ids is not None else Channel.filter(visible_to(user))
+    uid = int(user.id)
+    marker = "(SELECT r.{} FROM channel_reads r WHERE r.channel_id = channels.id AND r.user_id = %d)" % uid
+    read_at = f"COALESCE({marker.format('last_read_at')}, '1970-01-01')"
+    read_id = f"COALESCE({marker.format('last_read_message_id')}, 0)"
+    channels = await query.annotate(
+        last_message_id=RawSQL(
+            "(SELECT m.id FROM messages m WHERE m.channel_id = channels.id ORDER BY m.sent_at DESC, m.id DESC LIMIT 1)"
+        ),
+        unread_count=RawSQL(
+            "(SELECT COUNT(*) FROM (SELECT 1 FROM messages m WHERE m.channel_id = channels.id"
+            f" AND m.author_id <> {uid} AND m.sent_at >= {read_at} AND (m.sent_at > {read_at} OR m.id > {read_id})"
+            f" LIMIT {UNREAD_COUNT_CAP + 1}) unread)"
+        ),
+    ).order_by("id").values("id", "name", "is_private", "last_message_id", "unread_count")
+    if cached_ids is None:
+        remember_visible_channels(user.id, [ch["id"] for ch in channels])
     return [
         {
-            "id": ch.id,
-            "name": ch.name,
-            "is_private": ch.is_private
+            **ch,
+            "is_private": bool(ch["is_private"]),
+            "unread_count": min(ch["unread_count"] or 0, UNREAD_COUNT_CAP),
+            "unread_capped": (ch["unread_count"] or 0) > UNREAD_COUNT_CAP,
         }
-        for ch in all_channels
+        for ch in channels
     ]
 
 
+@router.post("/{channel_id}/read", status_code=204)
+async def mark_read(channel_id: int, payload: MarkRead, user: User = Depends(get_current_user)):
+    """Move the user's read marker forward (to the newest message if none is given)"""
+    await require_channel_access(user, channel_id)
+    query = Message.filter(channel_id=channel_id)
+    if payload.message_id is not None:
+        query = query.filter(id=payload.message_id)
+    target = await query.order_by("-sent_at", "-id").first().values("id", "sent_at")
+    if not target:
+        if payload.message_id is not None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
+        return
+    marker, created = await ChannelRead.get_or_create(
+        channel_id=channel_id, user_id=user.id,
+        defaults={"last_read_message_id": target["id"], "last_read_at": target["sent_at"]},
+    )
+    if created:
+        return
+    if marker.last_read_at is not None and (target["sent_at"], target["id"]) <= (marker.last_read_at, marker.last_read_message_id):
+        return
+    # Only if nobody moved the marker meanwhile
+    await ChannelRead.filter(id=marker.id, last_read_message_id=marker.last_read_message_id).update(
+        last_read_message_id=target["id"], last_read_at=target["sent_at"]
+    )
+
+
 @router.post("/", status_code=201)
 async def create_channel(payload: ChannelCreate, user: User = Depends(get_current_user)):
     # if role‑bound, only admins can create
     if payload.role_id and (user.role is None or user.role.name != "admin"):
         raise HTTPException(status_code=403)
 
-    ch = await Channel.create(name=payload.name, is_private=payload.is_private, role_id=payload.role_id)
-    if payload.is_private and payload.members:
-        for uid in payload.members + [user.id]:
-            await ChannelMember.get_or_create(channel_id=ch.id, user_id=uid)
-    return {"id": ch.id, "name": ch.name, "is_private": ch.is_private}
\ No newline at end of file
+    member_ids = await validate_user_ids(payload.members) if payload.is_private and payload.members else []
+    async with in_transaction() as conn:
+        ch = await Channel.create(name=payload.name, is_private=payload.is_private, role_id=payload.role_id, using_db=conn)
+        if member_ids:
+            await ChannelMember.add_many(ch.id, member_ids + [user.id], using_db=conn)
+    if ch.is_private:
+        invalidate_user_channels(user.id, *member_ids)
+    else:
+        invalidate_all_channels()
+    return {"id": ch.id, "name": ch.name, "is_private": ch.is_private}
+
+
+@router.patch("/{channel_id}/members")
+async def update_members(channel_id: int, payload: MembersUpdate, user: User = Depends(get_current_user)):
+    """
+    Add and remove members of a private channel in one transaction. Members
+    may add people and leave; only admins remove others. Removed users'
+    live sockets are unsubscribed from the channel.
+    """
+    acl = await get_channel_acl(channel_id)
+    if acl is None:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    if not acl.is_private:
+        raise HTTPException(status_code=400, detail="Public channels have no member list")
+    if acl.is_bot_dm:
+        raise HTTPException(status_code=400, detail="Chatbot channels have fixed members")
+    admin = is_admin(user)
+    if not admin and not can_access(user, acl):
+        raise HTTPException(status_code=403)
+    # Channels don't record a creator, so only admins remove other people
+    if not admin and set(payload.remove) - {user.id}:
+        raise HTTPException(status_code=403, detail="Only admins can remove other members")
+
+    to_add = await validate_user_ids(payload.add)
+    async with in_transaction() as conn:
+        await ChannelMember.add_many(channel_id, to_add, using_db=conn)
+        removed = await ChannelMember.remove_many(channel_id, payload.remove, using_db=conn)
+    invalidate_user_channels(*to_add, *payload.remove)
+    invalidate_channel(channel_id)
+    await manager.revoke(channel_id, payload.remove)
+    return {"id": channel_id, "added": len(to_add), "removed": removed}
\ No newline at end of file
@@ -1,10 +1,11 @@
 # routers/dm.py 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from tortoise.transactions import in_transaction
 from tortoise.exceptions import IntegrityError
 from models.user import User
 from models.channel import Channel
 from models.channelmember import ChannelMember
+from core.acl import invalidate_user_channels
 from core.dependencies import get_current_user
 
 router = APIRouter(prefix="/dms", tags=["direct messages"])
@@ -17,7 +18,7 @@ async def list_recipients(me: User = Depends(get_current_user)):
 
 
 @router.post("/{other_id}", status_code=status.HTTP_201_CREATED)
-async def open_dm(other_id: int, me: User = Depends(get_current_user)):
+async def open_dm(other_id: int, request: Request, me: User = Depends(get_current_user)):
     if other_id == me.id:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "Cannot DM yourself")
     other_user = await User.get_or_none(id=other_id)
@@ -26,7 +27,7 @@ async def open_dm(other_id: int, me: User = Depends(get_current_user)):
     async with in_transaction():
         channel, created = await Channel.get_or_create(
             name=name,
-            defaults={"is_private": True},
+            defaults={"is_private": True, "is_bot_dm": other_id == request.app.state.chatbot_user_id},
         )
 
         if created:
@@ -34,5 +35,7 @@ async def open_dm(other_id: int, me: User = Depends(get_current_user)):
                 ChannelMember(user_id=me.id,    channel=channel),
                 ChannelMember(user_id=other_id, channel=channel),
             ])
+    if created:
+        invalidate_user_channels(me.id, other_id)
 
     return {"id": channel.id, "name": channel.name, "is_private": True, "repeated": not created}
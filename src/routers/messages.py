@@ -1,25 +1,290 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from tortoise import timezone
+from tortoise.transactions import in_transaction
 from models.message import Message
 from schemas.message import MessageCreate, MessageRead
+from core.acl import require_channel_access, visible_channel_ids
 from core.dependencies import get_current_user
+from core.message_writer import message_writer
+from core.profiles import display_name, get_profiles
+from core.metrics import metrics
+from core.search import search_messages
+from routers.ws_chat import broadcast_message, broadcast_messages, message_data
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
 @router.post("", response_model=MessageRead, status_code=status.HTTP_201_CREATED)
 async def post_message(data: MessageCreate, user=Depends(get_current_user)):
-    return await Message.create(author_id=user.id, **data.dict())  # relate author via FK :contentReference[oaicite:8]{index=8}
+    await require_channel_access(user, data.channel_id)
+    message = await message_writer.create(data.channel_id, user.id, data.content, durable=True)
+    # Live sockets and every worker's channel tail get it like any other message
+    await broadcast_message(data.channel_id, message_data(message, user.full_name))
+    return message  # relate author via FK :contentReference[oaicite:8]{index=8}
+
+BATCH_MAX_ITEMS = 10_000
+BATCH_CHUNK_SIZE = 500
+# A JSON (non-NDJSON) body is parsed whole, so its size is capped up front
+BATCH_MAX_BYTES = 16 * 1024 * 1024
+
+
+async def batch_items(request: Request) -> AsyncIterator[Any]:
+    """
+    The items of a batch body: a JSON array, {"messages": [...]}, or NDJSON
+    (one object per line), which is parsed as it streams in.
+    """
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        pending = b""
+        async for chunk in request.stream():
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield _parse_line(line)
+        if pending.strip():
+            yield _parse_line(pending)
+        return
+    try:
+        body = json.loads(await _read_capped(request, BATCH_MAX_BYTES))
+    except ValueError:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Body is not valid JSON")
+    if isinstance(body, dict):
+        body = body.get("messages")
+    if not isinstance(body, list):
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Expected a list of messages")
+    for item in body:
+        yield item
+
+
+async def _read_capped(request: Request, limit: int) -> bytes:
+    """The request body, or 413 as soon as it is known to be over `limit` bytes"""
+    too_large = HTTPException(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"Body is limited to {limit} bytes")
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > limit:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise too_large
+    return bytes(body)
+
+
+def _parse_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+async def ingest_messages(user, items: AsyncIterator[Any], chunk_size: int = BATCH_CHUNK_SIZE) -> List[dict]:
+    """
+    Create messages from `user`, one result per item in input order: {"index",
+    "id"} or {"index", "error"}. Access is checked once per distinct channel;
+    valid items are inserted `chunk_size` at a time, each chunk in its own
+    transaction and then broadcast as one frame per channel. A bad item or a
+    failed chunk only fails those items. Reading stops after BATCH_MAX_ITEMS
+    items; one more error result then marks the batch as truncated.
+    """
+    results: List[dict] = []
+    access: Dict[int, Optional[str]] = {}
+    chunk: List[Tuple[int, Message]] = []
+
+    async def save_chunk():
+        messages = [message for _, message in chunk]
+        try:
+            async with in_transaction() as conn:
+                await message_writer.insert_many(messages, batch_size=chunk_size, using_db=conn)
+        except Exception as e:
+            print(f"Message batch chunk failed: {e}")
+            for index, _ in chunk:
+                results[index] = {"index": index, "error": "Could not be saved"}
+            chunk.clear()
+            return
+        by_channel: Dict[int, List[dict]] = {}
+        for index, message in chunk:
+            results[index] = {"index": index, "id": message.id}
+            by_channel.setdefault(message.channel_id, []).append({
+                "id": message.id,
+                "author": user.full_name,
+                "author_id": user.id,
+                "content": message.content,
+                "sent_at": message.sent_at.isoformat(),
+            })
+        chunk.clear()
+        for channel_id, data in by_channel.items():
+            await broadcast_messages(channel_id, data)
+
+    async for item in items:
+        index = len(results)
+        if index >= BATCH_MAX_ITEMS:
+            error = f"Batches are limited to {BATCH_MAX_ITEMS} messages; the rest was not read"
+            results.append({"index": index, "error": error})
+            break
+        results.append({"index": index})
+        if not isinstance(item, dict):
+            results[index]["error"] = "Expected a JSON object"
+            continue
+        try:
+            data = MessageCreate(**item)
+        except ValidationError as e:
+            results[index]["error"] = "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+            continue
+        if data.channel_id not in access:
+            try:
+                await require_channel_access(user, data.channel_id)
+                access[data.channel_id] = None
+            except HTTPException as e:
+                access[data.channel_id] = e.detail
+        if access[data.channel_id] is not None:
+            results[index]["error"] = access[data.channel_id]
+            continue
+        chunk.append((index, Message(
+            channel_id=data.channel_id, author_id=user.id, content=data.content, sent_at=timezone.now(),
+        )))
+        if len(chunk) >= chunk_size:
+            await save_chunk()
+    if chunk:
+        await save_chunk()
+    return results
+
+
+@router.post("/batch")
+async def post_messages(request: Request, user=Depends(get_current_user)):
+    """
+    Create up to BATCH_MAX_ITEMS messages in one request, e.g. for imports
+    and integrations. Takes a JSON array of {"channel_id", "content"}, the
+    same under "messages", or NDJSON; errors are reported per item.
+    """
+    results = await ingest_messages(user, batch_items(request))
+    created = sum(1 for r in results if "id" in r)
+    truncated = len(results) > BATCH_MAX_ITEMS
+    metrics.incr("messages_ingested", created)
+    return {
+        "created": created,
+        "failed": len(results) - created - truncated,
+        "truncated": truncated,
+        "results": results,
+    }
 
 @router.get("", response_model=list[MessageRead])
 async def list_messages(
     channel_id: int = Query(...), 
     limit: int = Query(50, ge=1, le=200),
+    before_id: int | None = Query(None, description="Page back from this message"),
+    after_id: int | None = Query(None, description="Page forward from this message"),
+    include_author: bool = Query(False, description="Add each author's name (from the profile cache, no join)"),
+    user=Depends(get_current_user)
+):
+    """Newest first; pass the last id of a page as `before_id` to scroll back"""
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Use either before_id or after_id")
+    await require_channel_access(user, channel_id)
+    rows, _ = await Message.page(channel_id, before_id=before_id, after_id=after_id, limit=limit)
+    rows.reverse()
+    if not include_author:
+        return rows
+    profiles = await get_profiles(row.author_id for row in rows)
+    return [
+        MessageRead(
+            id=row.id, channel_id=row.channel_id, author_id=row.author_id, content=row.content,
+            sent_at=row.sent_at, author_name=display_name(profiles, row.author_id),
+        )
+        for row in rows
+    ]
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+async def export_rows(channel_id: int, fmt: str) -> AsyncIterator[str]:
+    """Render a channel's history batch by batch, so memory use doesn't grow with the channel"""
+    if fmt == "csv":
+        yield "id,channel_id,author_id,author_name,sent_at,content\r\n"
+    async for batch in Message.iterate(channel_id, batch_size=EXPORT_BATCH_SIZE):
+        profiles = await get_profiles(row["author_id"] for row in batch)
+        out = io.StringIO()
+        if fmt == "csv":
+            writer = csv.writer(out)
+            for row in batch:
+                writer.writerow([
+                    row["id"], channel_id, row["author_id"], display_name(profiles, row["author_id"]),
+                    row["sent_at"].isoformat(), row["content"],
+                ])
+        else:
+            for row in batch:
+                out.write(json.dumps({
+                    "id": row["id"],
+                    "channel_id": channel_id,
+                    "author_id": row["author_id"],
+                    "author_name": display_name(profiles, row["author_id"]),
+                    "sent_at": row["sent_at"].isoformat(),
+                    "content": row["content"],
+                }, ensure_ascii=False))
+                out.write("\n")
+        yield out.getvalue()
+
+
+@router.get("/export")
+async def export_messages(
+    channel_id: int = Query(...),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    user=Depends(get_current_user)
+):
+    """Stream a channel's full history, oldest first, as NDJSON or CSV"""
+    await require_channel_access(user, channel_id)
+    return StreamingResponse(
+        export_rows(channel_id, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="channel-{channel_id}.{format}"'},
+    )
+
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    channel_id: int | None = Query(None, description="Only search this channel"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
     user=Depends(get_current_user)
 ):
-    return await Message.filter(channel_id=channel_id).order_by("-sent_at").limit(limit)  # pagination basics :contentReference[oaicite:9]{index=9}
+    """Full-text search over messages in channels the caller can read, best match first"""
+    if channel_id is not None:
+        await require_channel_access(user, channel_id)
+        channel_ids = [channel_id]
+    else:
+        channel_ids = await visible_channel_ids(user)
+    try:
+        rows, next_cursor = await search_messages(q, channel_ids, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+    profiles = await get_profiles(row["author_id"] for row in rows)
+    return {
+        "results": [
+            {
+                "id": row["id"],
+                "channel_id": row["channel_id"],
+                "author_id": row["author_id"],
+                "author_name": display_name(profiles, row["author_id"]),
+                "content": row["content"],
+                "sent_at": row["sent_at"].isoformat() if hasattr(row["sent_at"], "isoformat") else row["sent_at"],
+                "score": row["score"],
+            }
+            for row in rows
+        ],
+        "next_cursor": next_cursor,
+    }
 
 @router.get("/{id}", response_model=MessageRead)
 async def get_message(id: int, user=Depends(get_current_user)):
     msg = await Message.get_or_none(id=id)
     if not msg:
         raise HTTPException(status.HTTP_404_NOT_FOUND, "Message not found")
+    await require_channel_access(user, msg.channel_id)
     return msg
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+
+from core.dependencies import require_admin_role
+from core.metrics import metrics
+
+router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get("/", dependencies=[Depends(require_admin_role)])
+async def get_metrics():
+    """Snapshot of in-process metrics (latency percentiles, counters, gauges)"""
+    return metrics.snapshot()
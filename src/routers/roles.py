@@ -3,7 +3,8 @@ from typing import List
 
 from models.role import Role
 from schemas.role import RoleRead, RoleCreate
-from core.dependencies import get_current_user, require_admin
+from core.acl import invalidate_all_channels
+from core.dependencies import get_current_user, require_admin, invalidate_all_sessions
 
 router = APIRouter(prefix="/roles", tags=["roles"])
 
@@ -35,10 +36,14 @@ async def update_role(role_id: int, role: RoleCreate):
     new_role.name = role.name
     new_role.description = role.description
     await new_role.save()
+    invalidate_all_sessions()
     return new_role
 
 @router.post("/delete/{role_id}", dependencies=[Depends(require_admin)])
 async def delete_role(role_id: int):
     deleted = await Role.filter(id=role_id).delete()
     if not deleted:
-        raise HTTPException(status_code=404, detail="Role not found")
\ No newline at end of file
+        raise HTTPException(status_code=404, detail="Role not found")
+    # Users and channels cascade with the role
+    invalidate_all_sessions()
+    invalidate_all_channels()
\ No newline at end of file
@@ -2,8 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from models.user import User
 from models.role import Role
 from schemas.user import UserRead, UserUpdateRole, UserCreate
-from core.dependencies import get_current_user, require_admin
-from core.security import hash_password
+from core.acl import invalidate_user_channels
+from core.profiles import invalidate_profile
+from core.dependencies import get_current_user, require_admin, invalidate_user_sessions
+from core.security import hash_password_async
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -32,7 +34,7 @@ async def add_user(
     user = await User.create(
         full_name=payload.full_name,
         email=payload.email,
-        hashed_password=hash_password(payload.password),
+        hashed_password=await hash_password_async(payload.password),
         role_id=payload.role_id,
     )
     role = await Role.get_or_none(id=payload.role_id)
@@ -60,8 +62,11 @@ async def update_user(
     user_role = await Role.get_or_none(id=payload.role_id)
     user.role = user_role
     if payload.password:
-        user.hashed_password = hash_password(payload.password)
+        user.hashed_password = await hash_password_async(payload.password)
     await user.save()
+    invalidate_user_sessions(user_id)
+    invalidate_user_channels(user_id)
+    invalidate_profile(user_id)
     return user
     
 @router.post("/delete/{user_id}/")
@@ -73,6 +78,8 @@ async def delete_user(
     deleted = await User.filter(id=user_id).delete()
     if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    invalidate_user_sessions(user_id)
+    invalidate_profile(user_id)
     return {"detail": "User deleted"}
 
 
@@ -87,4 +94,6 @@ async def change_role(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     user.role_id = payload.role_id
     await user.save()
+    invalidate_user_sessions(user_id)
+    invalidate_user_channels(user_id)
     return user
@@ -1,188 +1,1136 @@
 # routers/ws_chat.py - Updated with Smart Reply Support
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter, status, Depends
-from tortoise.exceptions import DoesNotExist
 from datetime import datetime
 import json
-from typing import Dict, List, Set
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
 import asyncio
-import httpx
+import time
+from uuid import uuid4
 
-from core.dependencies import get_current_user_ws
-from models import channel as ch_model, message as msg_model, user as user_model
-from models.channelmember import ChannelMember
+from core.acl import can_access, get_channel_acl, invalidate_channel, invalidate_user_channels
+from core.ai_client import AIServiceUnavailable, ai_client
+from core.backplane import Backplane, InMemoryBackplane, create_backplane
+from core.cache import TTLCache
+from core.config import settings
+from core.dependencies import drop_local_sessions, get_current_user_ws, session_invalidation_listeners
+from core.frames import Frame, encode_frame, negotiate_encoding
+from core.jobs import JobLimitExceeded, ai_jobs, precompute_jobs
+from core.message_writer import message_writer
+from core.metrics import metrics
+from core.profiles import display_name, get_profiles
+from core.recent_messages import message_buffer
+from models import message as msg_model, user as user_model
+from models.channelsummary import ChannelSummary
 
 router = APIRouter()
 
-AI_SERVICE_URL = "http://127.0.0.1:8001"
+PRESENCE_EVENTS = {"user_joined", "user_left"}
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+
+class OutboundFrame:
+    """A frame waiting in one or more outbound queues"""
+    __slots__ = ("frame", "channel_id", "coalesce_key", "queued_at")
+
+    def __init__(self, frame: Frame, channel_id: Optional[int] = None, coalesce_key: Optional[tuple] = None):
+        self.frame = frame
+        self.channel_id = channel_id
+        self.coalesce_key = coalesce_key
+        self.queued_at = time.perf_counter()
+
+    @property
+    def text(self) -> str:
+        return self.frame.text
+
+
+class Connection:
+    """
+    An accepted socket with its bounded outbound queue, drained by a writer
+    task. Single-channel sockets subscribe to one channel; multiplexed ones
+    to any number.
+    """
+    __slots__ = ("websocket", "user_id", "channels", "connected_at", "queue", "ready", "writer", "dropped", "gaps", "batching", "encoding", "single")
+
+    def __init__(self, websocket: WebSocket, user_id: int, batching: bool = False, encoding: str = "json"):
+        self.websocket = websocket
+        self.user_id = user_id
+        # Negotiated by the client: chat messages arrive as "messages" frames,
+        # and frames in one of core.frames.FRAME_ENCODINGS
+        self.batching = batching
+        self.encoding = encoding
+        # Opened for one channel (/ws/{channel_id}) rather than multiplexed
+        self.single = False
+        self.channels: Set[int] = set()
+        self.connected_at = time.time()
+        self.queue: Deque[OutboundFrame] = deque()
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+        # Frames shed by the overflow policy since the last resync, per channel
+        self.gaps: Dict[Optional[int], int] = {}
+
+
+class PendingBatch:
+    """Chat messages for one channel waiting to go out to batching sockets as one frame"""
+    __slots__ = ("messages", "timer")
+
+    def __init__(self):
+        self.messages: List[dict] = []
+        self.timer: Optional[asyncio.Task] = None
+
 
 class ConnectionManager:
     """Enhanced WebSocket connection manager with presence tracking"""
     
-    def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-        self.user_channels: Dict[int, Set[int]] = {}
-        self.channel_users: Dict[int, Set[int]] = {}
-        self.websocket_users: Dict[WebSocket, int] = {}
+    def __init__(
+        self,
+        concurrent: bool = True,
+        send_timeout: float = 5.0,
+        queue_size: int = 0,
+        overflow_policy: str = "drop_oldest",
+        backplane: Optional[Backplane] = None,
+        batch_window: float = 0.0,
+        batch_max: int = 100,
+        heartbeat_interval: float = 0.0,
+        node_timeout: float = 0.0,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        # Every registry is dict-keyed so connect/disconnect are O(1); the
+        # per-channel dicts keep insertion order for fan-out. Presence maps
+        # hold socket counts so a user's second tab doesn't end their presence.
+        self.connections: Dict[WebSocket, Connection] = {}
+        self.active_connections: Dict[int, Dict[WebSocket, Connection]] = {}
+        self.user_channels: Dict[int, Dict[int, int]] = {}
+        self.channel_users: Dict[int, Dict[int, int]] = {}
+        self.concurrent = concurrent
+        self.send_timeout = send_timeout
+        # queue_size == 0 sends inline from broadcast(); otherwise every socket
+        # gets its own bounded queue and writer task
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        # Other processes share broadcasts and presence through the backplane;
+        # remote_users holds their presence as channel -> node -> user ids.
+        self.backplane = backplane or InMemoryBackplane()
+        self.node_id = uuid4().hex
+        self.remote_users: Dict[int, Dict[str, Set[int]]] = {}
+        # Every node publishes a heartbeat each `heartbeat_interval` seconds;
+        # the presence of a node not heard from for `node_timeout` seconds
+        # (a crashed worker never sends node_down) is dropped. 0 = off
+        self.heartbeat_interval = heartbeat_interval
+        self.node_timeout = node_timeout
+        self.node_seen: Dict[str, float] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+        # Called with (channel_id, text) for every frame relayed from another node
+        self.remote_frame_listeners: List[Callable[[int, str], None]] = []
+        # Sockets that opted into batching get a channel's messages at most
+        # every `batch_window` seconds, up to `batch_max` per frame; 0 = off
+        self.batch_window = batch_window
+        self.batch_max = batch_max
+        self._batches: Dict[int, PendingBatch] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    async def start(self):
+        await self.backplane.start(self._on_backplane_event)
+        await self._publish({"type": "sync_request"})
+        if self.heartbeat_interval:
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        for channel_id in list(self._batches):
+            await self.flush_batch(channel_id)
+        await self._publish({"type": "node_down"})
+        await self.backplane.stop()
         
-    async def connect(self, channel_id: int, user_id: int, websocket: WebSocket):
+    async def connect(
+        self, channel_id: int, user_id: int, websocket: WebSocket, batching: bool = False, encoding: str = "json"
+    ):
+        """Accept a single-channel socket; True if the user just became present (see subscribe)"""
+        conn = await self.register(user_id, websocket, batching, encoding)
+        conn.single = True
+        return self.subscribe(websocket, channel_id)
+
+    async def register(
+        self, user_id: int, websocket: WebSocket, batching: bool = False, encoding: str = "json"
+    ) -> Connection:
+        """Accept a socket without subscribing it to any channel yet"""
         await websocket.accept()
-        if channel_id not in self.active_connections:
-            self.active_connections[channel_id] = []
-        self.active_connections[channel_id].append(websocket)
-        self.websocket_users[websocket] = user_id
-        if user_id not in self.user_channels:
-            self.user_channels[user_id] = set()
-        self.user_channels[user_id].add(channel_id)
-        if channel_id not in self.channel_users:
-            self.channel_users[channel_id] = set()
-        self.channel_users[channel_id].add(user_id)
+        conn = Connection(websocket, user_id, batching=batching and self.batch_window > 0, encoding=encoding)
+        self.connections[websocket] = conn
+        if self.queue_size:
+            conn.writer = asyncio.create_task(self._writer(conn))
+        return conn
+
+    def subscribe(self, websocket: WebSocket, channel_id: int) -> bool:
+        """True when this is the user's first socket in the channel, i.e. they just joined"""
+        conn = self.connections.get(websocket)
+        if conn is None or channel_id in conn.channels:
+            return False
+        conn.channels.add(channel_id)
+        self.active_connections.setdefault(channel_id, {})[websocket] = conn
+        channels = self.user_channels.setdefault(conn.user_id, {})
+        channels[channel_id] = channels.get(channel_id, 0) + 1
+        users = self.channel_users.setdefault(channel_id, {})
+        users[conn.user_id] = users.get(conn.user_id, 0) + 1
+        if users[conn.user_id] > 1:
+            return False
+        self._publish_presence("join", channel_id, conn.user_id)
+        return True
+
+    def unsubscribe(self, websocket: WebSocket, channel_id: int) -> bool:
+        """True when that was the user's last socket in the channel, i.e. they left"""
+        conn = self.connections.get(websocket)
+        if conn is None or channel_id not in conn.channels:
+            return False
+        conn.channels.discard(channel_id)
+        sockets = self.active_connections[channel_id]
+        del sockets[websocket]
+        if not sockets:
+            del self.active_connections[channel_id]
+        self._decrement(self.user_channels, conn.user_id, channel_id)
+        if not self._decrement(self.channel_users, channel_id, conn.user_id):
+            return False
+        self._publish_presence("leave", channel_id, conn.user_id)
+        return True
         
-    def disconnect(self, channel_id: int, user_id: int, websocket: WebSocket):
-        if channel_id in self.active_connections:
-            if websocket in self.active_connections[channel_id]:
-                self.active_connections[channel_id].remove(websocket)
-            if not self.active_connections[channel_id]:
-                del self.active_connections[channel_id]
-        if websocket in self.websocket_users:
-            del self.websocket_users[websocket]
-        if user_id in self.user_channels:
-            self.user_channels[user_id].discard(channel_id)
-            if not self.user_channels[user_id]:
-                del self.user_channels[user_id]
-        if channel_id in self.channel_users:
-            self.channel_users[channel_id].discard(user_id)
-            if not self.channel_users[channel_id]:
-                del self.channel_users[channel_id]
+    def disconnect(self, websocket: WebSocket) -> List[int]:
+        """Forget the socket and all of its subscriptions; returns the channels the user left"""
+        conn = self.connections.get(websocket)
+        if conn is None:
+            return []
+        left = [channel_id for channel_id in list(conn.channels) if self.unsubscribe(websocket, channel_id)]
+        del self.connections[websocket]
+        if conn.writer and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        return left
+
+    def is_subscribed(self, websocket: WebSocket, channel_id: int) -> bool:
+        conn = self.connections.get(websocket)
+        return conn is not None and channel_id in conn.channels
+
+    async def revoke(self, channel_id: int, user_ids: Iterable[int]):
+        """Unsubscribe users who lost access to a channel from it, on every node"""
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        await self._revoke_local(channel_id, user_ids)
+        await self._publish({"type": "revoke", "channel_id": channel_id, "user_ids": sorted(user_ids)})
+
+    async def _revoke_local(self, channel_id: int, user_ids: Set[int]):
+        # Multiplexed sockets are told and stay open; single-channel ones are closed
+        targets = [conn for conn in self.active_connections.get(channel_id, {}).values() if conn.user_id in user_ids]
+        left = []
+        for conn in targets:
+            if conn.single:
+                if self.disconnect(conn.websocket):
+                    left.append(conn.user_id)
+                self._spawn(self._close(conn.websocket, status.WS_1008_POLICY_VIOLATION))
+                continue
+            if self.unsubscribe(conn.websocket, channel_id):
+                left.append(conn.user_id)
+            await self.send_personal(conn.websocket, {"type": "removed", "channel_id": channel_id})
+        for user_id in left:
+            await self.broadcast(channel_id, {"type": "user_left", "data": {"user_id": user_id}})
+
+    @staticmethod
+    def _decrement(registry: Dict[int, Dict[int, int]], outer: int, inner: int) -> bool:
+        """Drop one reference; True when it was the last one"""
+        counts = registry[outer]
+        counts[inner] -= 1
+        if counts[inner]:
+            return False
+        del counts[inner]
+        if not counts:
+            del registry[outer]
+        return True
                 
     async def broadcast(self, channel_id: int, message: dict, exclude_ws: WebSocket = None):
+        if channel_id not in self.active_connections and not self.backplane.distributed:
+            return
+        coalesce_key = None
+        if message.get("type") in PRESENCE_EVENTS:
+            coalesce_key = ("presence", message.get("data", {}).get("user_id"))
+        # Tag frames with their channel so multiplexed sockets can route them
+        message = {**message, "channel_id": channel_id}
+        # JSON is the default encoding and what the backplane carries, so it
+        # is always produced; other encodings only when a socket uses them
+        text = encode_frame(message)
+        # Local sockets are served directly; other nodes get it via the backplane
+        await self.broadcast_text(
+            channel_id, text, exclude_ws=exclude_ws, coalesce_key=coalesce_key,
+            batch_items=None if exclude_ws else self._batch_items(message), message=message,
+        )
+        if self.backplane.distributed:
+            await self._publish({
+                "type": "frame", "channel_id": channel_id, "text": text, "coalesce_key": coalesce_key,
+                "bulk": message.get("type") == "messages",
+            })
+
+    async def broadcast_text(
+        self,
+        channel_id: int,
+        text: str,
+        exclude_ws: WebSocket = None,
+        coalesce_key: Optional[tuple] = None,
+        batch_items: Optional[List[dict]] = None,
+        message: Optional[dict] = None,
+    ):
+        """
+        Send a frame, already encoded as JSON `text`, to every socket in the
+        channel. `message` is the decoded frame if the caller has it (it is
+        parsed from `text` only if a socket wants another encoding).
+        `batch_items` are the chat messages the frame carries; batching
+        sockets get those in their channel's next batch instead. A bulk
+        "messages" frame (see broadcast_messages) reaches only batching
+        sockets as is; the others get one "message" frame per item.
+        """
         if channel_id not in self.active_connections:
             return
-        disconnected = []
-        for websocket in self.active_connections[channel_id]:
-            if websocket != exclude_ws:
-                try:
-                    await websocket.send_json(message)
-                except Exception:
+        started = time.perf_counter()
+        sockets = self.active_connections[channel_id]
+        if not self.batch_window:
+            targets = [ws for ws in sockets if ws != exclude_ws]
+        elif batch_items is not None:
+            targets = [ws for ws, conn in sockets.items() if not conn.batching and ws != exclude_ws]
+            if len(targets) < len(sockets):
+                await self._add_to_batch(channel_id, batch_items)
+        else:
+            # Messages already waiting must not arrive after this frame
+            await self.flush_batch(channel_id)
+            targets = [ws for ws in sockets if ws != exclude_ws]
+        if message is not None and message.get("type") == "messages":
+            for item in message["data"]:
+                await self._deliver(channel_id, targets, Frame({"type": "message", "data": item, "channel_id": channel_id}))
+        else:
+            await self._deliver(channel_id, targets, Frame(message, text), coalesce_key)
+        metrics.observe("ws_broadcast", time.perf_counter() - started, key=channel_id)
+
+    async def flush_batch(self, channel_id: int):
+        """Send the channel's waiting messages to its batching sockets as one frame"""
+        batch = self._batches.pop(channel_id, None)
+        if batch is None:
+            return
+        if batch.timer is not asyncio.current_task():
+            batch.timer.cancel()
+        targets = [ws for ws, conn in self.active_connections.get(channel_id, {}).items() if conn.batching]
+        if not targets:
+            return
+        frame = Frame({"type": "messages", "data": batch.messages, "channel_id": channel_id})
+        await self._deliver(channel_id, targets, frame)
+        metrics.incr("ws_batch_frames", key=channel_id)
+        metrics.incr("ws_frames_saved", (len(batch.messages) - 1) * len(targets), key=channel_id)
+
+    @staticmethod
+    def _batch_items(message: dict) -> Optional[List[dict]]:
+        if message.get("type") == "message":
+            return [message["data"]]
+        if message.get("type") == "messages":
+            return message["data"]
+        return None
+
+    async def _add_to_batch(self, channel_id: int, items: List[dict]):
+        batch = self._batches.get(channel_id)
+        if batch is None:
+            batch = self._batches[channel_id] = PendingBatch()
+            batch.timer = self._spawn(self._flush_after_window(channel_id, batch))
+        batch.messages.extend(items)
+        if len(batch.messages) >= self.batch_max:
+            await self.flush_batch(channel_id)
+
+    async def _flush_after_window(self, channel_id: int, batch: PendingBatch):
+        await asyncio.sleep(self.batch_window)
+        if self._batches.get(channel_id) is batch:
+            await self.flush_batch(channel_id)
+
+    async def _deliver(self, channel_id: int, targets: List[WebSocket], frame: Frame, coalesce_key: Optional[tuple] = None):
+        if not targets:
+            return
+        if self.queue_size:
+            # Never waits on a socket: slow readers only fill their own queue
+            outbound = OutboundFrame(frame, channel_id, coalesce_key)
+            for ws in targets:
+                conn = self.connections.get(ws)
+                if conn is not None:
+                    self._enqueue(conn, outbound)
+            return
+        if self.concurrent:
+            # Fan out to every socket at once so one stalled client only costs
+            # the others up to `send_timeout`, not the sum of all sends.
+            results = await asyncio.gather(*(self._send(ws, self._payload(ws, frame)) for ws in targets))
+            disconnected = [ws for ws, ok in zip(targets, results) if not ok]
+        else:
+            disconnected = []
+            for websocket in targets:
+                if not await self._send(websocket, self._payload(websocket, frame)):
                     disconnected.append(websocket)
         for ws in disconnected:
-            if ws in self.websocket_users:
-                user_id = self.websocket_users[ws]
-                self.disconnect(channel_id, user_id, ws)
+            self._evict(ws)
+
+    async def send_personal(self, websocket: WebSocket, message: dict):
+        conn = self.connections.get(websocket)
+        frame = Frame(message)
+        if self.queue_size and conn is not None:
+            # Queued behind any pending broadcasts so frame order is preserved
+            self._enqueue(conn, OutboundFrame(frame, message.get("channel_id")))
+            return
+        payload = self._payload(websocket, frame)
+        if isinstance(payload, bytes):
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload)
+
+    def active_users(self, channel_id: int) -> Set[int]:
+        """Users present in the channel on this node or any other"""
+        users = set(self.channel_users.get(channel_id, set()))
+        for remote in self.remote_users.get(channel_id, {}).values():
+            users |= remote
+        return users
+
+    def queue_stats(self) -> dict:
+        """Queue-depth gauges, listing every connection that is lagging behind"""
+        lagging = [
+            {
+                "user_id": conn.user_id,
+                "channels": sorted(conn.channels),
+                "depth": len(conn.queue),
+                "dropped": conn.dropped,
+            }
+            for conn in self.connections.values()
+            if conn.queue or conn.dropped
+        ]
+        return {
+            "connections": len(self.connections),
+            "max_depth": max((len(conn.queue) for conn in self.connections.values()), default=0),
+            "batching": sum(1 for conn in self.connections.values() if conn.batching),
+            "lagging": lagging,
+        }
+
+    def _enqueue(self, conn: Connection, frame: OutboundFrame):
+        if len(conn.queue) >= self.queue_size and not self._make_room(conn, frame):
+            return
+        conn.queue.append(frame)
+        conn.ready.set()
+
+    def _make_room(self, conn: Connection, frame: OutboundFrame) -> bool:
+        """Apply the overflow policy to a full queue; False means don't queue `frame`"""
+        if self.overflow_policy == "disconnect":
+            metrics.incr("ws_slow_consumers", key=frame.channel_id)
+            self._evict(conn.websocket)
+            return False
+        before = len(conn.queue)
+        # Superseded presence frames aren't a loss; anything else shed is, and
+        # the client is told to resync before the frames that follow the gap
+        lost: List[OutboundFrame] = []
+        if self.overflow_policy == "coalesce":
+            # Only the newest presence frame per user matters; shed superseded
+            # ones first, then the oldest presence frame, before any message.
+            latest = {f.coalesce_key: f for f in conn.queue if f.coalesce_key is not None}
+            if frame.coalesce_key is not None:
+                latest[frame.coalesce_key] = frame
+            kept = deque(f for f in conn.queue if f.coalesce_key is None or latest[f.coalesce_key] is f)
+            if len(kept) == before:
+                oldest_presence = next((f for f in kept if f.coalesce_key is not None), None)
+                if oldest_presence is not None:
+                    kept.remove(oldest_presence)
+                    lost.append(oldest_presence)
+            conn.queue = kept
+        while len(conn.queue) >= self.queue_size:
+            lost.append(conn.queue.popleft())
+        for shed in lost:
+            conn.gaps[shed.channel_id] = conn.gaps.get(shed.channel_id, 0) + 1
+        dropped = before - len(conn.queue)
+        conn.dropped += dropped
+        metrics.incr("ws_dropped_frames", dropped, key=frame.channel_id)
+        return True
+
+    async def _writer(self, conn: Connection):
+        while True:
+            while not conn.queue:
+                conn.ready.clear()
+                await conn.ready.wait()
+            if conn.gaps and not await self._send_resync(conn):
+                self._evict(conn.websocket)
+                return
+            frame = conn.queue.popleft()
+            if not await self._send(conn.websocket, frame.frame.encoded(conn.encoding)):
+                self._evict(conn.websocket)
+                return
+            metrics.observe("ws_delivery", time.perf_counter() - frame.queued_at, key=frame.channel_id)
+
+    async def _send_resync(self, conn: Connection) -> bool:
+        """
+        Tell the client frames were shed for each channel in conn.gaps, so it
+        reloads history (and presence) instead of silently missing messages
+        """
+        gaps, conn.gaps = conn.gaps, {}
+        for channel_id, dropped in gaps.items():
+            message = {"type": "resync", "data": {"dropped": dropped}}
+            if channel_id is not None:
+                message["channel_id"] = channel_id
+            if not await self._send(conn.websocket, Frame(message).encoded(conn.encoding)):
+                return False
+        return True
+
+    async def _publish(self, event: dict):
+        if not self.backplane.distributed:
+            return
+        event["origin"] = self.node_id
+        try:
+            await self.backplane.publish(event)
+        except Exception as e:
+            print(f"Backplane publish error: {e}")
+
+    def publish_soon(self, event: dict):
+        """Publish to the other nodes from synchronous code; nothing to do on a single node"""
+        if self.backplane.distributed:
+            self._spawn(self._publish(event))
+
+    def _publish_presence(self, op: str, channel_id: int, user_id: int):
+        self.publish_soon({"type": "presence", "op": op, "channel_id": channel_id, "user_id": user_id})
+
+    async def _on_backplane_event(self, event: dict):
+        origin = event.get("origin")
+        if origin == self.node_id:
+            return
+        kind = event.get("type")
+        known = origin in self.node_seen
+        self.node_seen[origin] = time.monotonic()
+        if kind == "heartbeat":
+            if not known:
+                # A node we had expired (or never heard from) is back; its
+                # presence was dropped, so ask everyone for a fresh snapshot
+                await self._publish({"type": "sync_request"})
+        elif kind == "frame":
+            coalesce_key = tuple(event["coalesce_key"]) if event.get("coalesce_key") else None
+            for listener in self.remote_frame_listeners:
+                listener(event["channel_id"], event["text"])
+            message = batch_items = None
+            batching = self.batch_window and any(
+                conn.batching for conn in self.active_connections.get(event["channel_id"], {}).values()
+            )
+            # Bulk frames are parsed so non-batching sockets can get them one message at a time
+            if batching or event.get("bulk"):
+                message = json.loads(event["text"])
+                if batching:
+                    batch_items = self._batch_items(message)
+            await self.broadcast_text(
+                event["channel_id"], event["text"], coalesce_key=coalesce_key, batch_items=batch_items, message=message
+            )
+        elif kind == "presence":
+            nodes = self.remote_users.setdefault(event["channel_id"], {})
+            if event["op"] == "join":
+                nodes.setdefault(origin, set()).add(event["user_id"])
+            elif origin in nodes:
+                nodes[origin].discard(event["user_id"])
+                if not nodes[origin]:
+                    del nodes[origin]
+                if not nodes:
+                    del self.remote_users[event["channel_id"]]
+        elif kind == "sync_request":
+            channels = {str(cid): sorted(users) for cid, users in self.channel_users.items()}
+            await self._publish({"type": "presence_snapshot", "channels": channels})
+        elif kind == "presence_snapshot":
+            self._forget_node(origin)
+            for cid, users in event["channels"].items():
+                self.remote_users.setdefault(int(cid), {})[origin] = set(users)
+        elif kind == "node_down":
+            self._forget_node(origin)
+        elif kind == "invalidate_sessions":
+            drop_local_sessions(event["scope"], event.get("key"))
+        elif kind == "revoke":
+            # The membership change was cached only on the node that made it
+            invalidate_channel(event["channel_id"])
+            invalidate_user_channels(*event["user_ids"])
+            await self._revoke_local(event["channel_id"], set(event["user_ids"]))
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self._publish({"type": "heartbeat"})
+            self.expire_nodes()
 
-manager = ConnectionManager()
+    def expire_nodes(self) -> List[str]:
+        """Forget the presence of nodes silent for longer than node_timeout; returns their ids"""
+        if not self.node_timeout:
+            return []
+        cutoff = time.monotonic() - self.node_timeout
+        expired = [origin for origin, seen in self.node_seen.items() if seen < cutoff]
+        for origin in expired:
+            self._forget_node(origin)
+        return expired
 
-async def get_smart_replies(channel_id: int, current_user_name: str) -> List[str]:
+    def _forget_node(self, origin: str):
+        self.node_seen.pop(origin, None)
+        for cid in list(self.remote_users):
+            self.remote_users[cid].pop(origin, None)
+            if not self.remote_users[cid]:
+                del self.remote_users[cid]
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def _payload(self, websocket: WebSocket, frame: Frame) -> Union[str, bytes]:
+        conn = self.connections.get(websocket)
+        return frame.encoded(conn.encoding if conn is not None else "json")
+
+    async def _send(self, websocket: WebSocket, payload: Union[str, bytes]) -> bool:
+        try:
+            if isinstance(payload, bytes):
+                await asyncio.wait_for(websocket.send_bytes(payload), self.send_timeout)
+            else:
+                await asyncio.wait_for(websocket.send_text(payload), self.send_timeout)
+            return True
+        except Exception:
+            return False
+
+    def _evict(self, websocket: WebSocket):
+        """Drop a socket that failed, missed the send deadline or overflowed its queue"""
+        conn = self.connections.get(websocket)
+        if conn is not None:
+            for channel_id in conn.channels:
+                metrics.incr("ws_evictions", key=channel_id)
+            self.disconnect(websocket)
+        # The close frame may block just like the send did; don't wait on it
+        self._spawn(self._close(websocket))
+
+    async def _close(self, websocket: WebSocket, code: int = status.WS_1011_INTERNAL_ERROR):
+        try:
+            await asyncio.wait_for(websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
+manager = ConnectionManager(
+    concurrent=settings.WS_CONCURRENT_BROADCAST,
+    send_timeout=settings.WS_SEND_TIMEOUT,
+    queue_size=settings.WS_OUTBOUND_QUEUE_SIZE,
+    overflow_policy=settings.WS_OVERFLOW_POLICY,
+    backplane=create_backplane(settings.BACKPLANE_URL),
+    batch_window=settings.WS_BATCH_WINDOW_MS / 1000,
+    batch_max=settings.WS_BATCH_MAX_MESSAGES,
+    heartbeat_interval=settings.BACKPLANE_HEARTBEAT_INTERVAL,
+    node_timeout=settings.BACKPLANE_NODE_TIMEOUT,
+)
+metrics.register_collector("ws_queues", manager.queue_stats)
+# A logged-out or changed user must not stay authorized on other workers
+session_invalidation_listeners.append(
+    lambda scope, key: manager.publish_soon({"type": "invalidate_sessions", "scope": scope, "key": key})
+)
+
+
+def _record_remote_message(channel_id: int, text: str):
+    """Keep the in-memory channel tail current with messages sent through other workers"""
+    if not message_buffer.tracks(channel_id):
+        return
+    frame = json.loads(text)
+    if frame.get("type") == "message" and frame["data"].get("id"):
+        message_buffer.append(channel_id, frame["data"])
+    elif frame.get("type") == "messages":
+        for data in frame["data"]:
+            message_buffer.append(channel_id, data)
+
+manager.remote_frame_listeners.append(_record_remote_message)
+
+DEFAULT_SMART_REPLIES = ["Thanks!", "Got it!", "Sounds good!"]
+
+# (channel_id, last message id, user id) -> suggestions from the AI service
+smart_reply_cache = TTLCache(maxsize=settings.SMART_REPLY_CACHE_SIZE, ttl=settings.SMART_REPLY_CACHE_TTL)
+metrics.register_collector("smart_reply_cache", smart_reply_cache.stats)
+# The AI call currently running for each key, shared by everyone asking for it
+_smart_reply_calls: Dict[Tuple[int, int, int], "asyncio.Future[List[str]]"] = {}
+# Sockets already waiting on a key, so repeated requests don't queue more jobs
+_smart_reply_waiters: Set[Tuple[Tuple[int, int, int], WebSocket]] = set()
+
+
+async def get_smart_replies(recent_messages: List[dict], current_user_name: str) -> Tuple[List[str], bool]:
     """
-    Get smart reply suggestions based on recent conversation context
+    Get smart reply suggestions based on recent conversation context.
+    Returns (suggestions, from_ai); canned fallbacks are not worth caching.
     """
     try:
-        # Get recent messages for context (last 8 messages)
-        recent_messages = await msg_model.Message.filter(
-            channel_id=channel_id
-        ).order_by("-sent_at").limit(8).prefetch_related("author")
-        
         if len(recent_messages) < 2:  # Need at least some context
-            return ["Thanks!", "Got it!", "Sounds good!"]
+            return DEFAULT_SMART_REPLIES, True
         
         # Format messages for AI service
         formatted_messages = []
-        for msg in reversed(recent_messages):  # Reverse to get chronological order
+        for msg in recent_messages:
             formatted_messages.append({
-                "author": msg.author.full_name,
-                "content": msg.content
+                "author": msg["author"],
+                "content": msg["content"]
             })
         
         # Call AI service
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{AI_SERVICE_URL}/api/v1/smart-replies",
-                json={
-                    "recent_messages": formatted_messages,
-                    "current_user": current_user_name,
-                    "max_suggestions": 3
-                },
-                timeout=15.0
-            )
-            
-            if response.status_code == 200:
-                return response.json().get("suggestions", ["Thanks!", "Got it!", "Sounds good!"])
-            else:
-                return ["Thanks!", "Got it!", "Let me check on that"]
+        response = await ai_client.post(
+            "/api/v1/smart-replies",
+            {
+                "recent_messages": formatted_messages,
+                "current_user": current_user_name,
+                "max_suggestions": 3
+            },
+            timeout=15.0
+        )
+        
+        if response.status_code == 200:
+            return response.json().get("suggestions", DEFAULT_SMART_REPLIES), True
+        else:
+            return ["Thanks!", "Got it!", "Let me check on that"], False
                 
+    except AIServiceUnavailable:
+        return DEFAULT_SMART_REPLIES, False
     except Exception as e:
         print(f"Smart reply error: {e}")
-        return ["Thanks!", "Got it!", "Sounds good!"]
+        return DEFAULT_SMART_REPLIES, False
 
-@router.websocket("/ws/{channel_id}")
-async def websocket_endpoint(
-    websocket: WebSocket,
-    channel_id: int,
-):
+
+async def smart_reply_key(channel_id: int, user_id: int) -> Tuple[Tuple[int, int, int], List[dict]]:
+    """Cache key for the channel as it is now, plus the context the suggestions are built from"""
+    # Last 8 messages, oldest first
+    recent_messages, _ = await recent_history(channel_id, 8)
+    last_id = recent_messages[-1]["id"] if recent_messages else 0
+    return (channel_id, last_id, user_id), recent_messages
+
+
+async def smart_replies_for(channel_id: int, user_id: int, user_name: str) -> List[str]:
+    """Suggestions for the current channel state: cached, joined onto a running call, or fetched"""
+    key, recent_messages = await smart_reply_key(channel_id, user_id)
+    suggestions = smart_reply_cache.get(key)
+    if suggestions is not None:
+        return suggestions
+
+    call = _smart_reply_calls.get(key)
+    if call is None:
+        call = asyncio.ensure_future(get_smart_replies(recent_messages, user_name))
+        _smart_reply_calls[key] = call
+        call.add_done_callback(lambda done: _store_smart_replies(key, done))
+    else:
+        metrics.incr("smart_reply_coalesced")
+    # Shielded so one waiter going away doesn't cancel the call for the rest
+    suggestions, _ = await asyncio.shield(call)
+    return suggestions
+
+
+def _store_smart_replies(key: Tuple[int, int, int], call: asyncio.Future):
+    _smart_reply_calls.pop(key, None)
+    if call.cancelled() or call.exception() is not None:
+        return
+    suggestions, from_ai = call.result()
+    if from_ai:
+        smart_reply_cache.set(key, suggestions)
+
+
+async def precompute_smart_replies(channel_id: int, author_id: int):
+    """Warm suggestions for the other people connected to a channel after a new message"""
+    recipients = [user_id for user_id in manager.channel_users.get(channel_id, {}) if user_id != author_id]
+    recipients = recipients[:settings.SMART_REPLY_PRECOMPUTE_MAX_USERS]
+    if not recipients:
+        return
+    if ai_jobs.saturated:
+        # Precomputing is best effort; requests made by users come first
+        metrics.incr("smart_reply_precompute_skipped", len(recipients))
+        return
+    profiles = await get_profiles(recipients)
+    for user_id, profile in profiles.items():
+        try:
+            precompute_jobs.submit(("precompute", channel_id), user_id, smart_replies_for(channel_id, user_id, profile["name"]), name="smart_replies_precompute")
+        except JobLimitExceeded:
+            continue
+
+
+async def authenticate_ws(websocket: WebSocket) -> Optional[user_model.User]:
+    """Resolve the user from the access_token cookie, or None"""
     token = websocket.cookies.get("access_token")
     if not token:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-        return
-    
+        return None
     try:
-        user = await get_current_user_ws(token)
-        if not user:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
+        return await get_current_user_ws(token)
     except Exception:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return None
+
+
+def wants_batching(websocket: WebSocket) -> bool:
+    """
+    Clients opt into batched delivery with ?batch=1; they must then handle
+    {"type": "messages", "data": [...]} frames as well as single "message"
+    ones. Everyone else keeps getting one frame per message.
+    """
+    return websocket.query_params.get("batch", "").lower() in ("1", "true")
+
+
+def wanted_encoding(websocket: WebSocket) -> str:
+    """
+    ?encoding=columnar sends history and batched messages as column arrays;
+    ?encoding=msgpack sends binary MessagePack frames (if msgpack is
+    installed, otherwise JSON text). Compression is separate: permessage-
+    deflate is negotiated by the server (uvicorn) with clients that offer it.
+    """
+    return negotiate_encoding(websocket.query_params.get("encoding"))
+
+
+async def authorize_channel(user: user_model.User, channel_id: int) -> Tuple[Optional[int], bool]:
+    """
+    Decide whether `user` may join the channel.
+    Returns (close_code, is_chatbot_channel); close_code is None when allowed.
+    """
+    acl = await get_channel_acl(channel_id)
+    if acl is None:
+        return status.WS_1003_UNSUPPORTED_DATA, False
+    if not can_access(user, acl):
+        return status.WS_1008_POLICY_VIOLATION, False
+    return None, acl.is_bot_dm
+
+
+HISTORY_PAGE_SIZE = 50
+
+
+async def serialize_messages(messages: List[msg_model.Message]) -> List[dict]:
+    """Frame data for stored messages, with author names from the profile cache"""
+    profiles = await get_profiles(msg.author_id for msg in messages)
+    return [
+        {"id": msg.id, "author": display_name(profiles, msg.author_id), "author_id": msg.author_id, "content": msg.content, "sent_at": msg.sent_at.isoformat()}
+        for msg in messages
+    ]
+
+
+async def with_current_names(messages: List[dict]) -> List[dict]:
+    """
+    Buffered messages with author names re-read from the profile cache, so a
+    rename shows up in history served from memory as it does over REST
+    """
+    profiles = await get_profiles(m["author_id"] for m in messages)
+    current = []
+    for m in messages:
+        name = display_name(profiles, m["author_id"])
+        current.append(m if m["author"] == name else {**m, "author": name})
+    return current
+
+
+async def recent_history(channel_id: int, limit: int) -> Tuple[List[dict], bool]:
+    """
+    The newest `limit` serialized messages (oldest first) and has_more, served
+    from the in-memory channel tail and loaded from the DB only on a miss.
+    """
+    cached = message_buffer.get(channel_id, limit)
+    if cached is not None:
+        messages, has_more = cached
+        return await with_current_names(messages), has_more
+    message_buffer.begin_load(channel_id)
+    try:
+        messages, has_more = await msg_model.Message.page(
+            channel_id, limit=max(limit, message_buffer.per_channel)
+        )
+        history = await serialize_messages(messages)
+    except BaseException:
+        message_buffer.abort_load(channel_id)
+        raise
+    message_buffer.seed(channel_id, history, has_more)
+    return history[-limit:], has_more or len(history) > limit
+
+
+def message_data(message: msg_model.Message, author_name: str) -> dict:
+    """The "data" of a message frame"""
+    return {
+        "id": message.id, 
+        "author": author_name, 
+        "author_id": message.author_id, 
+        "content": message.content, 
+        "sent_at": message.sent_at.isoformat()
+    }
+
+
+async def persist_message(channel_id: int, author_id: int, author_name: str, content: str) -> dict:
+    """Save a chat message, add it to the channel tail and return its frame data"""
+    message = await message_writer.create(channel_id, author_id, content)
+    data = message_data(message, author_name)
+    message_buffer.append(channel_id, data)
+    return data
+
+
+async def broadcast_message(channel_id: int, data: dict):
+    """
+    Fan out a message created outside a socket (e.g. over REST). Other
+    workers add it to their channel tail when the frame reaches them.
+    """
+    message_buffer.append(channel_id, data)
+    await manager.broadcast(channel_id, {"type": "message", "data": data})
+
+
+async def broadcast_messages(channel_id: int, messages: List[dict]):
+    """
+    Fan out messages created in bulk as one "messages" frame (data is a list
+    in the shape of a "message" frame's data), rather than one frame each.
+    """
+    for data in messages:
+        message_buffer.append(channel_id, data)
+    await manager.broadcast(channel_id, {"type": "messages", "data": messages})
+
+
+async def join_channel(websocket: WebSocket, user: user_model.User, channel_id: int, announce: bool = True):
+    """
+    Send history and presence to a freshly subscribed socket, and announce
+    the user unless they were already present (e.g. in another tab)
+    """
+    history, has_more = await recent_history(channel_id, HISTORY_PAGE_SIZE)
+    await manager.send_personal(websocket, {"type": "history", "channel_id": channel_id, "data": history, "has_more": has_more})
+    active_user_ids = list(manager.active_users(channel_id))
+    await manager.send_personal(websocket, {"type": "active_users", "channel_id": channel_id, "data": active_user_ids})
+    if not announce:
+        return
+    await manager.broadcast(
+        channel_id,
+        {"type": "user_joined", "data": {"user_id": user.id, "user_name": user.full_name}},
+        exclude_ws=websocket
+    )
+
+
+async def send_history_page(websocket: WebSocket, channel_id: int, frame: dict):
+    """
+    Answer a {"type": "load_more", "before_id": ...} (or "after_id") frame
+    with the adjacent page of history.
+    """
+    try:
+        before_id = int(frame["before_id"]) if frame.get("before_id") is not None else None
+        after_id = int(frame["after_id"]) if frame.get("after_id") is not None else None
+        limit = max(1, min(int(frame.get("limit", HISTORY_PAGE_SIZE)), 200))
+    except (TypeError, ValueError):
+        await manager.send_personal(websocket, {"type": "error", "channel_id": channel_id, "data": {"detail": "Invalid load_more cursor"}})
         return
+    messages, has_more = await msg_model.Message.page(
+        channel_id, before_id=before_id, after_id=after_id, limit=limit
+    )
+    await manager.send_personal(websocket, {
+        "type": "history_page",
+        "channel_id": channel_id,
+        "data": await serialize_messages(messages),
+        "has_more": has_more,
+    })
+
+
+async def send_smart_replies(websocket: WebSocket, user: user_model.User, channel_id: int):
+    suggestions = await smart_replies_for(channel_id, user.id, user.full_name)
+    await manager.send_personal(websocket, {
+        "type": "smart_replies",
+        "channel_id": channel_id,
+        "data": {"suggestions": suggestions}
+    })
+
+
+async def request_smart_replies(websocket: WebSocket, user: user_model.User, channel_id: int):
+    """
+    Answer a get_smart_replies frame. Cached suggestions go back straight
+    away; otherwise the AI call runs as a background job, and a socket that
+    asks again while its call for the same channel state is running is not
+    given a second job.
+    """
+    key, _ = await smart_reply_key(channel_id, user.id)
+    suggestions = smart_reply_cache.get(key)
+    if suggestions is not None:
+        await manager.send_personal(websocket, {
+            "type": "smart_replies",
+            "channel_id": channel_id,
+            "data": {"suggestions": suggestions}
+        })
+        return
+    waiter = (key, websocket)
+    if waiter in _smart_reply_waiters:
+        return
+
+    async def job():
+        try:
+            await send_smart_replies(websocket, user, channel_id)
+        finally:
+            _smart_reply_waiters.discard(waiter)
+
+    if await start_ai_job(websocket, user, channel_id, job(), "smart_replies"):
+        _smart_reply_waiters.add(waiter)
+
+
+async def start_ai_job(websocket: WebSocket, user: user_model.User, channel_id: int, coro, name: str) -> bool:
+    """Run AI work in the background for this socket; tell the user if they're over the limit"""
+    try:
+        ai_jobs.submit(websocket, user.id, coro, name=name)
+        return True
+    except JobLimitExceeded:
+        await manager.send_personal(websocket, {
+            "type": "system_message", 
+            "channel_id": channel_id, 
+            "data": {"content": "The assistant is busy with your earlier requests, please try again in a moment."}
+        })
+        return False
+
+
+async def chatbot_reply(user: user_model.User, channel_id: int, text: str, chatbot_user_id: int):
+    """Ask the AI service for the chatbot's answer and post it to the channel"""
+    # Get history for chatbot context
+    history_messages, _ = await recent_history(channel_id, 10)
+    past_user_inputs = [m["content"] for m in history_messages if m["author_id"] == user.id]
+    generated_responses = [m["content"] for m in history_messages if m["author_id"] == chatbot_user_id]
     
+    bot_reply_content = "Sorry, something went wrong."
     try:
-        channel = await ch_model.Channel.get(id=channel_id)
-    except DoesNotExist:
-        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        response = await ai_client.post(
+            "/api/v1/chat",
+            {
+                "text": text,
+                "past_user_inputs": past_user_inputs,
+                "generated_responses": generated_responses
+            },
+            timeout=30.0
+        )
+        if response.status_code == 200:
+            bot_reply_content = response.json().get("reply", bot_reply_content)
+    except AIServiceUnavailable:
+        bot_reply_content = "I am having trouble connecting to my brain right now."
+    
+    # Save and broadcast bot response
+    bot_message = await persist_message(channel_id, chatbot_user_id, "Chatbot", bot_reply_content)
+    
+    await manager.broadcast(channel_id, {"type": "message", "data": bot_message})
+
+
+SUMMARY_WINDOW = 50
+
+
+def summary_delta(recent_messages: List[dict], last_message_id: Optional[int]) -> List[dict]:
+    """
+    The messages not yet folded into a stored summary. /summarize commands are
+    skipped so asking twice in a row finds nothing new. If the summarized
+    message is no longer in the window, the whole window counts as new.
+    """
+    messages = [m for m in recent_messages if not m["content"].lower().startswith("/summarize")]
+    for index, message in enumerate(messages):
+        if message["id"] == last_message_id:
+            return messages[index + 1:]
+    return messages
+
+
+async def summarize_channel(websocket: WebSocket, channel_id: int):
+    """
+    Summarize the recent conversation and post it to the channel as the
+    Summary Bot. Summaries are stored per channel; later requests only send
+    the previous summary plus messages since, and return it as-is when
+    nothing new was said.
+    """
+    recent_messages, _ = await recent_history(channel_id, SUMMARY_WINDOW)
+    stored = await ChannelSummary.get_or_none(channel_id=channel_id)
+    delta = summary_delta(recent_messages, stored.last_message_id if stored else None)
+    if stored is None and not delta:
+        await manager.send_personal(websocket, {"type": "system_message", "channel_id": channel_id, "data": {"content": "Not enough messages to summarize."}})
         return
+
+    if not delta:
+        metrics.incr("summaries_reused")
+        summary = stored.content
+    else:
+        chat_text = "\n".join([f"{msg['author']}: {msg['content']}" for msg in delta])
+        if stored is not None:
+            chat_text = f"Summary of the conversation so far:\n{stored.content}\n\nNew messages:\n{chat_text}"
+        summary = "Could not generate a summary."
+        try:
+            response = await ai_client.post("/api/v1/summarize", {"text": chat_text}, timeout=30.0)
+            if response.status_code == 200:
+                summary = response.json().get("summary", summary)
+                await ChannelSummary.update_or_create(
+                    defaults={"content": summary, "last_message_id": delta[-1]["id"]}, channel_id=channel_id
+                )
+            else:
+                summary = f"Error: Could not contact AI service (status: {response.status_code})."
+        except AIServiceUnavailable as e:
+            summary = f"Error: Could not connect to AI service: {e}"
         
-    # --- Check for Chatbot Channel ---
-    is_chatbot_channel = False
-    chatbot_user_id = websocket.app.state.chatbot_user_id
-    if channel.is_private:
-        members = await ChannelMember.filter(channel_id=channel_id).values_list("user_id", flat=True)
-        if set(members) == {user.id, chatbot_user_id}:
-            is_chatbot_channel = True
-    # --- End Check ---
-
-    if channel.is_private and not is_chatbot_channel:
-        is_member = await ChannelMember.filter(channel_id=channel_id, user_id=user.id).exists()
-        if not is_member:
-            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-            return
-    elif not channel.is_private and channel.role_id and channel.role_id != user.role_id:
+    await manager.broadcast(channel_id, {
+        "type": "message", 
+        "data": {
+            "id": 0, 
+            "author": "Summary Bot", 
+            "author_id": 0, 
+            "content": summary, 
+            "sent_at": datetime.utcnow().isoformat()
+        }
+    })
+
+
+async def handle_text(
+    websocket: WebSocket,
+    user: user_model.User,
+    channel_id: int,
+    text: str,
+    is_chatbot_channel: bool,
+    chatbot_user_id: int,
+):
+    """
+    Persist and fan out one chat message. Chatbot answers and /summarize run
+    as background jobs, so the caller can go back to reading frames.
+    """
+    if is_chatbot_channel:
+        # Save the user's message first
+        user_message = await persist_message(channel_id, user.id, user.full_name, text)
+        
+        # Broadcast the user's message immediately
+        await manager.broadcast(channel_id, {"type": "message", "data": user_message})
+        
+        await start_ai_job(websocket, user, channel_id, chatbot_reply(user, channel_id, text, chatbot_user_id), "chatbot")
+        return
+
+    if text.lower().startswith("/summarize"):
+        # Save the user's /summarize command message first
+        user_message = await persist_message(channel_id, user.id, user.full_name, text)
+        
+        # Broadcast the user's command immediately
+        await manager.broadcast(channel_id, {"type": "message", "data": user_message})
+        
+        # Process summarization
+        await start_ai_job(websocket, user, channel_id, summarize_channel(websocket, channel_id), "summarize")
+        return
+
+    # Regular message handling
+    message = await persist_message(channel_id, user.id, user.full_name, text)
+    await manager.broadcast(channel_id, {"type": "message", "data": message})
+    if settings.SMART_REPLY_PRECOMPUTE:
+        await precompute_smart_replies(channel_id, user.id)
+
+
+@router.websocket("/ws/{channel_id}")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    channel_id: int,
+):
+    user = await authenticate_ws(websocket)
+    if not user:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
         return
 
-    await manager.connect(channel_id, user.id, websocket)
+    chatbot_user_id = websocket.app.state.chatbot_user_id
+    close_code, is_chatbot_channel = await authorize_channel(user, channel_id)
+    if close_code is not None:
+        await websocket.close(code=close_code)
+        return
+
+    joined = await manager.connect(
+        channel_id, user.id, websocket, batching=wants_batching(websocket), encoding=wanted_encoding(websocket)
+    )
     
     try:
-        messages = await msg_model.Message.filter(channel_id=channel_id).order_by("-sent_at").limit(50).prefetch_related("author")
-        history = [{"id": msg.id, "author": msg.author.full_name, "author_id": msg.author.id, "content": msg.content, "sent_at": msg.sent_at.isoformat()} for msg in reversed(messages)]
-        await websocket.send_json({"type": "history", "data": history})
-        active_user_ids = list(manager.channel_users.get(channel_id, set()))
-        await websocket.send_json({"type": "active_users", "data": active_user_ids})
-        await manager.broadcast(
-            channel_id,
-            {"type": "user_joined", "data": {"user_id": user.id, "user_name": user.full_name}},
-            exclude_ws=websocket
-        )
+        await join_channel(websocket, user, channel_id, announce=joined)
         
         while True:
             data = await websocket.receive_text()
+            if not manager.is_subscribed(websocket, channel_id):
+                break  # removed from the channel; the socket is being closed
             
             # Handle JSON messages (for smart replies requests)
             try:
                 json_data = json.loads(data)
                 if json_data.get("type") == "get_smart_replies":
-                    # Generate smart replies
-                    suggestions = await get_smart_replies(channel_id, user.full_name)
-                    await websocket.send_json({
-                        "type": "smart_replies",
-                        "data": {"suggestions": suggestions}
-                    })
+                    await request_smart_replies(websocket, user, channel_id)
+                    continue
+                if json_data.get("type") == "load_more":
+                    await send_history_page(websocket, channel_id, json_data)
                     continue
             except json.JSONDecodeError:
                 # Not JSON, treat as regular text message
@@ -191,118 +1139,86 @@ async def websocket_endpoint(
                 # Was JSON but not a smart reply request, skip
                 continue
 
-            if is_chatbot_channel:
-                # Save the user's message first
-                user_message = await msg_model.Message.create(content=text, channel_id=channel_id, author_id=user.id)
-                
-                # Broadcast the user's message immediately
-                await manager.broadcast(channel_id, {
-                    "type": "message", 
-                    "data": {
-                        "id": user_message.id, 
-                        "author": user.full_name, 
-                        "author_id": user.id, 
-                        "content": user_message.content, 
-                        "sent_at": user_message.sent_at.isoformat()
-                    }
-                })
-                
-                # Get history for chatbot context
-                history_messages = await msg_model.Message.filter(channel_id=channel_id).order_by("sent_at").limit(10)
-                past_user_inputs = [m.content for m in history_messages if m.author_id == user.id]
-                generated_responses = [m.content for m in history_messages if m.author_id == chatbot_user_id]
-                
-                bot_reply_content = "Sorry, something went wrong."
-                try:
-                    async with httpx.AsyncClient() as client:
-                        response = await client.post(
-                            f"{AI_SERVICE_URL}/api/v1/chat",
-                            json={
-                                "text": text,
-                                "past_user_inputs": past_user_inputs,
-                                "generated_responses": generated_responses
-                            },
-                            timeout=30.0
-                        )
-                        if response.status_code == 200:
-                            bot_reply_content = response.json().get("reply", bot_reply_content)
-                except httpx.RequestError:
-                    bot_reply_content = "I am having trouble connecting to my brain right now."
-                
-                # Save and broadcast bot response
-                bot_message = await msg_model.Message.create(content=bot_reply_content, channel_id=channel_id, author_id=chatbot_user_id)
+            await handle_text(websocket, user, channel_id, text, is_chatbot_channel, chatbot_user_id)
                 
-                await manager.broadcast(channel_id, {
-                    "type": "message",
-                    "data": {
-                        "id": bot_message.id,
-                        "author": "Chatbot",
-                        "author_id": chatbot_user_id,
-                        "content": bot_message.content,
-                        "sent_at": bot_message.sent_at.isoformat()
-                    }
-                })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Also reached when the user was removed from the channel (the loop breaks)
+        ai_jobs.cancel_owner(websocket)
+        if manager.disconnect(websocket):
+            await manager.broadcast(channel_id, {"type": "user_left", "data": {"user_id": user.id, "user_name": user.full_name}})
+
+
+@router.websocket("/ws")
+async def multiplexed_endpoint(websocket: WebSocket):
+    """
+    One authenticated socket per user for any number of channels, driven by
+    JSON control frames:
+        {"type": "subscribe", "channel_id": 1}
+        {"type": "unsubscribe", "channel_id": 1}
+        {"type": "message", "channel_id": 1, "content": "hello"}
+        {"type": "get_smart_replies", "channel_id": 1}
+        {"type": "load_more", "channel_id": 1, "before_id": 123}
+    Every frame sent back carries the channel_id it belongs to. Connect with
+    ?batch=1 to get chat messages batched (see wants_batching) and choose
+    the frame encoding with ?encoding= (see wanted_encoding).
+    """
+    user = await authenticate_ws(websocket)
+    if not user:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    chatbot_user_id = websocket.app.state.chatbot_user_id
+    # channel id -> whether it is the user's chatbot channel
+    subscriptions: Dict[int, bool] = {}
+    await manager.register(
+        user.id, websocket, batching=wants_batching(websocket), encoding=wanted_encoding(websocket)
+    )
+
+    try:
+        while True:
+            data = await websocket.receive_text()
+            try:
+                frame = json.loads(data)
+                kind = frame["type"]
+                channel_id = int(frame["channel_id"])
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                await manager.send_personal(websocket, {"type": "error", "data": {"detail": "Expected a JSON frame with type and channel_id"}})
                 continue
 
-            if text.lower().startswith("/summarize"):
-                # Save the user's /summarize command message first
-                user_message = await msg_model.Message.create(content=text, channel_id=channel_id, author_id=user.id)
-                
-                # Broadcast the user's command immediately
-                await manager.broadcast(channel_id, {
-                    "type": "message", 
-                    "data": {
-                        "id": user_message.id, 
-                        "author": user.full_name, 
-                        "author_id": user.id, 
-                        "content": user_message.content, 
-                        "sent_at": user_message.sent_at.isoformat()
-                    }
-                })
-                
-                # Process summarization
-                recent_messages = await msg_model.Message.filter(channel_id=channel_id).order_by("-sent_at").limit(50).prefetch_related("author")
-                if not recent_messages:
-                    await websocket.send_json({"type": "system_message", "data": {"content": "Not enough messages to summarize."}})
+            if kind == "subscribe":
+                if manager.is_subscribed(websocket, channel_id):
                     continue
-                    
-                chat_text = "\n".join([f"{msg.author.full_name}: {msg.content}" for msg in reversed(recent_messages)])
-                summary = "Could not generate a summary."
-                try:
-                    async with httpx.AsyncClient() as client:
-                        response = await client.post(f"{AI_SERVICE_URL}/api/v1/summarize", json={"text": chat_text}, timeout=30.0)
-                        if response.status_code == 200:
-                            summary = response.json().get("summary", summary)
-                        else:
-                            summary = f"Error: Could not contact AI service (status: {response.status_code})."
-                except httpx.RequestError as e:
-                    summary = f"Error: Could not connect to AI service: {e}"
-                    
-                await manager.broadcast(channel_id, {
-                    "type": "message", 
-                    "data": {
-                        "id": 0, 
-                        "author": "Summary Bot", 
-                        "author_id": 0, 
-                        "content": summary, 
-                        "sent_at": datetime.utcnow().isoformat()
-                    }
-                })
-                continue
+                close_code, is_chatbot_channel = await authorize_channel(user, channel_id)
+                if close_code is not None:
+                    await manager.send_personal(websocket, {"type": "error", "channel_id": channel_id, "data": {"detail": "Cannot join this channel"}})
+                    continue
+                subscriptions[channel_id] = is_chatbot_channel
+                joined = manager.subscribe(websocket, channel_id)
+                await join_channel(websocket, user, channel_id, announce=joined)
+            elif not manager.is_subscribed(websocket, channel_id):
+                # Never subscribed, or removed from the channel (see ConnectionManager.revoke)
+                subscriptions.pop(channel_id, None)
+                await manager.send_personal(websocket, {"type": "error", "channel_id": channel_id, "data": {"detail": "Not subscribed to this channel"}})
+            elif kind == "unsubscribe":
+                del subscriptions[channel_id]
+                if manager.unsubscribe(websocket, channel_id):
+                    await manager.broadcast(channel_id, {"type": "user_left", "data": {"user_id": user.id, "user_name": user.full_name}})
+            elif kind == "message":
+                text = str(frame.get("content", "")).strip()
+                if text:
+                    await handle_text(websocket, user, channel_id, text, subscriptions[channel_id], chatbot_user_id)
+            elif kind == "get_smart_replies":
+                await request_smart_replies(websocket, user, channel_id)
+            elif kind == "load_more":
+                await send_history_page(websocket, channel_id, frame)
+            else:
+                await manager.send_personal(websocket, {"type": "error", "channel_id": channel_id, "data": {"detail": f"Unknown frame type: {kind}"}})
 
-            # Regular message handling
-            message = await msg_model.Message.create(content=text, channel_id=channel_id, author_id=user.id)
-            await manager.broadcast(channel_id, {
-                "type": "message", 
-                "data": {
-                    "id": message.id, 
-                    "author": user.full_name, 
-                    "author_id": user.id, 
-                    "content": message.content, 
-                    "sent_at": message.sent_at.isoformat()
-                }
-            })
-                
     except WebSocketDisconnect:
-        manager.disconnect(channel_id, user.id, websocket)
-        await manager.broadcast(channel_id, {"type": "user_left", "data": {"user_id": user.id, "user_name": user.full_name}})
\ No newline at end of file
+        pass
+    finally:
+        ai_jobs.cancel_owner(websocket)
+        for channel_id in manager.disconnect(websocket):
+            await manager.broadcast(channel_id, {"type": "user_left", "data": {"user_id": user.id, "user_name": user.full_name}})
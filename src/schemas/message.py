@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import Optional
 
 class MessageCreate(BaseModel):
     channel_id: int
@@ -9,6 +10,8 @@ class MessageRead(MessageCreate):
     id: int
     author_id: int
     sent_at: datetime
+    # Only filled in when asked for with ?include_author=true
+    author_name: Optional[str] = None
 
     class Config:
         orm_mode = True
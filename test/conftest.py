@@ -4,6 +4,7 @@ import sys, os, pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
 from httpx import ASGITransport
+from tortoise import Tortoise
 from tortoise.contrib.fastapi import register_tortoise
 from src.core.config import settings
 
@@ -14,6 +15,7 @@ if SRC not in sys.path:
     sys.path.insert(0, SRC)
 
 from src.main import app  # now importable thanks to the sys.path tweak
+from core.database import TORTOISE_ORM
 
 @pytest.fixture(scope="session")
 def anyio_backend():
@@ -49,3 +51,27 @@ async def client():
     transport = ASGITransport(app=app)  # HTTPX transport into the ASGI app :contentReference[oaicite:4]{index=4}
     async with AsyncClient(transport=transport, base_url="http://testserver") as ac:
         yield ac  # anyio will run this fixture in an AsyncIO event loop :contentReference[oaicite:5]{index=5}
+
+
+APP_MODELS = TORTOISE_ORM["apps"]["models"]["models"]
+
+@pytest.fixture
+async def db():
+    """
+    Fresh in-memory SQLite initialised with the models exactly as the app
+    imports them (``models.*``), for tests that call app code directly.
+    """
+    from core.acl import invalidate_all_channels
+    from core.message_writer import message_writer
+    from core.profiles import author_profiles
+    from core.recent_messages import message_buffer
+
+    # In-process caches are keyed by row ids, which restart with every database
+    invalidate_all_channels()
+    author_profiles.clear()
+    message_buffer.clear()
+    message_writer.ids.reset()
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": APP_MODELS})
+    await Tortoise.generate_schemas()
+    yield
+    await Tortoise.close_connections()
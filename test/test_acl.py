@@ -0,0 +1,54 @@
+import pytest
+
+from core import acl
+from models.channel import Channel
+from models.channelmember import ChannelMember
+from models.role import Role
+from models.user import User
+
+
+@pytest.mark.anyio
+async def test_acl_is_served_from_memory_until_invalidated(db, monkeypatch):
+    acl.invalidate_all_channels()
+    ann = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    bob = await User.create(full_name="Bob", email="bob@example.com", hashed_password="x")
+    team = await Channel.create(name="team", is_private=True)
+    await ChannelMember.create(channel=team, user=ann)
+
+    first = await acl.get_channel_acl(team.id)
+    assert acl.can_access(ann, first) and not acl.can_access(bob, first)
+    assert await acl.get_channel_acl(team.id) is first
+
+    await ChannelMember.create(channel=team, user=bob)
+    acl.invalidate_channel(team.id)
+    assert acl.can_access(bob, await acl.get_channel_acl(team.id))
+    assert await acl.get_channel_acl(team.id + 100) is None
+
+
+@pytest.mark.anyio
+async def test_load_racing_an_invalidation_is_not_cached(db, monkeypatch):
+    acl.invalidate_all_channels()
+    team = await Channel.create(name="team", is_private=True)
+    load_members = ChannelMember.filter
+
+    def filter_and_invalidate(*args, **kwargs):
+        # Membership changes while the ACL is being loaded
+        acl.invalidate_channel(team.id)
+        return load_members(*args, **kwargs)
+
+    monkeypatch.setattr(ChannelMember, "filter", filter_and_invalidate)
+    await acl.get_channel_acl(team.id)
+    assert team.id not in acl.channel_acl_cache
+
+
+@pytest.mark.anyio
+async def test_role_bound_public_channel_admits_only_that_role(db):
+    acl.invalidate_all_channels()
+    admins = await Role.create(name="admin")
+    ann = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x", role=admins)
+    bob = await User.create(full_name="Bob", email="bob@example.com", hashed_password="x")
+    staff = await Channel.create(name="staff", role=admins)
+
+    entry = await acl.get_channel_acl(staff.id)
+    assert acl.can_access(ann, entry)
+    assert not acl.can_access(bob, entry)
@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+import pytest
+
+from core.ai_client import AIClient, AIServiceUnavailable, CircuitBreaker
+
+
+def _client(handler, **breaker):
+    return AIClient(
+        "http://ai.test",
+        breaker=CircuitBreaker(**breaker),
+        transport=httpx.MockTransport(handler),
+    )
+
+
+@pytest.mark.anyio
+async def test_breaker_opens_after_repeated_failures_and_fails_fast():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        raise httpx.ConnectError("refused", request=request)
+
+    client = _client(handler, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(AIServiceUnavailable):
+            await client.post("/api/v1/chat", {}, timeout=1)
+    with pytest.raises(AIServiceUnavailable):
+        await client.post("/api/v1/chat", {}, timeout=1)
+
+    assert len(calls) == 2
+    assert client.breaker.state == CircuitBreaker.OPEN
+    await client.close()
+
+
+@pytest.mark.anyio
+async def test_half_open_probe_closes_the_circuit_on_success():
+    healthy = [False]
+
+    def handler(request):
+        if not healthy[0]:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"reply": "hi"})
+
+    client = _client(handler, failure_threshold=1, reset_timeout=0)
+    response = await client.post("/api/v1/chat", {}, timeout=1)
+    assert response.status_code == 503
+    assert client.breaker.failures == 1
+
+    healthy[0] = True
+    response = await client.post("/api/v1/chat", {}, timeout=1)
+    assert response.json() == {"reply": "hi"}
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    await client.close()
+
+
+@pytest.mark.anyio
+async def test_cancelled_probe_lets_the_next_call_probe():
+    started = asyncio.Event()
+
+    async def handler(request):
+        if request.url.path == "/fail":
+            return httpx.Response(503)
+        started.set()
+        await asyncio.sleep(60)
+
+    client = _client(handler, failure_threshold=1, reset_timeout=0)
+    await client.post("/fail", {}, timeout=1)
+
+    probe = asyncio.create_task(client.post("/api/v1/chat", {}, timeout=120))
+    await started.wait()
+    assert not client.breaker.allow()
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.breaker.allow()
+    await client.close()
@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+
+from core import acl
+from core.backplane import Backplane, InMemoryBackplane, RedisBackplane, serve_hub
+from routers.ws_chat import ConnectionManager
+from test_ws_manager import FakeWebSocket
+
+
+async def connected_pair(backplane_a, backplane_b):
+    node_a = ConnectionManager(backplane=backplane_a)
+    node_b = ConnectionManager(backplane=backplane_b)
+    await node_a.start()
+    await node_b.start()
+    return node_a, node_b
+
+
+@pytest.mark.anyio
+async def test_in_memory_backplane_links_managers_in_process():
+    shared = InMemoryBackplane()
+    node_a, node_b = await connected_pair(shared, shared)
+    on_a, on_b = FakeWebSocket(), FakeWebSocket()
+    await node_a.connect(1, 10, on_a)
+    await node_b.connect(1, 20, on_b)
+    await asyncio.sleep(0)
+
+    await node_a.broadcast(1, {"type": "message", "data": {"id": 1}})
+
+    assert on_a.sent == on_b.sent == [{"type": "message", "data": {"id": 1}, "channel_id": 1}]
+    assert node_a.active_users(1) == node_b.active_users(1) == {10, 20}
+
+    node_b.disconnect(on_b)
+    await asyncio.sleep(0)
+    assert node_a.active_users(1) == {10}
+
+
+@pytest.mark.anyio
+async def test_relayed_bulk_frames_are_split_for_non_batching_sockets():
+    shared = InMemoryBackplane()
+    node_a, node_b = await connected_pair(shared, shared)
+    on_b = FakeWebSocket()
+    await node_b.connect(1, 20, on_b)
+
+    await node_a.broadcast(1, {"type": "messages", "data": [{"id": 1}, {"id": 2}]})
+
+    assert on_b.sent == [
+        {"type": "message", "data": {"id": 1}, "channel_id": 1},
+        {"type": "message", "data": {"id": 2}, "channel_id": 1},
+    ]
+
+
+@pytest.mark.anyio
+async def test_silent_node_presence_expires_until_it_heartbeats_again():
+    shared = InMemoryBackplane()
+    node_a = ConnectionManager(backplane=shared, node_timeout=0.05)
+    node_b = ConnectionManager(backplane=shared, node_timeout=0.05)
+    for node in (node_a, node_b):
+        await node.start()
+    await node_a.connect(1, 10, FakeWebSocket())
+    await node_b.connect(1, 20, FakeWebSocket())
+    await asyncio.sleep(0)
+    assert node_a.active_users(1) == {10, 20}
+
+    # node_b dies without announcing node_down
+    shared._handlers.remove(node_b._on_backplane_event)
+    await asyncio.sleep(0.06)
+    assert node_a.expire_nodes() == [node_b.node_id]
+    assert node_a.active_users(1) == {10}
+
+    # Once it's heard from again its presence is resynced
+    shared._handlers.append(node_b._on_backplane_event)
+    await node_b._publish({"type": "heartbeat"})
+    assert node_a.active_users(1) == {10, 20}
+    assert node_a.expire_nodes() == []
+
+
+def test_incomplete_backplane_cannot_be_created():
+    class NoPublish(Backplane):
+        async def start(self, on_event):
+            pass
+
+    with pytest.raises(TypeError):
+        NoPublish()
+
+
+@pytest.mark.anyio
+async def test_single_manager_does_not_publish():
+    backplane = InMemoryBackplane()
+    manager = ConnectionManager(backplane=backplane)
+    await manager.start()
+    assert not backplane.distributed
+
+
+@pytest.mark.anyio
+async def test_resp_backplane_over_unix_socket(tmp_path):
+    path = str(tmp_path / "hub.sock")
+    server = await serve_hub(unix_path=path)
+    async with server:
+        node_a, node_b = await connected_pair(
+            RedisBackplane(f"unix://{path}"), RedisBackplane(f"unix://{path}")
+        )
+        on_b = FakeWebSocket()
+        await node_b.connect(7, 20, on_b)
+
+        await node_a.broadcast(7, {"type": "user_joined", "data": {"user_id": 10}})
+        for _ in range(50):
+            if on_b.sent and node_a.active_users(7):
+                break
+            await asyncio.sleep(0.01)
+
+        assert on_b.sent == [{"type": "user_joined", "data": {"user_id": 10}, "channel_id": 7}]
+        assert node_a.active_users(7) == {20}
+
+        await node_b.stop()
+        await asyncio.sleep(0.05)
+        assert node_a.active_users(7) == set()
+        await node_a.stop()
+
+
+@pytest.mark.anyio
+async def test_remote_revoke_drops_cached_access():
+    manager = ConnectionManager()
+    acl.channel_acl_cache.set(7, (0, "cached acl"))
+    acl.visible_channels_cache.set(20, "cached channels")
+
+    await manager._on_backplane_event({"type": "revoke", "channel_id": 7, "user_ids": [20], "origin": "other"})
+
+    assert acl.channel_acl_cache.get(7) is None
+    assert acl.visible_channels_cache.get(20) is None
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+import pytest
+from tortoise import timezone
+
+from core.acl import cached_visible_channels, invalidate_all_channels
+from models.channel import Channel
+from models.channelmember import ChannelMember
+from models.message import Message
+from models.user import User
+from routers import channels as channels_router
+from routers.channels import MarkRead, list_my_channels, mark_read
+
+
+@pytest.mark.anyio
+async def test_listing_returns_visible_channels_with_unread_counts(db):
+    invalidate_all_channels()
+    me = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    other = await User.create(full_name="Bob", email="bob@example.com", hashed_password="x")
+    general = await Channel.create(name="general")
+    team = await Channel.create(name="team", is_private=True)
+    hidden = await Channel.create(name="hidden", is_private=True)
+    await ChannelMember.create(channel=team, user=me)
+    await ChannelMember.create(channel=hidden, user=other)
+    first = await Message.create(channel=general, author=other, content="hi")
+    await Message.create(channel=general, author=me, content="hello")
+    last = await Message.create(channel=general, author=other, content="how are you?")
+    await Message.create(channel=hidden, author=other, content="secret")
+
+    channels = await list_my_channels(me)
+    assert channels == [
+        {"id": general.id, "name": "general", "is_private": False, "last_message_id": last.id, "unread_count": 2, "unread_capped": False},
+        {"id": team.id, "name": "team", "is_private": True, "last_message_id": None, "unread_count": 0, "unread_capped": False},
+    ]
+    assert cached_visible_channels(me.id) == {general.id, team.id}
+
+    await mark_read(general.id, MarkRead(message_id=first.id), me)
+    assert (await list_my_channels(me))[0]["unread_count"] == 1
+    await mark_read(general.id, MarkRead(), me)
+    assert (await list_my_channels(me))[0]["unread_count"] == 0
+
+
+@pytest.mark.anyio
+async def test_unread_follows_send_time_not_id_and_is_capped(db, monkeypatch):
+    invalidate_all_channels()
+    monkeypatch.setattr(channels_router, "UNREAD_COUNT_CAP", 2)
+    me = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    other = await User.create(full_name="Bob", email="bob@example.com", hashed_password="x")
+    general = await Channel.create(name="general")
+    now = timezone.now()
+    # Ids from another write-behind worker's block: the newer message has the lower id
+    newer = await Message.create(id=10, channel=general, author=other, content="newer", sent_at=now)
+    older = await Message.create(id=20, channel=general, author=other, content="older", sent_at=now - timedelta(seconds=5))
+
+    listing = (await list_my_channels(me))[0]
+    assert listing["last_message_id"] == newer.id
+    assert (listing["unread_count"], listing["unread_capped"]) == (2, False)
+
+    await mark_read(general.id, MarkRead(message_id=older.id), me)
+    assert (await list_my_channels(me))[0]["unread_count"] == 1
+    await mark_read(general.id, MarkRead(), me)
+    assert (await list_my_channels(me))[0]["unread_count"] == 0
+    # Marking an older message read doesn't move the marker back
+    await mark_read(general.id, MarkRead(message_id=older.id), me)
+    assert (await list_my_channels(me))[0]["unread_count"] == 0
+
+    for i in range(3):
+        await Message.create(channel=general, author=other, content=str(i), sent_at=now + timedelta(seconds=i + 1))
+    listing = (await list_my_channels(me))[0]
+    assert (listing["unread_count"], listing["unread_capped"]) == (2, True)
@@ -0,0 +1,75 @@
+import pytest
+from fastapi import HTTPException
+
+from models.channel import Channel
+from models.channelmember import ChannelMember
+from models.user import User
+from models.role import Role
+from routers import channels
+from routers.channels import MembersUpdate, validate_user_ids
+
+
+async def seed_users(count: int):
+    return [
+        (await User.create(full_name=f"User {i}", email=f"u{i}@example.com", hashed_password="x")).id
+        for i in range(count)
+    ]
+
+
+@pytest.mark.anyio
+async def test_add_many_is_idempotent_and_remove_many_counts(db):
+    user_ids = await seed_users(5)
+    channel = await Channel.create(name="team", is_private=True)
+
+    await ChannelMember.add_many(channel.id, user_ids[:3])
+    await ChannelMember.add_many(channel.id, user_ids + user_ids[:1])
+    assert await ChannelMember.filter(channel_id=channel.id).count() == 5
+
+    assert await ChannelMember.remove_many(channel.id, [user_ids[0], user_ids[1], 9999]) == 2
+    members = await ChannelMember.filter(channel_id=channel.id).values_list("user_id", flat=True)
+    assert sorted(members) == user_ids[2:]
+
+
+@pytest.mark.anyio
+async def test_validate_user_ids_reports_unknown_ids(db):
+    user_ids = await seed_users(2)
+
+    assert await validate_user_ids(user_ids + user_ids) == sorted(user_ids)
+    with pytest.raises(HTTPException) as exc:
+        await validate_user_ids(user_ids + [9999])
+    assert exc.value.status_code == 400
+    assert "9999" in exc.value.detail
+
+
+@pytest.mark.anyio
+async def test_only_admins_remove_other_members(db, monkeypatch):
+    revoked = []
+
+    async def record_revoke(channel_id, user_ids):
+        revoked.append((channel_id, sorted(user_ids)))
+
+    monkeypatch.setattr(channels.manager, "revoke", record_revoke)
+    admin_role = await Role.create(name="admin")
+    admin = await User.create(full_name="Admin", email="admin@example.com", hashed_password="x", role=admin_role)
+    ann, bob = [await User.get(id=user_id).prefetch_related("role") for user_id in await seed_users(2)]
+    channel = await Channel.create(name="team", is_private=True)
+    await ChannelMember.add_many(channel.id, [ann.id, bob.id])
+
+    with pytest.raises(HTTPException) as exc:
+        await channels.update_members(channel.id, MembersUpdate(remove=[bob.id]), ann)
+    assert exc.value.status_code == 403
+
+    assert (await channels.update_members(channel.id, MembersUpdate(remove=[ann.id]), ann))["removed"] == 1
+    assert (await channels.update_members(channel.id, MembersUpdate(remove=[bob.id]), admin))["removed"] == 1
+    assert revoked == [(channel.id, [ann.id]), (channel.id, [bob.id])]
+
+
+@pytest.mark.anyio
+async def test_chatbot_channel_members_cannot_be_edited(db):
+    ann = await User.get(id=(await seed_users(1))[0]).prefetch_related("role")
+    channel = await Channel.create(name="bot", is_private=True, is_bot_dm=True)
+    await ChannelMember.add_many(channel.id, [ann.id])
+
+    with pytest.raises(HTTPException) as exc:
+        await channels.update_members(channel.id, MembersUpdate(add=[ann.id]), ann)
+    assert exc.value.status_code == 400
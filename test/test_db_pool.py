@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from tortoise.exceptions import DBConnectionError
+
+from core.database import connection_config
+from core.db_pool import InstrumentedMySQLClient
+
+
+class FakePool:
+    def __init__(self, free: int):
+        self.maxsize = free
+        self.size = free
+        self.freesize = free
+
+    async def acquire(self):
+        if not self.freesize:
+            await asyncio.sleep(3600)
+        self.freesize -= 1
+        return object()
+
+    async def release(self, connection):
+        self.freesize += 1
+
+
+def test_mysql_urls_get_an_explicit_pool_config():
+    config = connection_config("mysql://chat:p%40ss@db:3307/chatdb?maxsize=50")
+    assert config["engine"] == "core.db_pool"
+    credentials = config["credentials"]
+    assert (credentials["host"], credentials["port"], credentials["password"]) == ("db", 3307, "p@ss")
+    assert credentials["maxsize"] == 50
+    assert "acquire_timeout" in credentials and "pool_recycle" in credentials
+    assert connection_config("sqlite://:memory:") == "sqlite://:memory:"
+
+
+@pytest.mark.anyio
+async def test_acquire_times_out_and_stats_track_usage():
+    client = InstrumentedMySQLClient(
+        user="u", password="p", database="d", host="h", port=3306,
+        connection_name="default", maxsize=1, acquire_timeout=0.01,
+    )
+    client._pool = FakePool(free=1)
+
+    async with client.acquire_connection():
+        assert client.pool_stats()["in_use"] == 1
+        assert client.pool_stats()["utilization"] == 1.0
+        with pytest.raises(DBConnectionError):
+            async with client.acquire_connection():
+                pass
+    assert client.pool_stats()["in_use"] == 0
+    assert client.pool_stats()["waiting"] == 0
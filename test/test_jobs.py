@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from core.jobs import JobLimitExceeded, JobRunner
+
+
+@pytest.mark.anyio
+async def test_per_user_limit_rejects_extra_jobs():
+    runner = JobRunner(max_concurrent=4, max_per_user=1)
+    release = asyncio.Event()
+    runner.submit("ws-1", 1, release.wait())
+
+    with pytest.raises(JobLimitExceeded):
+        runner.submit("ws-1", 1, release.wait())
+    # Other users are unaffected
+    runner.submit("ws-2", 2, release.wait())
+
+    release.set()
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert runner.stats() == {"running": 0, "queued": 0, "users": 0}
+
+
+@pytest.mark.anyio
+async def test_global_limit_queues_and_cancel_owner_stops_jobs():
+    runner = JobRunner(max_concurrent=1, max_per_user=5)
+    started = []
+
+    async def job(n):
+        started.append(n)
+        await asyncio.sleep(10)
+
+    first = runner.submit("ws-1", 1, job(1))
+    second = runner.submit("ws-2", 2, job(2))
+    await asyncio.sleep(0.01)
+    assert started == [1]
+    assert runner.stats()["queued"] == 1
+
+    assert runner.cancel_owner("ws-1") == 1
+    await asyncio.sleep(0.01)
+    assert first.cancelled()
+    assert started == [1, 2]
+
+    await runner.stop()
+    assert second.cancelled()
+
+
+@pytest.mark.anyio
+async def test_precompute_leaves_users_their_own_job_allowance(monkeypatch):
+    from routers import ws_chat
+
+    ai_jobs = JobRunner(max_concurrent=2, max_per_user=2)
+    precompute_jobs = JobRunner(max_concurrent=1, max_per_user=1)
+    monkeypatch.setattr(ws_chat, "ai_jobs", ai_jobs)
+    monkeypatch.setattr(ws_chat, "precompute_jobs", precompute_jobs)
+    monkeypatch.setattr(ws_chat.manager, "channel_users", {1: {10: 1, 20: 1}})
+    release = asyncio.Event()
+
+    async def profiles(ids):
+        return {user_id: {"id": user_id, "name": f"User {user_id}"} for user_id in ids}
+
+    async def suggestions(channel_id, user_id, name):
+        await release.wait()
+
+    monkeypatch.setattr(ws_chat, "get_profiles", profiles)
+    monkeypatch.setattr(ws_chat, "smart_replies_for", suggestions)
+
+    for _ in range(3):
+        await ws_chat.precompute_smart_replies(1, author_id=10)
+    # User 20's own requests still have their full allowance
+    ai_jobs.submit("ws-20", 20, release.wait())
+    ai_jobs.submit("ws-20", 20, release.wait())
+    assert precompute_jobs.stats()["users"] == 1
+
+    # With every regular slot busy, precomputing is skipped outright
+    precompute_jobs.cancel_owner(("precompute", 1))
+    await asyncio.sleep(0.01)
+    await ws_chat.precompute_smart_replies(1, author_id=10)
+    assert precompute_jobs.stats() == {"running": 0, "queued": 0, "users": 0}
+
+    release.set()
+    await asyncio.sleep(0.01)
@@ -0,0 +1,149 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from core import acl
+from core.message_writer import message_writer
+from models.channel import Channel
+from models.message import Message
+from models.user import User
+from routers import messages, ws_chat
+from routers.ws_chat import ConnectionManager
+from test_ws_manager import FakeWebSocket
+
+
+async def as_stream(items):
+    for item in items:
+        yield item
+
+
+async def no_broadcast(channel_id, data):
+    pass
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("write_behind", [False, True])
+async def test_batch_reports_errors_per_item_and_broadcasts_per_channel(db, monkeypatch, write_behind):
+    acl.invalidate_all_channels()
+    monkeypatch.setattr(message_writer, "write_behind", write_behind)
+    sent = []
+
+    async def broadcast(channel_id, data):
+        sent.append((channel_id, [d["content"] for d in data]))
+
+    monkeypatch.setattr(messages, "broadcast_messages", broadcast)
+    ann = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    general = await Channel.create(name="general")
+    random = await Channel.create(name="random")
+    private = await Channel.create(name="private", is_private=True)
+
+    items = [
+        {"channel_id": general.id, "content": "one"},
+        {"channel_id": private.id, "content": "nope"},
+        {"channel_id": random.id, "content": "two"},
+        {"channel_id": general.id, "content": ""},
+        "not an object",
+        {"channel_id": general.id, "content": "three"},
+        {"channel_id": private.id, "content": "still no"},
+    ]
+    results = await messages.ingest_messages(ann, as_stream(items), chunk_size=2)
+
+    assert [r["index"] for r in results] == list(range(len(items)))
+    assert [("id" in r) for r in results] == [True, False, True, False, False, True, False]
+    assert results[1]["error"] == results[6]["error"]
+    saved = await Message.all().order_by("id").values_list("id", "content")
+    assert [content for _, content in saved] == ["one", "two", "three"]
+    assert [r["id"] for r in results if "id" in r] == [message_id for message_id, _ in saved]
+    # One frame per channel per chunk, not one per message
+    assert sent == [(general.id, ["one"]), (random.id, ["two"]), (general.id, ["three"])]
+
+
+@pytest.mark.anyio
+async def test_batch_stops_reading_at_the_limit(db, monkeypatch):
+    monkeypatch.setattr(messages, "BATCH_MAX_ITEMS", 2)
+    monkeypatch.setattr(messages, "broadcast_messages", no_broadcast)
+    ann = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    general = await Channel.create(name="general")
+    read = []
+
+    async def items():
+        for i in range(1000):
+            read.append(i)
+            yield {"channel_id": general.id, "content": str(i)}
+
+    results = await messages.ingest_messages(ann, items())
+    assert [("id" in r) for r in results] == [True, True, False]
+    assert "not read" in results[2]["error"]
+    assert len(read) == 3
+    assert await Message.all().count() == 2
+
+
+@pytest.mark.anyio
+async def test_clients_without_batching_get_ingested_messages_one_frame_each(db, monkeypatch):
+    acl.invalidate_all_channels()
+    manager = ConnectionManager(batch_window=60)
+    monkeypatch.setattr(ws_chat, "manager", manager)
+    ann = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    general = await Channel.create(name="general")
+    plain = FakeWebSocket()
+    await manager.connect(general.id, ann.id, plain)
+
+    items = [{"channel_id": general.id, "content": content} for content in ("one", "two")]
+    await messages.ingest_messages(ann, as_stream(items))
+
+    assert [(frame["type"], frame["data"]["content"]) for frame in plain.sent] == [("message", "one"), ("message", "two")]
+
+
+@pytest.mark.anyio
+async def test_chunks_are_bulk_inserted_without_write_behind(db, monkeypatch):
+    monkeypatch.setattr(message_writer, "write_behind", False)
+    monkeypatch.setattr(messages, "broadcast_messages", no_broadcast)
+    inserts = []
+    bulk_create = Message.bulk_create
+
+    async def counting_bulk_create(objects, *args, **kwargs):
+        inserts.append(len(objects))
+        return await bulk_create(objects, *args, **kwargs)
+
+    monkeypatch.setattr(Message, "bulk_create", counting_bulk_create)
+    ann = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    general = await Channel.create(name="general")
+    existing = await Message.create(channel=general, author=ann, content="before")
+
+    items = [{"channel_id": general.id, "content": str(i)} for i in range(5)]
+    results = await messages.ingest_messages(ann, as_stream(items), chunk_size=2)
+
+    assert inserts == [2, 2, 1]
+    ids = [r["id"] for r in results]
+    assert len(set(ids)) == 5 and min(ids) > existing.id
+    assert await Message.filter(id__in=ids).count() == 5
+
+
+@pytest.mark.anyio
+async def test_oversized_json_body_is_rejected_before_parsing(monkeypatch):
+    monkeypatch.setattr(messages, "BATCH_MAX_BYTES", 10)
+    chunks = [b'[{"channel_id": 1, ', b'"content": "a"}]']
+
+    async def receive():
+        body = chunks.pop(0)
+        return {"type": "http.request", "body": body, "more_body": bool(chunks)}
+
+    request = Request({"type": "http", "headers": [(b"content-type", b"application/json")]}, receive)
+    with pytest.raises(HTTPException) as exc:
+        [item async for item in messages.batch_items(request)]
+    assert exc.value.status_code == 413
+    # Only what had arrived by the time the cap was passed was read
+    assert chunks == [b'"content": "a"}]']
+
+
+@pytest.mark.anyio
+async def test_ndjson_lines_split_across_chunks_are_reassembled():
+    chunks = [b'{"channel_id": 1, "con', b'tent": "a"}\n\n{"channel_id"', b': 2, "content": "b"}\nnot json']
+
+    async def receive():
+        body = chunks.pop(0)
+        return {"type": "http.request", "body": body, "more_body": bool(chunks)}
+
+    request = Request({"type": "http", "headers": [(b"content-type", b"application/x-ndjson")]}, receive)
+    items = [item async for item in messages.batch_items(request)]
+    assert items == [{"channel_id": 1, "content": "a"}, {"channel_id": 2, "content": "b"}, None]
@@ -0,0 +1,29 @@
+import csv
+import io
+import json
+
+import pytest
+
+from models.channel import Channel
+from models.message import Message
+from models.user import User
+from routers import messages
+
+
+@pytest.mark.anyio
+async def test_export_streams_every_message_in_both_formats(db, monkeypatch):
+    monkeypatch.setattr(messages, "EXPORT_BATCH_SIZE", 2)
+    author = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    channel = await Channel.create(name="general")
+    for text in ("one", "two, with a comma", 'three "quoted"'):
+        await Message.create(channel=channel, author=author, content=text)
+
+    chunks = [chunk async for chunk in messages.export_rows(channel.id, "ndjson")]
+    assert len(chunks) == 2
+    rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert [row["content"] for row in rows] == ["one", "two, with a comma", 'three "quoted"']
+    assert {row["author_name"] for row in rows} == {"Ann"}
+
+    text = "".join([chunk async for chunk in messages.export_rows(channel.id, "csv")])
+    parsed = list(csv.DictReader(io.StringIO(text)))
+    assert [row["content"] for row in parsed] == ["one", "two, with a comma", 'three "quoted"']
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from models.channel import Channel
+from models.message import Message
+from models.user import User
+
+
+async def seed(count: int):
+    author = await User.create(full_name="Ann Author", email="ann@example.com", hashed_password="x")
+    channel = await Channel.create(name="general")
+    other = await Channel.create(name="random")
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    ids = []
+    for i in range(count):
+        # pairs of rows share a timestamp so the id tie-break matters
+        msg = await Message.create(channel=channel, author=author, content=f"m{i}")
+        await Message.filter(id=msg.id).update(sent_at=start + timedelta(seconds=i // 2))
+        await Message.create(channel=other, author=author, content=f"noise{i}")
+        ids.append(msg.id)
+    return channel.id, ids
+
+
+@pytest.mark.anyio
+async def test_pages_walk_back_through_history(db):
+    channel_id, ids = await seed(7)
+
+    newest, has_more = await Message.page(channel_id, limit=3)
+    assert [m.id for m in newest] == ids[4:]
+    assert has_more
+
+    older, has_more = await Message.page(channel_id, before_id=newest[0].id, limit=3)
+    assert [m.id for m in older] == ids[1:4]
+    assert has_more
+
+    oldest, has_more = await Message.page(channel_id, before_id=older[0].id, limit=3)
+    assert [m.id for m in oldest] == ids[:1]
+    assert not has_more
+
+
+@pytest.mark.anyio
+async def test_after_cursor_pages_forward(db):
+    channel_id, ids = await seed(5)
+
+    rows, has_more = await Message.page(channel_id, after_id=ids[1], limit=2)
+
+    assert [m.id for m in rows] == ids[2:4]
+    assert has_more
+
+
+@pytest.mark.anyio
+async def test_cursor_from_another_channel_returns_nothing(db):
+    channel_id, ids = await seed(2)
+    stranger = await Message.exclude(channel_id=channel_id).first()
+
+    assert await Message.page(channel_id, before_id=stranger.id) == ([], False)
+
+
+@pytest.mark.anyio
+async def test_iterate_walks_whole_history_in_batches(db):
+    channel_id, ids = await seed(7)
+
+    batches = [batch async for batch in Message.iterate(channel_id, batch_size=3)]
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert [row["id"] for batch in batches for row in batch] == ids
@@ -0,0 +1,60 @@
+import pytest
+
+from core.message_writer import MessageWriter
+from models.channel import Channel
+from models.message import Message
+from models.user import User
+
+
+async def seed():
+    author = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    channel = await Channel.create(name="general")
+    existing = await Message.create(channel=channel, author=author, content="before write-behind")
+    return author.id, channel.id, existing.id
+
+
+@pytest.mark.anyio
+async def test_write_behind_returns_ids_up_front_and_flushes_in_batches(db):
+    author_id, channel_id, existing_id = await seed()
+    writer = MessageWriter(write_behind=True, batch_size=1000, flush_interval=60, id_block_size=3)
+    await writer.start()
+
+    created = [await writer.create(channel_id, author_id, f"m{i}") for i in range(5)]
+    ids = [m.id for m in created]
+    assert ids == list(range(existing_id + 1, existing_id + 6))
+    assert await Message.filter(channel_id=channel_id).count() == 1
+    assert writer.pending == 5
+
+    assert await writer.flush()
+    assert await Message.filter(channel_id=channel_id).count() == 6
+
+    await writer.create(channel_id, author_id, "last")
+    await writer.stop()
+    assert writer.pending == 0
+    assert await Message.filter(channel_id=channel_id, content="last").exists()
+
+
+@pytest.mark.anyio
+async def test_durable_writes_and_new_blocks_never_reuse_ids(db):
+    author_id, channel_id, _ = await seed()
+    first = MessageWriter(write_behind=True, id_block_size=10)
+    second = MessageWriter(write_behind=True, id_block_size=10)
+
+    # Two workers reserve disjoint blocks from the shared sequence
+    a = await first.create(channel_id, author_id, "a", durable=True)
+    b = await second.create(channel_id, author_id, "b", durable=True)
+    assert b.id >= a.id + 10
+    assert await Message.filter(id__in=[a.id, b.id]).count() == 2
+
+
+@pytest.mark.anyio
+async def test_rows_for_missing_channels_do_not_sink_the_batch(db):
+    author_id, channel_id, _ = await seed()
+    writer = MessageWriter(write_behind=True, batch_size=1000, flush_interval=60)
+    await writer.start()
+    await writer.create(channel_id, author_id, "kept")
+    await writer.create(channel_id + 100, author_id, "orphan")
+    await writer.stop()
+
+    assert await Message.filter(content="kept").exists()
+    assert not await Message.filter(content="orphan").exists()
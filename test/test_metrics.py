@@ -0,0 +1,35 @@
+import pytest
+from fastapi import HTTPException
+
+from core.dependencies import require_admin_role
+from core.metrics import MetricsRegistry
+from models.role import Role
+from models.user import User
+
+
+def test_keyed_series_keep_only_the_most_recent_keys():
+    registry = MetricsRegistry(max_keys=3)
+    for channel_id in range(5):
+        registry.observe("ws_broadcast", 0.001, key=channel_id)
+        registry.incr("ws_evictions", 2, key=channel_id)
+    registry.observe("ws_broadcast", 0.001, key=2)
+
+    assert list(registry.latencies["ws_broadcast"]) == [3, 4, 2]
+    counts = registry.counters["ws_evictions"]
+    assert len(counts) == 3
+    assert counts[4] == 2
+    assert sum(counts.values()) == 10
+
+
+@pytest.mark.anyio
+async def test_metrics_require_an_admin(db):
+    admins = await Role.create(name="admin")
+    ann = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x", role=admins)
+    bob = await User.create(full_name="Bob", email="bob@example.com", hashed_password="x")
+    await ann.fetch_related("role")
+    await bob.fetch_related("role")
+
+    assert require_admin_role(ann) is ann
+    with pytest.raises(HTTPException) as exc:
+        require_admin_role(bob)
+    assert exc.value.status_code == 403
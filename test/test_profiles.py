@@ -0,0 +1,19 @@
+import pytest
+
+from core import profiles
+from models.user import User
+
+
+@pytest.mark.anyio
+async def test_profiles_are_cached_until_invalidated(db):
+    profiles.author_profiles.clear()
+    ann = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+
+    found = await profiles.get_profiles([ann.id, ann.id, 9999])
+    assert found == {ann.id: {"id": ann.id, "name": "Ann"}}
+    assert profiles.display_name(found, 9999) == "Deleted user"
+
+    await User.filter(id=ann.id).update(full_name="Ann Smith")
+    assert (await profiles.get_profiles([ann.id]))[ann.id]["name"] == "Ann"
+    profiles.invalidate_profile(ann.id)
+    assert (await profiles.get_profiles([ann.id]))[ann.id]["name"] == "Ann Smith"
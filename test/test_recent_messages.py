@@ -0,0 +1,112 @@
+import pytest
+
+from core.recent_messages import RecentMessages, message_buffer
+from models.channel import Channel
+from models.user import User
+from routers import messages, users, ws_chat
+from schemas.message import MessageCreate
+from schemas.user import UserCreate
+
+
+def _msg(i):
+    return {"id": i, "author": "a", "author_id": 1, "content": f"m{i}", "sent_at": ""}
+
+
+def test_unseeded_channel_is_a_miss_and_ignores_appends():
+    buffer = RecentMessages(per_channel=5)
+    buffer.append(1, _msg(1))
+
+    assert buffer.get(1, 3) is None
+    assert not buffer.tracks(1)
+
+
+def test_seeded_tail_serves_newest_messages_oldest_first():
+    buffer = RecentMessages(per_channel=5)
+    buffer.seed(1, [_msg(i) for i in range(1, 4)], has_more=False)
+    buffer.append(1, _msg(4))
+
+    messages, has_more = buffer.get(1, 2)
+    assert [m["id"] for m in messages] == [3, 4]
+    assert has_more
+    messages, has_more = buffer.get(1, 10)
+    assert [m["id"] for m in messages] == [1, 2, 3, 4]
+    assert not has_more
+
+
+def test_full_tail_is_no_longer_complete():
+    buffer = RecentMessages(per_channel=3)
+    buffer.seed(1, [_msg(i) for i in range(1, 4)], has_more=False)
+    buffer.append(1, _msg(4))
+
+    assert buffer.get(1, 5) is None
+    messages, has_more = buffer.get(1, 3)
+    assert [m["id"] for m in messages] == [2, 3, 4]
+    assert has_more
+
+
+def test_messages_sent_during_a_load_are_kept():
+    buffer = RecentMessages(per_channel=5)
+    buffer.begin_load(1)
+    buffer.append(1, _msg(3))
+    buffer.append(1, _msg(4))
+    # The DB read already saw message 3 but not 4
+    buffer.seed(1, [_msg(1), _msg(2), _msg(3)], has_more=False)
+
+    messages, _ = buffer.get(1, 10)
+    assert [m["id"] for m in messages] == [1, 2, 3, 4]
+
+
+def test_total_cap_evicts_least_recently_used_channel():
+    buffer = RecentMessages(per_channel=5, max_messages=6)
+    buffer.seed(1, [_msg(i) for i in range(3)], has_more=False)
+    buffer.seed(2, [_msg(i) for i in range(3)], has_more=False)
+    buffer.get(1, 1)
+    buffer.seed(3, [_msg(i) for i in range(3)], has_more=False)
+
+    assert buffer.tracks(1) and buffer.tracks(3)
+    assert not buffer.tracks(2)
+    assert buffer.stats()["messages"] == 6
+
+
+def test_failed_load_stops_collecting_appends():
+    buffer = RecentMessages(per_channel=5)
+    buffer.begin_load(1)
+    buffer.begin_load(1)
+    buffer.abort_load(1)
+    # The other load is still in flight
+    buffer.append(1, _msg(1))
+    assert buffer.tracks(1)
+    buffer.abort_load(1)
+
+    buffer.append(1, _msg(2))
+    assert not buffer.tracks(1)
+    assert buffer._loading == {}
+
+    buffer.begin_load(2)
+    buffer.clear()
+    assert not buffer.tracks(2)
+
+
+@pytest.mark.anyio
+async def test_rest_message_extends_the_channel_tail(db):
+    author = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    channel = await Channel.create(name="general")
+    await ws_chat.recent_history(channel.id, 10)
+
+    created = await messages.post_message(MessageCreate(channel_id=channel.id, content="over REST"), author)
+
+    history, _ = message_buffer.get(channel.id, 10)
+    assert [(m["id"], m["author"], m["content"]) for m in history] == [(created.id, "Ann", "over REST")]
+
+
+@pytest.mark.anyio
+async def test_buffered_history_shows_renamed_authors(db):
+    author = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    channel = await Channel.create(name="general")
+    await ws_chat.recent_history(channel.id, 10)
+    await messages.post_message(MessageCreate(channel_id=channel.id, content="hi"), author)
+
+    await users.update_user(author.id, UserCreate(full_name="Ann B", email=author.email, password=None), None)
+
+    history, _ = await ws_chat.recent_history(channel.id, 10)
+    assert [m["author"] for m in history] == ["Ann B"]
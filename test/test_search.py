@@ -0,0 +1,38 @@
+import pytest
+
+from core.search import search_messages
+from models.channel import Channel
+from models.message import Message
+from models.user import User
+
+
+@pytest.mark.anyio
+async def test_search_ranks_filters_by_channel_and_pages(db):
+    author = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    general = await Channel.create(name="general")
+    secret = await Channel.create(name="secret", is_private=True)
+    before = await Message.create(channel=general, author=author, content="deploy the release tonight")
+    # Rows written after the index exists are picked up by the triggers
+    await search_messages("warmup", [general.id])
+    for i in range(3):
+        await Message.create(channel=general, author=author, content=f"release notes part {i}")
+    await Message.create(channel=general, author=author, content="lunch?")
+    await Message.create(channel=secret, author=author, content="secret release plan")
+
+    rows, cursor = await search_messages("release", [general.id], limit=3)
+    assert len(rows) == 3 and cursor is not None
+    more, cursor = await search_messages("release", [general.id], limit=3, cursor=cursor)
+    assert cursor is None
+    found = [row["id"] for row in rows + more]
+    assert len(found) == len(set(found)) == 4
+    assert before.id in found
+    assert all(row["channel_id"] == general.id for row in rows + more)
+
+    # FTS5 operators in user input are treated as plain words
+    assert await search_messages('release" OR "lunch', [general.id]) == ([], None)
+
+
+@pytest.mark.anyio
+async def test_invalid_cursor_is_rejected(db):
+    with pytest.raises(ValueError):
+        await search_messages("anything", [1], cursor="not-a-cursor")
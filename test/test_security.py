@@ -0,0 +1,21 @@
+import pytest
+from fastapi import HTTPException
+
+from core import security
+
+
+@pytest.mark.anyio
+async def test_async_hash_roundtrip():
+    hashed = await security.hash_password_async("secret123")
+
+    assert await security.verify_password_async("secret123", hashed)
+    assert not await security.verify_password_async("wrong", hashed)
+
+
+@pytest.mark.anyio
+async def test_hashing_rejects_callers_beyond_the_queue_limit(monkeypatch):
+    monkeypatch.setattr(security, "_hash_pending", 10_000)
+
+    with pytest.raises(HTTPException) as exc:
+        await security.verify_password_async("secret123", "not-a-hash")
+    assert exc.value.status_code == 503
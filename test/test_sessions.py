@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+
+from core import dependencies
+from core.backplane import InMemoryBackplane
+from core.dependencies import get_current_user, session_cache
+from core.security import create_access_token, hash_password
+from models.role import Role
+from models.user import User
+from routers import auth, users, ws_chat
+from routers.ws_chat import ConnectionManager
+from schemas.token import LoginRequest
+from schemas.user import UserCreate, UserUpdateRole
+
+
+@pytest.fixture
+async def ann(db):
+    session_cache.clear()
+    return await User.create(full_name="Ann", email="ann@example.com", hashed_password=hash_password("secret"))
+
+
+async def login(password: str = "secret") -> str:
+    return (await auth.login(LoginRequest(email="ann@example.com", password=password), Response())).access_token
+
+
+async def assert_rejected(token: str):
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user(token)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_cached_session_is_served_without_a_query(ann, monkeypatch):
+    token = await login()
+    assert (await get_current_user(token)).id == ann.id
+
+    async def no_queries(*args, **kwargs):
+        raise AssertionError("session should come from the cache")
+
+    monkeypatch.setattr(dependencies.User, "get_or_none", no_queries)
+    assert (await get_current_user(token)).id == ann.id
+    # A token whose jti doesn't match is refused from the cache as well
+    await assert_rejected(create_access_token(ann.email, None, "some-other-jti"))
+
+
+@pytest.mark.anyio
+async def test_new_login_and_logout_revoke_the_cached_session(ann):
+    first = await login()
+    user = await get_current_user(first)
+
+    second = await login()
+    await assert_rejected(first)
+    assert (await get_current_user(second)).id == ann.id
+
+    await auth.logout(Response(), user)
+    await assert_rejected(second)
+
+
+@pytest.mark.anyio
+async def test_admin_changes_reach_cached_sessions(ann):
+    staff = await Role.create(name="staff")
+    token = await login()
+    assert (await get_current_user(token)).role is None
+
+    await users.change_role(ann.id, UserUpdateRole(role_id=staff.id), None)
+    assert (await get_current_user(token)).role.name == "staff"
+
+    await users.update_user(ann.id, UserCreate(full_name="Ann B", email=ann.email, password=None, role_id=staff.id), None)
+    assert (await get_current_user(token)).full_name == "Ann B"
+
+    await users.delete_user(ann.id, None)
+    await assert_rejected(token)
+
+
+@pytest.mark.anyio
+async def test_logout_writes_back_only_the_jti(ann):
+    user = await get_current_user(await login())
+    await User.filter(id=ann.id).update(full_name="Ann B")
+
+    await auth.logout(Response(), user)
+    assert (await User.get(id=ann.id)).full_name == "Ann B"
+
+
+@pytest.mark.anyio
+async def test_session_invalidations_reach_other_workers(ann, monkeypatch):
+    shared = InMemoryBackplane()
+    here, there = ConnectionManager(backplane=shared), ConnectionManager(backplane=shared)
+    await here.start()
+    await there.start()
+    relayed = []
+
+    async def record(event):
+        relayed.append(event)
+
+    await shared.start(record)
+    monkeypatch.setattr(ws_chat, "manager", here)
+
+    dependencies.invalidate_user_sessions(ann.id)
+    await asyncio.sleep(0)
+    assert {"type": "invalidate_sessions", "scope": "user", "key": ann.id} in [
+        {k: v for k, v in event.items() if k != "origin"} for event in relayed
+    ]
+
+    # The receiving worker drops its own copy
+    token = await login()
+    await get_current_user(token)
+    await there._on_backplane_event({"type": "invalidate_sessions", "scope": "email", "key": ann.email, "origin": "x"})
+    assert session_cache.get(ann.email) is None
@@ -0,0 +1,50 @@
+import httpx
+import pytest
+
+from models.channel import Channel
+from models.channelsummary import ChannelSummary
+from models.user import User
+from routers import ws_chat
+
+
+@pytest.fixture
+def ai_calls(monkeypatch):
+    """Record what is sent to the summarizer and what the channel is sent back"""
+    calls, posted = [], []
+
+    async def post(path, payload, timeout):
+        calls.append(payload["text"])
+        return httpx.Response(200, json={"summary": f"summary #{len(calls)}"})
+
+    async def broadcast(channel_id, message, exclude_ws=None):
+        posted.append(message["data"]["content"])
+
+    monkeypatch.setattr(ws_chat.ai_client, "post", post)
+    monkeypatch.setattr(ws_chat.manager, "broadcast", broadcast)
+    ws_chat.message_buffer.clear()
+    return calls, posted
+
+
+@pytest.mark.anyio
+async def test_summaries_are_stored_and_extended_incrementally(db, ai_calls):
+    calls, posted = ai_calls
+    author = await User.create(full_name="Ann", email="ann@example.com", hashed_password="x")
+    channel = await Channel.create(name="general")
+    for text in ("hello", "how are you", "/summarize"):
+        await ws_chat.persist_message(channel.id, author.id, "Ann", text)
+
+    await ws_chat.summarize_channel(None, channel.id)
+    assert calls == ["Ann: hello\nAnn: how are you"]
+
+    # Nothing new besides another /summarize: the stored summary is reused
+    await ws_chat.persist_message(channel.id, author.id, "Ann", "/summarize")
+    await ws_chat.summarize_channel(None, channel.id)
+    assert len(calls) == 1
+    assert posted == ["summary #1", "summary #1"]
+
+    await ws_chat.persist_message(channel.id, author.id, "Ann", "fine thanks")
+    await ws_chat.summarize_channel(None, channel.id)
+    assert calls[1] == "Summary of the conversation so far:\nsummary #1\n\nNew messages:\nAnn: fine thanks"
+
+    stored = await ChannelSummary.get(channel_id=channel.id)
+    assert stored.content == "summary #2"
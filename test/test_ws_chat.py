@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from tortoise import Tortoise
+
+from core.acl import invalidate_all_channels
+from core.database import TORTOISE_ORM
+from core.message_writer import message_writer
+from core.profiles import author_profiles
+from core.security import create_access_token
+from models.channel import Channel
+from models.channelmember import ChannelMember
+from models.message import Message
+from models.user import User
+from routers import ws_chat
+
+MODELS = TORTOISE_ORM["apps"]["models"]["models"]
+
+
+@pytest.fixture
+def chat_app():
+    """The WebSocket router on its own app, backed by in-memory SQLite"""
+    app = FastAPI()
+    app.include_router(ws_chat.router)
+
+    @app.on_event("startup")
+    async def startup():
+        ws_chat.message_buffer.clear()
+        ws_chat.smart_reply_cache.clear()
+        invalidate_all_channels()
+        author_profiles.clear()
+        message_writer.ids.reset()
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": MODELS})
+        await Tortoise.generate_schemas()
+        bot = await User.create(full_name="Chatbot", email="bot@internal.local", hashed_password="x")
+        app.state.chatbot_user_id = bot.id
+        alice = await User.create(full_name="Alice Smith", email="alice@example.com", hashed_password="x", current_jti="jti-alice")
+        bob = await User.create(full_name="Bob Jones", email="bob@example.com", hashed_password="x", current_jti="jti-bob")
+        general = await Channel.create(name="general")
+        secret = await Channel.create(name="secret", is_private=True)
+        await ChannelMember.create(channel=secret, user=bob)
+        await Message.create(channel=general, author=bob, content="welcome")
+        app.state.ids = {"alice": alice.id, "bob": bob.id, "general": general.id, "secret": secret.id}
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await Tortoise.close_connections()
+
+    with TestClient(app) as client:
+        yield client, app.state.ids
+
+
+def login(client, email, jti):
+    client.cookies.set("access_token", create_access_token(email, None, jti))
+
+
+def test_multiplexed_socket_subscribes_and_chats(chat_app):
+    client, ids = chat_app
+    login(client, "alice@example.com", "jti-alice")
+
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "subscribe", "channel_id": ids["general"]})
+        history = ws.receive_json()
+        assert history["type"] == "history"
+        assert history["channel_id"] == ids["general"]
+        assert [m["content"] for m in history["data"]] == ["welcome"]
+        assert ws.receive_json() == {"type": "active_users", "channel_id": ids["general"], "data": [ids["alice"]]}
+
+        ws.send_json({"type": "subscribe", "channel_id": ids["secret"]})
+        assert ws.receive_json()["type"] == "error"
+
+        ws.send_json({"type": "message", "channel_id": ids["general"], "content": "hi all"})
+        frame = ws.receive_json()
+        assert frame["type"] == "message"
+        assert frame["channel_id"] == ids["general"]
+        assert frame["data"]["content"] == "hi all"
+        assert frame["data"]["author"] == "Alice Smith"
+
+
+def test_single_channel_socket_rejects_non_member(chat_app):
+    client, ids = chat_app
+    login(client, "alice@example.com", "jti-alice")
+
+    with pytest.raises(Exception):
+        with client.websocket_connect(f"/ws/{ids['secret']}") as ws:
+            ws.receive_json()
+
+
+def test_removed_member_socket_is_closed_and_its_jobs_cancelled(chat_app, monkeypatch):
+    client, ids = chat_app
+    login(client, "bob@example.com", "jti-bob")
+    cancelled = []
+    monkeypatch.setattr(ws_chat.ai_jobs, "cancel_owner", cancelled.append)
+
+    with client.websocket_connect(f"/ws/{ids['secret']}") as ws:
+        assert ws.receive_json()["type"] == "history"
+        assert ws.receive_json()["type"] == "active_users"
+        client.portal.call(ws_chat.manager.revoke, ids["secret"], [ids["bob"]])
+        assert ws.receive()["type"] == "websocket.close"
+        ws.send_text("still here?")
+        for _ in range(100):
+            if cancelled:
+                break
+            client.portal.call(asyncio.sleep, 0.01)
+
+    async def posted():
+        return await Message.filter(content="still here?").exists()
+
+    assert len(cancelled) == 1
+    assert not client.portal.call(posted)
+
+
+@pytest.mark.anyio
+async def test_smart_replies_are_coalesced_and_cached(monkeypatch):
+    ws_chat.smart_reply_cache.clear()
+    calls = []
+    history = [{"id": 1, "author": "Bob", "content": "hi"}, {"id": 2, "author": "Bob", "content": "lunch?"}]
+
+    async def recent_history(channel_id, limit):
+        return history, False
+
+    async def get_smart_replies(recent_messages, name):
+        calls.append(recent_messages[-1]["id"])
+        await asyncio.sleep(0.01)
+        return ["Sure!"], True
+
+    monkeypatch.setattr(ws_chat, "recent_history", recent_history)
+    monkeypatch.setattr(ws_chat, "get_smart_replies", get_smart_replies)
+
+    results = await asyncio.gather(*[ws_chat.smart_replies_for(7, 1, "Alice") for _ in range(5)])
+    assert results == [["Sure!"]] * 5
+    assert await ws_chat.smart_replies_for(7, 1, "Alice") == ["Sure!"]
+    assert calls == [2]
+
+    # A new message in the channel is a new key
+    history.append({"id": 3, "author": "Bob", "content": "?"})
+    await ws_chat.smart_replies_for(7, 1, "Alice")
+    assert calls == [2, 3]
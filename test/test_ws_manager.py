@@ -0,0 +1,328 @@
+import asyncio
+import json
+import pytest
+
+from core import frames
+from core.metrics import metrics
+from routers import ws_chat
+from routers.ws_chat import ConnectionManager
+
+
+class FakeWebSocket:
+    """Records frames; `delay` simulates a client that reads slowly"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000, reason: str | None = None):
+        self.closed = True
+
+
+@pytest.mark.anyio
+async def test_broadcast_evicts_stalled_socket():
+    manager = ConnectionManager(concurrent=True, send_timeout=0.05)
+    fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+    await manager.connect(1, 10, fast)
+    await manager.connect(1, 20, slow)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await manager.broadcast(1, {"type": "message", "data": "hi"})
+
+    assert loop.time() - started < 1
+    assert fast.sent == [{"type": "message", "data": "hi", "channel_id": 1}]
+    assert list(manager.active_connections[1]) == [fast]
+    assert manager.active_users(1) == {10}
+
+
+@pytest.mark.anyio
+async def test_broadcast_skips_excluded_socket():
+    manager = ConnectionManager()
+    a, b = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(1, 10, a)
+    await manager.connect(1, 20, b)
+
+    await manager.broadcast(1, {"type": "user_joined"}, exclude_ws=a)
+
+    assert a.sent == []
+    assert b.sent == [{"type": "user_joined", "channel_id": 1}]
+
+
+@pytest.mark.anyio
+async def test_broadcast_encodes_payload_once(monkeypatch):
+    calls = []
+
+    def counting_encode(message):
+        calls.append(message)
+        return json.dumps(message)
+
+    monkeypatch.setattr(ws_chat, "encode_frame", counting_encode)
+    manager = ConnectionManager()
+    sockets = [FakeWebSocket() for _ in range(5)]
+    for user_id, ws in enumerate(sockets):
+        await manager.connect(1, user_id, ws)
+
+    await manager.broadcast(1, {"type": "message", "data": {"id": 1}})
+
+    assert len(calls) == 1
+    assert all(ws.sent == [{"type": "message", "data": {"id": 1}, "channel_id": 1}] for ws in sockets)
+
+
+@pytest.mark.anyio
+async def test_queued_broadcast_does_not_wait_for_slow_reader():
+    manager = ConnectionManager(queue_size=4, overflow_policy="drop_oldest", send_timeout=60)
+    fast, slow = FakeWebSocket(), FakeWebSocket(delay=60)
+    await manager.connect(1, 10, fast)
+    await manager.connect(1, 20, slow)
+
+    for i in range(10):
+        await manager.broadcast(1, {"type": "message", "data": {"id": i}})
+        await asyncio.sleep(0.001)
+
+    assert [f["data"]["id"] for f in fast.sent] == list(range(10))
+    # The slow writer holds frame 0 in flight; the queue keeps only the newest
+    assert json.loads(manager.connections[slow].queue[-1].text)["data"]["id"] == 9
+    assert len(manager.connections[slow].queue) == 4
+    assert manager.queue_stats()["lagging"] == [{"user_id": 20, "channels": [1], "depth": 4, "dropped": 5}]
+
+    manager.disconnect(fast)
+    manager.disconnect(slow)
+
+
+@pytest.mark.anyio
+async def test_shed_frames_are_followed_by_a_resync_frame():
+    manager = ConnectionManager(queue_size=2, overflow_policy="drop_oldest", send_timeout=60)
+    slow = FakeWebSocket(delay=0.02)
+    await manager.connect(1, 20, slow)
+    await manager.broadcast(1, {"type": "message", "data": {"id": 0}})
+    await asyncio.sleep(0)  # writer picks up frame 0
+
+    for i in range(1, 5):
+        await manager.broadcast(1, {"type": "message", "data": {"id": i}})
+    await asyncio.sleep(0.1)
+
+    assert slow.sent == [
+        {"type": "message", "data": {"id": 0}, "channel_id": 1},
+        {"type": "resync", "data": {"dropped": 2}, "channel_id": 1},
+        {"type": "message", "data": {"id": 3}, "channel_id": 1},
+        {"type": "message", "data": {"id": 4}, "channel_id": 1},
+    ]
+    manager.disconnect(slow)
+
+
+@pytest.mark.anyio
+async def test_coalesce_policy_sheds_superseded_presence_first():
+    manager = ConnectionManager(queue_size=3, overflow_policy="coalesce", send_timeout=60)
+    slow = FakeWebSocket(delay=60)
+    await manager.connect(1, 20, slow)
+    await manager.broadcast(1, {"type": "message", "data": {"id": 0}})
+    await asyncio.sleep(0)  # writer picks up frame 0 and stalls
+
+    await manager.broadcast(1, {"type": "user_joined", "data": {"user_id": 5}})
+    await manager.broadcast(1, {"type": "message", "data": {"id": 1}})
+    await manager.broadcast(1, {"type": "user_left", "data": {"user_id": 6}})
+    await manager.broadcast(1, {"type": "user_left", "data": {"user_id": 5}})
+
+    queued = [json.loads(f.text) for f in manager.connections[slow].queue]
+    assert queued == [
+        {"type": "message", "data": {"id": 1}, "channel_id": 1},
+        {"type": "user_left", "data": {"user_id": 6}, "channel_id": 1},
+        {"type": "user_left", "data": {"user_id": 5}, "channel_id": 1},
+    ]
+    manager.disconnect(slow)
+
+
+@pytest.mark.anyio
+async def test_disconnect_policy_evicts_slow_consumer():
+    manager = ConnectionManager(queue_size=1, overflow_policy="disconnect", send_timeout=60)
+    slow = FakeWebSocket(delay=60)
+    await manager.connect(1, 20, slow)
+
+    for i in range(3):
+        await manager.broadcast(1, {"type": "message", "data": {"id": i}})
+    await asyncio.sleep(0.01)
+
+    assert slow not in manager.connections
+    assert slow.closed
+
+
+@pytest.mark.anyio
+async def test_presence_survives_closing_one_of_two_tabs():
+    manager = ConnectionManager()
+    tab_1, tab_2 = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(1, 10, tab_1)
+    await manager.connect(1, 10, tab_2)
+
+    manager.disconnect(tab_1)
+    manager.disconnect(tab_1)  # repeated disconnects are no-ops
+    assert manager.active_users(1) == {10}
+
+    manager.disconnect(tab_2)
+    assert manager.active_users(1) == set()
+    assert manager.active_connections == manager.user_channels == {}
+
+
+@pytest.mark.anyio
+async def test_join_and_leave_are_reported_only_for_the_first_and_last_tab():
+    manager = ConnectionManager()
+    tab_1, tab_2 = FakeWebSocket(), FakeWebSocket()
+    assert await manager.connect(1, 10, tab_1) is True
+    assert await manager.connect(1, 10, tab_2) is False
+    manager.subscribe(tab_2, 2)
+
+    assert manager.disconnect(tab_1) == []
+    assert manager.unsubscribe(tab_2, 2) is True
+    assert manager.disconnect(tab_2) == [1]
+    assert manager.disconnect(tab_2) == []
+
+
+@pytest.mark.anyio
+async def test_multiplexed_socket_receives_tagged_frames_per_channel():
+    manager = ConnectionManager()
+    ws = FakeWebSocket()
+    await manager.register(10, ws)
+    manager.subscribe(ws, 1)
+    manager.subscribe(ws, 2)
+
+    await manager.broadcast(1, {"type": "message", "data": {"id": 1}})
+    await manager.broadcast(2, {"type": "message", "data": {"id": 2}})
+    manager.unsubscribe(ws, 1)
+    await manager.broadcast(1, {"type": "message", "data": {"id": 3}})
+
+    assert [(f["channel_id"], f["data"]["id"]) for f in ws.sent] == [(1, 1), (2, 2)]
+    assert manager.active_users(1) == set()
+    assert manager.active_users(2) == {10}
+
+    manager.disconnect(ws)
+    assert manager.connections == manager.active_connections == {}
+
+
+@pytest.mark.anyio
+async def test_batching_sockets_get_one_frame_per_window():
+    manager = ConnectionManager(batch_window=0.02, batch_max=100)
+    plain, batched = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(1, 10, plain)
+    await manager.connect(1, 20, batched, batching=True)
+    saved_before = metrics.counters.get("ws_frames_saved", {}).get(1, 0)
+
+    for i in range(3):
+        await manager.broadcast(1, {"type": "message", "data": {"id": i}})
+    assert len(plain.sent) == 3
+    assert batched.sent == []
+
+    await asyncio.sleep(0.05)
+    assert batched.sent == [{"type": "messages", "data": [{"id": 0}, {"id": 1}, {"id": 2}], "channel_id": 1}]
+    assert metrics.counters["ws_frames_saved"][1] - saved_before == 2
+
+
+@pytest.mark.anyio
+async def test_batch_is_flushed_when_full_and_before_other_frames():
+    manager = ConnectionManager(batch_window=60, batch_max=2)
+    ws = FakeWebSocket()
+    await manager.connect(1, 10, ws, batching=True)
+
+    for i in range(3):
+        await manager.broadcast(1, {"type": "message", "data": {"id": i}})
+    assert [frame["data"] for frame in ws.sent] == [[{"id": 0}, {"id": 1}]]
+
+    # The waiting message must not arrive after a later non-message frame
+    await manager.broadcast(1, {"type": "user_left", "data": {"user_id": 30}})
+    assert [frame["type"] for frame in ws.sent] == ["messages", "messages", "user_left"]
+    assert ws.sent[1]["data"] == [{"id": 2}]
+    assert not manager._batches
+
+
+@pytest.mark.anyio
+async def test_bulk_frames_reach_non_batching_sockets_one_message_at_a_time():
+    manager = ConnectionManager(batch_window=60)
+    plain, batched = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(1, 10, plain)
+    await manager.connect(1, 20, batched, batching=True)
+
+    await manager.broadcast(1, {"type": "messages", "data": [{"id": 1}, {"id": 2}]})
+    await manager.flush_batch(1)
+
+    assert plain.sent == [
+        {"type": "message", "data": {"id": 1}, "channel_id": 1},
+        {"type": "message", "data": {"id": 2}, "channel_id": 1},
+    ]
+    assert batched.sent == [{"type": "messages", "data": [{"id": 1}, {"id": 2}], "channel_id": 1}]
+
+
+@pytest.mark.anyio
+async def test_batching_is_not_granted_when_the_server_has_it_off():
+    manager = ConnectionManager()
+    ws = FakeWebSocket()
+    await manager.connect(1, 10, ws, batching=True)
+
+    await manager.broadcast(1, {"type": "message", "data": {"id": 1}})
+    assert ws.sent == [{"type": "message", "data": {"id": 1}, "channel_id": 1}]
+
+
+@pytest.mark.anyio
+async def test_each_encoding_is_produced_once_per_broadcast(monkeypatch):
+    calls = []
+    encode_frame_as = frames.encode_frame_as
+
+    def counting_encode_as(message, encoding):
+        calls.append(encoding)
+        return encode_frame_as(message, encoding)
+
+    monkeypatch.setattr(frames, "encode_frame_as", counting_encode_as)
+    manager = ConnectionManager(batch_window=60)
+    plain = [FakeWebSocket() for _ in range(2)]
+    columnar = [FakeWebSocket() for _ in range(3)]
+    for user_id, ws in enumerate(plain):
+        await manager.connect(1, user_id, ws, batching=True)
+    for user_id, ws in enumerate(columnar, start=10):
+        await manager.connect(1, user_id, ws, batching=True, encoding="columnar")
+
+    batch = [{"id": 1, "author": "Ann", "content": "hi"}, {"id": 2, "author": "Bob", "content": "yo"}]
+    await manager.broadcast(1, {"type": "messages", "data": batch})
+    await manager.flush_batch(1)
+
+    # The batch frame is encoded once per encoding, not once per socket
+    assert sorted(calls) == ["columnar", "json"]
+    assert all(ws.sent == [{"type": "messages", "data": batch, "channel_id": 1}] for ws in plain)
+    expected = {"columns": ["id", "author", "content"], "rows": [[1, "Ann", "hi"], [2, "Bob", "yo"]]}
+    assert all(ws.sent == [{"type": "messages", "data": expected, "channel_id": 1}] for ws in columnar)
+
+
+def test_encoding_negotiation_falls_back_to_json(monkeypatch):
+    monkeypatch.setattr(frames, "msgpack", None)
+    assert frames.negotiate_encoding("columnar") == "columnar"
+    assert frames.negotiate_encoding("msgpack") == "json"
+    assert frames.negotiate_encoding("xml") == "json"
+    assert frames.negotiate_encoding(None) == "json"
+    # Frames without a message list are sent as they are
+    assert frames.to_columnar({"type": "message", "data": {"id": 1}}) == {"type": "message", "data": {"id": 1}}
+
+
+@pytest.mark.anyio
+async def test_revoke_unsubscribes_removed_users_sockets():
+    manager = ConnectionManager()
+    tab, other_tab, staying = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await manager.connect(1, 10, tab)
+    await manager.register(10, other_tab)
+    manager.subscribe(other_tab, 1)
+    manager.subscribe(other_tab, 2)
+    await manager.connect(1, 20, staying)
+
+    await manager.revoke(1, [10])
+    await asyncio.sleep(0)
+
+    # The single-channel socket is closed, the multiplexed one only leaves channel 1
+    assert tab.closed and tab not in manager.connections
+    assert other_tab.sent == [{"type": "removed", "channel_id": 1}]
+    assert not manager.is_subscribed(other_tab, 1) and manager.is_subscribed(other_tab, 2)
+    assert manager.active_users(1) == {20}
+    assert staying.sent == [{"type": "user_left", "data": {"user_id": 10}, "channel_id": 1}]